@@ -0,0 +1,125 @@
+# File: bench_archive.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+"""
+Benchmark of the page archive on synthetic item pages sharing a site template: bytes on disk, storing speed, random
+reads and bulk replay, against one gzip file per page and against the archive without a dictionary.
+
+Run from the repository root:
+    python -m benchmarks.bench_archive
+    python -m benchmarks.bench_archive -n 5000 --compression zlib
+"""
+
+import argparse
+import asyncio
+import gzip
+import logging
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+from scraper.archive import PageArchive
+from scraper.logger import log
+
+_WORDS: tuple[str, ...] = ('album', 'single', 'flac', 'mp3', 'remaster', 'live', 'soundtrack', 'vocal', 'piano',
+                           'circle', 'doujin', 'arrange', 'original', 'bonus', 'disc', 'edition', 'limited')
+
+
+def make_template(seed: int = 0) -> tuple[bytes, bytes]:
+    """Returns the markup shared by every page, before and after the item's own content."""
+    rng = random.Random(seed)
+    nav: str = ''.join(f'<li class="menu-item menu-item-{i}"><a href="/?p=search&type=tag&q={rng.choice(_WORDS)}">'
+                       f'{rng.choice(_WORDS).title()}</a></li>' for i in range(120))
+    head: str = ('<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{title}</title>'
+                 '<link rel="stylesheet" href="/static/css/site.min.css?v=20260901">'
+                 '<script src="/static/js/app.min.js?v=20260901" defer></script></head>'
+                 f'<body><header class="site-header"><nav><ul class="menu">{nav}</ul></nav></header>'
+                 '<main class="content"><article class="item">')
+    footer: str = ''.join(f'<div class="footer-col"><a href="/?p=page&type=info&id={i}">{rng.choice(_WORDS)}</a></div>'
+                          for i in range(80))
+    tail: str = (f'</article></main><footer class="site-footer">{footer}</footer>'
+                 '<script>window.dataLayer=window.dataLayer||[];function gtag(){dataLayer.push(arguments);}</script>'
+                 '</body></html>')
+    return head.encode(), tail.encode()
+
+
+def make_page(item_id: int, template: tuple[bytes, bytes]) -> bytes:
+    """Returns an item page: the template around a title, a description, tags and the download form."""
+    rng = random.Random(item_id)
+    title: str = ' '.join(rng.choice(_WORDS).title() for _ in range(4))
+    description: str = ' '.join(f'{rng.choice(_WORDS)}{rng.randint(0, 9999)}' for _ in range(rng.randint(50, 400)))
+    tags: str = ''.join(f'<a class="tag" href="/?p=search&type=tag&q={t}">{t}</a>'
+                        for t in rng.sample(_WORDS, 5))
+    body: str = (f'<h1 class="item-title">{title}</h1><div class="item-description"><p>{description}</p></div>'
+                 f'<div class="item-tags">{tags}</div><img src="/thumbs/{item_id}.jpg" alt="{title}">'
+                 f'<form method="post" action="/"><input type="hidden" name="type" value="1">'
+                 f'<input type="hidden" name="id" value="{item_id}"><input type="hidden" name="download_link" '
+                 f'value=""></form>')
+    head, tail = template
+    return head.replace(b'{title}', title.encode()) + body.encode() + tail
+
+
+def bench_gzip_files(pages: list[bytes], directory: Path) -> tuple[int, float]:
+    """Stores each page as its own gzip file. Returns the bytes on disk and the seconds taken."""
+    start: float = time.perf_counter()
+    size: int = 0
+    for item_id, page in enumerate(pages):
+        path: Path = directory / f'{item_id}.html.gz'
+        path.write_bytes(gzip.compress(page))
+        size += path.stat().st_size
+    return size, time.perf_counter() - start
+
+
+async def bench_archive(pages: list[bytes], directory: Path, compression: Optional[str],
+                        train_samples: int) -> dict[str, float]:
+    """Stores the pages in an archive, then reads some at random and replays them all. Returns the measurements."""
+    with PageArchive(directory, compression=compression, train_samples=train_samples) as archive:
+        start: float = time.perf_counter()
+        for item_id, page in enumerate(pages):
+            await archive.store(item_id, page)
+        stored: float = time.perf_counter() - start
+
+        ids: list[int] = random.Random(0).choices(range(len(pages)), k=1000)
+        start = time.perf_counter()
+        for item_id in ids:
+            await archive.load(item_id)
+        load: float = (time.perf_counter() - start) / len(ids)
+
+        start = time.perf_counter()
+        replayed: int = await archive.replay(lambda item_id, content: None)
+        replay: float = time.perf_counter() - start
+
+        stats: dict[str, int] = archive.stats()
+    on_disk: int = sum(p.stat().st_size for p in directory.glob('segment-*.bin'))
+    return {'bytes': on_disk, 'ratio': stats['raw_bytes'] / max(on_disk, 1), 'store_per_s': len(pages) / stored,
+            'load_us': load * 1e6, 'replay_per_s': replayed / replay}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--pages', type=int, default=2000, help='pages stored')
+    parser.add_argument('--compression', choices=('zstd', 'zlib'), help='archive compression; zstd if available')
+    args = parser.parse_args()
+
+    log.setLevel(logging.WARNING)
+    template: tuple[bytes, bytes] = make_template()
+    pages: list[bytes] = [make_page(i, template) for i in range(args.pages)]
+    raw: int = sum(map(len, pages))
+    print(f'{args.pages} pages, {raw / 1e6:.1f} MB raw, {raw / len(pages) / 1024:.1f} KiB on average')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        size, seconds = bench_gzip_files(pages, Path(tmp))
+        print(f'{"gzip per file":<24} {size / 1e6:>7.2f} MB  x{raw / size:>5.1f}  {args.pages / seconds:>7.0f} pages/s')
+    for name, samples in (('archive, no dictionary', 0), ('archive, dictionary', 256)):
+        with tempfile.TemporaryDirectory() as tmp:
+            r = await bench_archive(pages, Path(tmp), args.compression, samples)
+        print(f'{name:<24} {r["bytes"] / 1e6:>7.2f} MB  x{r["ratio"]:>5.1f}  {r["store_per_s"]:>7.0f} pages/s'
+              f'  load {r["load_us"]:.0f} us  replay {r["replay_per_s"]:.0f} pages/s')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
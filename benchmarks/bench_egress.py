@@ -0,0 +1,88 @@
+# File: bench_egress.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+"""
+Benchmark of egress route rotation against the simulated server, which rate limits each source on its own: the
+fetcher's single client, against a pool of routes standing in for proxies, with and without per-route rate limits.
+
+Reports items/s, the 429s received, and how the attempts spread over the routes.
+
+Run from the repository root:
+    python -m benchmarks.bench_egress
+    python -m benchmarks.bench_egress --routes 8 --source-rate 10 -n 1000
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Any, Optional
+
+from benchmarks.simserver import SIM_BASE_URL, SimConfig, SimServer
+from scraper.concurrency import AdaptiveConcurrency
+from scraper.egress import EgressPool, EgressRoute
+from scraper.fetcher import Fetcher, ItemRecord
+from scraper.logger import log
+from scraper.ratelimit import TokenBucket
+
+
+async def run(server: SimServer, items: int, routes: int, route_rate: Optional[float]) -> dict[str, Any]:
+    """
+    Fetches ``items`` items, through the fetcher's own client if ``routes`` is zero, else through that many routes.
+    :param route_rate: Requests per second of each route's rate limiter; None for none.
+    """
+    records: int = 0
+
+    def on_item(record: ItemRecord) -> None:
+        nonlocal records
+        records += record.page is not None
+
+    egress: Optional[EgressPool] = None
+    client = None
+    if routes:
+        egress = EgressPool([EgressRoute(f'route{i}', server.client(source=f'route{i}'),
+                                         TokenBucket(route_rate, burst=max(1, int(route_rate))) if route_rate else None)
+                             for i in range(routes)])
+    else:
+        client = server.client(source='single')
+
+    start: float = time.perf_counter()
+    async with Fetcher(client, base_url=SIM_BASE_URL, transport='aggressive', egress=egress,
+                       concurrency=AdaptiveConcurrency(initial=16)) as fetcher:
+        await fetcher.fetch_items(range(items), on_item)
+    elapsed: float = time.perf_counter() - start
+    if egress is not None:
+        await egress.aclose()
+    else:
+        await client.aclose()
+
+    return {'items': records, 'items_per_second': records / elapsed,
+            'throttled': fetcher.metrics.responses_by_status.get(429, 0),
+            'attempts': dict(sorted(fetcher.metrics.attempts_by_route.items()))}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--items', type=int, default=500, help='items fetched per run')
+    parser.add_argument('--routes', type=int, default=4, help='egress routes')
+    parser.add_argument('--source-rate', type=float, default=20.0, help='requests per second allowed per source')
+    args = parser.parse_args()
+
+    log.setLevel(logging.ERROR)
+    config = SimConfig(latency_median=0.02, latency_sigma=0.3, source_rate=args.source_rate)
+    runs: tuple[tuple[str, int, Optional[float]], ...] = (
+        ('single client', 0, None),
+        (f'{args.routes} routes', args.routes, None),
+        (f'{args.routes} routes, paced', args.routes, args.source_rate * 0.9),
+    )
+    for name, routes, rate in runs:
+        r = await run(SimServer(config), args.items, routes, rate)
+        spread: str = ' '.join(str(n) for n in r['attempts'].values())
+        print(f'{name:<20} {r["items"]} items, {r["items_per_second"]:>6.1f} items/s, {r["throttled"]:>4} x 429'
+              + (f', attempts per route: {spread}' if spread else ''))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
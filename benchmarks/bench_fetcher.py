@@ -0,0 +1,202 @@
+# File: bench_fetcher.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+"""
+End-to-end benchmark of the ``Fetcher`` item pipeline against the simulated server, offline.
+
+Reports items/s, item and GET latencies, peak RSS and event-loop lag for each scenario, and compares them to the
+saved baseline. Each scenario runs in a fresh interpreter, so its peak RSS is its own and not the high-water mark of
+the scenarios before it. Throughput regressions beyond the tolerance make the run exit with status 1, and so do latency
+quantiles past the last histogram bucket, which could only be reported as that bucket's bound.
+
+Run from the repository root:
+    python -m benchmarks.bench_fetcher                 # compare to benchmarks/baselines/bench_fetcher.json
+    python -m benchmarks.bench_fetcher --save          # record a new baseline
+    python -m benchmarks.bench_fetcher -s throttled -n 500
+    python -m benchmarks.bench_fetcher -s realistic --trace realistic.json   # Chrome trace of the run
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from benchmarks.simserver import SIM_BASE_URL, SimConfig, SimServer
+from scraper.fetcher import Fetcher, ItemRecord
+from scraper.logger import log
+from scraper.metrics import LATENCY_BUCKETS, Histogram
+from scraper.tracing import Tracer
+
+BASELINE_FILE: Path = Path(__file__).parent / 'baselines' / 'bench_fetcher.json'
+
+SCENARIOS: dict[str, SimConfig] = {
+    # Fast server, measures the fetcher's own overhead.
+    'fast': SimConfig(latency_median=0.002, latency_sigma=0.3),
+    # Latencies and page sizes close to the live site.
+    'realistic': SimConfig(latency_median=0.08, latency_sigma=0.6),
+    # The server pushes back now and then.
+    'throttled': SimConfig(latency_median=0.03, throttle_rate=0.01, unavailable_rate=0.005, retry_after=0.2),
+    # The server goes down for a few seconds mid-run; the circuit breaker holds the queue back meanwhile.
+    'outage': SimConfig(latency_median=0.03, outage_start=0.5, outage_duration=10.0),
+}
+
+# Interval of the event-loop lag probe, in seconds.
+_LAG_INTERVAL: float = 0.01
+
+# Histogram bucket upper bounds for event-loop lag, in seconds.
+_LAG_BUCKETS: tuple[float, ...] = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+
+async def _probe_loop_lag(lag: Histogram) -> None:
+    """Sleeps in a loop, recording how late each wake-up is."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start: float = loop.time()
+        await asyncio.sleep(_LAG_INTERVAL)
+        lag.observe(max(0.0, loop.time() - start - _LAG_INTERVAL))
+
+
+def _peak_rss_mib() -> float:
+    # ru_maxrss is in KiB on Linux, in bytes on macOS.
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+async def run_scenario(config: SimConfig, items: int, trace_file: Optional[Path] = None,
+                       trace_sample: float = 1.0) -> dict[str, Any]:
+    """
+    Fetches ``items`` items through the pipeline against a simulated server. Returns the measurements.
+    :param trace_file: If set, the run is traced and the trace written there.
+    :param trace_sample: Fraction of the tasks traced.
+    """
+    server = SimServer(config)
+    lag: Histogram = Histogram(_LAG_BUCKETS)
+    records: int = 0
+    downloads: int = 0
+
+    def on_item(record: ItemRecord) -> None:
+        nonlocal records, downloads
+        records += 1
+        downloads += record.download is not None
+
+    prober: asyncio.Task = asyncio.create_task(_probe_loop_lag(lag))
+    start: float = time.perf_counter()
+    async with server.client() as client:
+        # The politeness jitter would only measure itself; the aggressive profile has none.
+        tracer: Optional[Tracer] = Tracer(trace_sample) if trace_file is not None else None
+        async with Fetcher(client, base_url=SIM_BASE_URL, transport='aggressive', tracer=tracer,
+                           trace_file=trace_file) as fetcher:
+            await fetcher.fetch_items(range(items), on_item)
+    elapsed: float = time.perf_counter() - start
+    prober.cancel()
+
+    item_latency: Histogram = fetcher.metrics.item_latency
+    get_latency: Histogram = fetcher.metrics.latency_by_method.get('GET', Histogram(LATENCY_BUCKETS))
+    quantiles: dict[str, tuple[Histogram, float]] = {
+        'item_p50_ms': (item_latency, 0.5), 'item_p99_ms': (item_latency, 0.99),
+        'get_p50_ms': (get_latency, 0.5), 'get_p99_ms': (get_latency, 0.99), 'loop_lag_p99_ms': (lag, 0.99),
+    }
+    return {
+        'items': records,
+        'downloads': downloads,
+        'seconds': round(elapsed, 3),
+        'items_per_second': round(records / elapsed, 1),
+        'item_p50_ms': round(item_latency.quantile(0.5) * 1000, 1) if item_latency.count else None,
+        'item_p99_ms': round(item_latency.quantile(0.99) * 1000, 1) if item_latency.count else None,
+        'get_p50_ms': round(get_latency.quantile(0.5) * 1000, 1) if get_latency.count else None,
+        'get_p99_ms': round(get_latency.quantile(0.99) * 1000, 1) if get_latency.count else None,
+        'loop_lag_p99_ms': round(lag.quantile(0.99) * 1000, 2) if lag.count else None,
+        'requests': server.stats.requests,
+        'refused': server.stats.refused,
+        'statuses': {str(k): v for k, v in sorted(server.stats.by_status.items())},
+        'peak_rss_mib': round(_peak_rss_mib(), 1),
+        'overflowed': [key for key, (h, q) in quantiles.items() if h.overflows(q)],
+    }
+
+
+def run_isolated(name: str, items: int, trace_file: Optional[Path] = None, trace_sample: float = 1.0) -> dict[str, Any]:
+    """Runs ``run_scenario()`` for the named scenario in a fresh interpreter. Returns the measurements."""
+    cmd: list[str] = [sys.executable, '-m', 'benchmarks.bench_fetcher', '--child', name, '-n', str(items),
+                      '--trace-sample', str(trace_sample)]
+    if trace_file is not None:
+        cmd += ['--trace', str(trace_file)]
+    out: str = subprocess.run(cmd, cwd=Path(__file__).parent.parent, check=True, stdout=subprocess.PIPE,
+                              text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def _compare(name: str, result: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> bool:
+    """Prints the result against its baseline. Returns False if throughput regressed beyond ``tolerance``."""
+    ok: bool = True
+    for key in ('items_per_second', 'item_p50_ms', 'item_p99_ms', 'loop_lag_p99_ms', 'peak_rss_mib'):
+        new, old = result.get(key), baseline.get(key)
+        if new is None or not old:
+            continue
+        change: float = (new - old) / old
+        flag: str = ''
+        if key == 'items_per_second' and change < -tolerance:
+            flag, ok = '  REGRESSION', False
+        print(f'  {key:<18} {new:>10} (baseline {old}, {change:+.1%}){flag}')
+    if not ok:
+        print(f'  {name}: throughput regressed more than {tolerance:.0%}')
+    return ok
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--scenario', action='append', choices=SCENARIOS,
+                        help='scenario to run; repeatable, all by default')
+    parser.add_argument('-n', '--items', type=int, default=500, help='items per scenario')
+    parser.add_argument('--save', action='store_true', help='save the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed throughput drop, as a fraction')
+    parser.add_argument('--trace', type=Path, help='trace each scenario to this file, suffixed by the scenario name')
+    parser.add_argument('--trace-sample', type=float, default=1.0, help='fraction of the tasks traced')
+    # Runs one scenario in this process and prints its measurements as JSON; see run_isolated().
+    parser.add_argument('--child', choices=SCENARIOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    log.setLevel(logging.ERROR)
+    if args.child is not None:
+        print(json.dumps(await run_scenario(SCENARIOS[args.child], args.items, args.trace, args.trace_sample)))
+        return 0
+
+    baselines: dict[str, Any] = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    results: dict[str, Any] = {}
+    ok: bool = True
+    for name in args.scenario or SCENARIOS:
+        trace_file: Optional[Path] = (args.trace.with_name(f'{args.trace.stem}-{name}{args.trace.suffix}')
+                                      if args.trace is not None else None)
+        result = run_isolated(name, args.items, trace_file, args.trace_sample)
+        result['n'] = args.items
+        print(f'{name}: {result["items_per_second"]} items/s, item p50/p99 {result["item_p50_ms"]}/'
+              f'{result["item_p99_ms"]} ms, loop lag p99 {result["loop_lag_p99_ms"]} ms, '
+              f'peak RSS {result["peak_rss_mib"]} MiB')
+        if overflowed := result.pop('overflowed'):
+            # Clamped to the last bucket bound: not a measurement, so neither compared nor saved.
+            print(f'  {", ".join(overflowed)} past the last histogram bucket; not measured')
+            ok = False
+            continue
+        results[name] = result
+        if not args.save and (baseline := baselines.get(name)) is not None:
+            if baseline.get('n') != args.items:
+                print(f'  baseline ran {baseline.get("n")} items; not comparable')
+            else:
+                ok &= _compare(name, result, baseline, args.tolerance)
+
+    if args.save:
+        BASELINE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE_FILE.write_text(json.dumps({**baselines, **results}, indent=2) + '\n')
+        print(f'Baseline saved to {BASELINE_FILE}')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,69 @@
+# File: bench_parser.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+"""
+Parsing benchmark on synthetic item pages: pages per second of each parse path in a single process, then of the
+``Parser`` process pool with the path it picks.
+
+Run from the repository root:
+    python -m benchmarks.bench_parser
+    python -m benchmarks.bench_parser -n 5000 --workers 4
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from benchmarks.bench_archive import make_page, make_template
+from scraper.logger import log
+from scraper.parser import LexborHTMLParser, ParsedItem, Parser, parse_page_lexbor, parse_page_stdlib
+
+
+def bench_single(parse: Callable[[int, bytes], ParsedItem], pages: list[bytes]) -> float:
+    """Returns the pages per second of ``parse`` in this process."""
+    start: float = time.perf_counter()
+    for item_id, page in enumerate(pages):
+        parse(item_id, page)
+    return len(pages) / (time.perf_counter() - start)
+
+
+async def bench_pool(pages: list[bytes], workers: Optional[int]) -> float:
+    """Returns the pages per second of the ``Parser`` process pool, from the first submit to the last page parsed."""
+    async with Parser(max_workers=workers) as parser:
+        # Start the processes before timing.
+        await parser.submit(0, pages[0])
+        await parser.drain()
+        start: float = time.perf_counter()
+        for item_id, page in enumerate(pages):
+            await parser.submit(item_id, page)
+        await parser.drain()
+        return len(pages) / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--pages', type=int, default=2000, help='pages parsed')
+    parser.add_argument('--workers', type=int, help='parsing processes; defaults to the number of CPUs')
+    args = parser.parse_args()
+
+    log.setLevel(logging.WARNING)
+    template: tuple[bytes, bytes] = make_template()
+    pages: list[bytes] = [make_page(i, template) for i in range(args.pages)]
+    print(f'{args.pages} pages, {sum(map(len, pages)) / len(pages) / 1024:.1f} KiB on average')
+
+    stdlib: float = bench_single(parse_page_stdlib, pages)
+    print(f'{"html.parser":<24} {stdlib:>8.0f} pages/s')
+    if LexborHTMLParser is not None:
+        lexbor: float = bench_single(parse_page_lexbor, pages)
+        print(f'{"selectolax (lexbor)":<24} {lexbor:>8.0f} pages/s  x{lexbor / stdlib:.1f}')
+    else:
+        print(f'{"selectolax (lexbor)":<24} not installed')
+    print(f'{"Parser pool":<24} {await bench_pool(pages, args.workers):>8.0f} pages/s')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,111 @@
+# File: bench_recrawl.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+"""
+Simulated benchmark of re-crawl scheduling: a site whose items change at very different rates is re-crawled once a
+day with a fixed request budget, either sweeping the IDs in turn or with the ``ChangeStore`` plan.
+
+Reports the changes found per request, and how stale the crawled copy is: the fraction of items whose latest
+version has not been fetched. No HTTP involved; the item pages are version counters.
+
+Run from the repository root:
+    python -m benchmarks.bench_recrawl
+    python -m benchmarks.bench_recrawl --items 50000 --budget 2000 --days 90
+"""
+
+import argparse
+import logging
+import math
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from scraper.logger import log
+from scraper.recrawl import ChangeStore
+
+_DAY: float = 86_400.0
+
+
+class SimSite:
+    """Items changing as Poisson processes, most rarely and a few often, as on a catalogue site."""
+
+    def __init__(self, items: int, seed: int = 0):
+        rng = random.Random(seed)
+        # Changes per day: most items are finished and almost never change; a tenth are still updated, from once in
+        # three months to once a day.
+        self.rates: list[float] = [math.exp(rng.uniform(math.log(1 / 90), 0.0)) if rng.random() < 0.1 else 1 / 3000
+                                   for _ in range(items)]
+        self._rng: random.Random = rng
+        # Version of each item, and the day until which its changes were drawn.
+        self.versions: list[int] = [0] * items
+        self._drawn: list[float] = [0.0] * items
+
+    def version(self, item_id: int, day: float) -> int:
+        """Returns the version of an item on ``day``, drawing its changes since last asked."""
+        rate: float = self.rates[item_id]
+        t: float = self._drawn[item_id]
+        while (t := t + self._rng.expovariate(rate)) <= day:
+            self.versions[item_id] += 1
+        # Memorylessness: redraw from ``day`` next time.
+        self._drawn[item_id] = day
+        return self.versions[item_id]
+
+
+def run(items: int, budget: int, days: int, scheduled: bool) -> tuple[float, float, float]:
+    """
+    Re-crawls the simulated site once a day for ``days`` days, after a first full crawl.
+    :returns: Changes found per request, mean fraction of stale items at the end of each day, seconds spent planning.
+    """
+    site = SimSite(items)
+    seen: list[int] = [0] * items
+    found: int = 0
+    requests: int = 0
+    stale: float = 0.0
+    planning: float = 0.0
+    cursor: int = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ChangeStore(Path(tmp) / 'changes.sqlite')
+        with store:
+            for item_id in range(items):
+                store.record(item_id, b'0', 0.0)
+
+        for day in range(1, days + 1):
+            if scheduled:
+                start: float = time.perf_counter()
+                ids = store.plan(budget, items - 1, now=day * _DAY).known_ids
+                planning += time.perf_counter() - start
+            else:
+                ids = [(cursor + i) % items for i in range(budget)]
+                cursor = (cursor + budget) % items
+            with store:
+                for item_id in ids:
+                    version: int = site.version(item_id, day)
+                    requests += 1
+                    found += version != seen[item_id]
+                    seen[item_id] = version
+                    store.record(item_id, str(version).encode(), day * _DAY)
+            stale += sum(site.version(i, day) != seen[i] for i in range(items)) / items
+    return found / requests, stale / days, planning / days
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--items', type=int, default=20_000, help='items on the site')
+    parser.add_argument('--budget', type=int, default=1_000, help='requests per day')
+    parser.add_argument('--days', type=int, default=60, help='days simulated')
+    args = parser.parse_args()
+
+    log.setLevel(logging.WARNING)
+    print(f'{args.items} items, {args.budget} requests a day, {args.days} days')
+    for name, scheduled in (('sweep', False), ('change-aware', True)):
+        per_request, stale, planning = run(args.items, args.budget, args.days, scheduled)
+        print(f'{name:<13} {per_request:>6.3f} changes found per request, {stale:>6.1%} of items stale on average'
+              + (f', {planning * 1000:.0f} ms planning per run' if scheduled else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# File: bench_startup.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+"""
+Startup benchmark: how long a fresh process takes to import the fetcher and build one, as CLI runs and sharded
+workers do, and what building request headers costs per request.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup
+"""
+
+import asyncio
+import logging
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from yarl import URL
+
+from scraper.fetcher import Fetcher
+from scraper.headers import HeaderPool, load_user_agents, _parse_user_agents, _read_sidecar
+from scraper.logger import log
+
+_ROOT: Path = Path(__file__).parent.parent
+_USER_AGENTS: Path = _ROOT / 'user_agents.txt'
+
+# Scripts timed in fresh interpreters.
+_SCRIPTS: dict[str, str] = {
+    'interpreter': 'pass',
+    'import scraper.fetcher': 'import scraper.fetcher',
+    'first Fetcher()': (
+        'import asyncio\n'
+        'from scraper.fetcher import Fetcher\n'
+        'async def main():\n'
+        '    async with Fetcher():\n'
+        '        pass\n'
+        'asyncio.run(main())\n'
+    ),
+}
+
+
+def bench_process(script: str, runs: int = 7) -> float:
+    """Returns the median wall time of a fresh interpreter running ``script``, in milliseconds."""
+    times: list[float] = []
+    for _ in range(runs):
+        start: float = time.perf_counter()
+        subprocess.run([sys.executable, '-c', script], cwd=_ROOT, check=True, capture_output=True)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def _old_load_user_agents(filename: Path) -> list[str]:
+    """The previous loader: parses the whole file on every ``Fetcher()``."""
+    with filename.open('r', encoding='utf-8') as f:
+        return list(set([agent.strip() if len((part := agent.split('|', 1))) == 1 else part[1].strip() for agent in f]))
+
+
+def _per_run(fn, runs: int) -> float:
+    """Returns the mean time of ``fn()``, in microseconds."""
+    start: float = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def bench_user_agents(runs: int = 200) -> tuple[float, float, float, float]:
+    """
+    Returns the time to get the user agents the old way, by parsing the file, from the pre-parsed sidecar as a new
+    process does, and from the in-process cache, in microseconds.
+    """
+    load_user_agents(_USER_AGENTS)
+    st = _USER_AGENTS.stat()
+    stamp: tuple[int, int] = (st.st_mtime_ns, st.st_size)
+    return (_per_run(lambda: _old_load_user_agents(_USER_AGENTS), runs),
+            _per_run(lambda: _parse_user_agents(_USER_AGENTS), runs),
+            _per_run(lambda: _read_sidecar(_USER_AGENTS, stamp), runs),
+            _per_run(lambda: load_user_agents(_USER_AGENTS), runs))
+
+
+def bench_headers(n: int = 200_000) -> tuple[float, float]:
+    """Returns the cost of the headers of one request the old way, then from the ``HeaderPool``, in nanoseconds."""
+    agents: list[str] = _old_load_user_agents(_USER_AGENTS)
+    url: URL = URL('https://doujinstyle.com/?p=page&type=1&id=198')
+    url_str: str = str(url)
+
+    start: float = time.perf_counter()
+    for _ in range(n):
+        {'User-Agent': random.choice(agents), 'Referer': str(url)}
+    old: float = (time.perf_counter() - start) / n * 1e9
+
+    pool: HeaderPool = HeaderPool.from_file(_USER_AGENTS)
+    start = time.perf_counter()
+    for _ in range(n):
+        pool.with_referer(url_str)
+    return old, (time.perf_counter() - start) / n * 1e9
+
+
+async def bench_fetcher_init(runs: int = 20) -> list[float]:
+    """Returns the time to build and close each of ``runs`` fetchers with their own client, in milliseconds."""
+    times: list[float] = []
+    for _ in range(runs):
+        start: float = time.perf_counter()
+        async with Fetcher():
+            pass
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main() -> None:
+    log.setLevel(logging.WARNING)
+    base: float = bench_process(_SCRIPTS['interpreter'])
+    print(f'{"interpreter":<24} {base:>7.1f} ms')
+    for name, script in _SCRIPTS.items():
+        if name != 'interpreter':
+            ms: float = bench_process(script)
+            print(f'{name:<24} {ms:>7.1f} ms (+{ms - base:.1f} ms over the bare interpreter)')
+
+    times: list[float] = asyncio.run(bench_fetcher_init())
+    print(f'Fetcher() in-process:    first {times[0]:.2f} ms, then median {statistics.median(times[1:]):.2f} ms')
+    old, parsed, sidecar, cached = bench_user_agents()
+    print(f'User agents per process: {old:>8.1f} us old loader, {parsed:.1f} us parsed, {sidecar:.1f} us from the '
+          f'sidecar, {cached:.1f} us cached in-process')
+    old, new = bench_headers()
+    print(f'Headers per request:     {old:>8.0f} ns dict + random.choice, {new:.0f} ns prebuilt rotation')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# File: bench_task_queue.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+"""
+Micro-benchmark of the fetcher's ``TaskPriorityQueue`` against the former polling implementation.
+
+Run from the repository root:
+    python -m benchmarks.bench_task_queue
+"""
+
+import asyncio
+import logging
+import statistics
+import time
+import tracemalloc
+
+from yarl import URL
+
+from scraper.fetcher import GetTask, PostTask, RangeTask, StopTask, Task, TaskPriorityQueue
+from scraper.logger import log
+
+
+class PollingTaskPriorityQueue:
+    """The previous queue: spins on ``get_nowait()`` plus a 50 ms ``wait_for()`` on the GET queue."""
+
+    def __init__(self, size: int):
+        self.q_post: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.q_get: asyncio.Queue = asyncio.Queue(maxsize=size)
+
+    async def put(self, task: Task) -> bool:
+        match task:
+            case PostTask() | StopTask():
+                await self.q_post.put(task)
+            case GetTask():
+                await self.q_get.put(task)
+        return True
+
+    async def get(self) -> Task:
+        while True:
+            try:
+                return self.q_post.get_nowait()
+            except asyncio.QueueEmpty:
+                pass
+            try:
+                return await asyncio.wait_for(self.q_get.get(), timeout=0.05)
+            except asyncio.TimeoutError:
+                pass
+
+    def task_done(self, item: Task):
+        match item:
+            case GetTask():
+                self.q_get.task_done()
+            case _:
+                self.q_post.task_done()
+
+    async def join(self):
+        await asyncio.gather(self.q_post.join(), self.q_get.join())
+
+
+_URL: URL = URL('https://doujinstyle.com/?p=page&type=1&id=0')
+
+
+async def bench_throughput(queue_cls: type, n: int = 50_000) -> float:
+    """One producer, one consumer, mixed GET/POST tasks. Returns tasks per second."""
+    q = queue_cls(100)
+    tasks: list[Task] = [PostTask(i, _URL) if i % 4 == 0 else GetTask(i, _URL) for i in range(n)]
+
+    async def produce():
+        for t in tasks:
+            await q.put(t)
+
+    async def consume():
+        for _ in range(n):
+            q.task_done(await q.get())
+
+    start: float = time.perf_counter()
+    await asyncio.gather(produce(), consume())
+    await q.join()
+    return n / (time.perf_counter() - start)
+
+
+async def bench_wakeup(queue_cls: type, task_cls: type, rounds: int = 200) -> list[float]:
+    """Measures the delay between a put() and the parked consumer waking up, in milliseconds."""
+    q = queue_cls(100)
+    latencies: list[float] = []
+    for i in range(rounds):
+        consumer = asyncio.create_task(q.get())
+        # Let the consumer park on the empty queue, mid-way in a polling interval.
+        await asyncio.sleep(0.013)
+        start: float = time.perf_counter()
+        await q.put(task_cls(i, _URL))
+        task = await consumer
+        latencies.append((time.perf_counter() - start) * 1000)
+        q.task_done(task)
+    return latencies
+
+
+async def bench_idle_wakeups(queue_cls: type, duration: float = 1.0) -> int:
+    """Counts how many times the event loop runs a callback while a consumer waits on an empty queue."""
+    q = queue_cls(100)
+    loop = asyncio.get_running_loop()
+    count: int = 0
+    original = loop._run_once
+
+    def counting_run_once():
+        nonlocal count
+        count += 1
+        original()
+
+    loop._run_once = counting_run_once
+    consumer = asyncio.create_task(q.get())
+    await asyncio.sleep(duration)
+    loop._run_once = original
+    consumer.cancel()
+    try:
+        await consumer
+    except asyncio.CancelledError:
+        pass
+    return count
+
+
+async def bench_scheduling(blocks: bool, n: int = 200_000, block_size: int = 4096) -> tuple[float, float]:
+    """
+    Enqueues ``n`` IDs in an unbounded queue, one ``GetTask`` per ID (URL built with ``with_query()``) or as
+    ``RangeTask`` blocks. Returns the seconds taken, and the peak memory in MiB measured by a second, traced run.
+    """
+    base: URL = URL('https://doujinstyle.com/')
+    prefix: str = f'{base.with_query(p="page", type="1")}&id='
+
+    def make_task(item_id: int) -> GetTask:
+        return GetTask(item_id, URL(prefix + str(item_id), encoded=True))
+
+    async def schedule() -> TaskPriorityQueue:
+        q = TaskPriorityQueue(0)
+        if blocks:
+            for i in range(0, n, block_size):
+                await q.put(RangeTask(range(i, min(n, i + block_size)), make_task))
+        else:
+            for item_id in range(n):
+                await q.put(GetTask(item_id, base.with_query(p='page', type='1', id=item_id)))
+        return q
+
+    start: float = time.perf_counter()
+    await schedule()
+    elapsed: float = time.perf_counter() - start
+
+    tracemalloc.start()
+    q = await schedule()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del q
+    return elapsed, peak / (1 << 20)
+
+
+async def main() -> None:
+    log.setLevel(logging.WARNING)
+    for queue_cls in (PollingTaskPriorityQueue, TaskPriorityQueue):
+        print(f'{queue_cls.__name__}:')
+        print(f'  throughput:        {await bench_throughput(queue_cls):>12,.0f} tasks/s')
+        for task_cls in (PostTask, GetTask):
+            lat: list[float] = await bench_wakeup(queue_cls, task_cls)
+            print(f'  {task_cls.__name__} wake-up p50:  {statistics.median(lat):>9.3f} ms'
+                  f'  max: {max(lat):.3f} ms')
+        print(f'  idle loop iterations/s: {await bench_idle_wakeups(queue_cls):>6}')
+
+    for blocks in (False, True):
+        elapsed, peak = await bench_scheduling(blocks)
+        print(f'Scheduling 200k IDs as {"RangeTask blocks" if blocks else "GetTasks"}: {elapsed * 1000:.1f} ms, '
+              f'peak {peak:.2f} MiB')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
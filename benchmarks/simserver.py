@@ -0,0 +1,163 @@
+# File: simserver.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+"""
+Simulated doujinstyle server, to run the real ``Fetcher`` offline through ``httpx.MockTransport``.
+
+    server = SimServer(SimConfig(latency_median=0.02, throttle_rate=0.01))
+    async with server.client() as client:
+        async with Fetcher(client, base_url=SIM_BASE_URL) as fetcher:
+            ...
+"""
+
+import asyncio
+import functools
+import math
+import random
+from dataclasses import dataclass, field
+from typing import Optional
+
+import httpx
+
+# Base URL to give the fetcher; any host works, this one makes logs obvious.
+SIM_BASE_URL: str = 'https://sim.doujinstyle.test/'
+
+# Host the download form POST redirects to.
+_CDN_HOST: str = 'cdn.doujinstyle.test'
+
+
+@dataclass(frozen=True)
+class SimConfig:
+    """
+    Behaviour of the simulated server. Latencies and page sizes are log-normal, like real ones: most are close to
+    the median, with a long tail.
+    """
+    # Median and log-space standard deviation of the time to answer, in seconds.
+    latency_median: float = 0.05
+    latency_sigma: float = 0.5
+
+    # Median and log-space standard deviation of item page sizes, in bytes.
+    page_median_bytes: int = 30_000
+    page_sigma: float = 0.4
+
+    # Fractions of item requests answered 429 Too Many Requests and 503 Service Unavailable.
+    throttle_rate: float = 0.0
+    unavailable_rate: float = 0.0
+
+    # Retry-After value sent along with 429 and 503, in seconds; None sends none.
+    retry_after: Optional[float] = 0.5
+
+    # Fraction of IDs that do not exist (404).
+    missing_rate: float = 0.05
+
+    # Fraction of item pages carrying the download form, whose POST redirects to the download link.
+    download_rate: float = 0.8
+
+    # Seconds after the first request at which the server goes down, refusing every connection, and for how long.
+    outage_start: Optional[float] = None
+    outage_duration: float = 0.0
+
+    # Requests per second a single source (client, e.g. behind its own proxy) may send; past that, the server answers
+    # 429 to that source only. None for no limit.
+    source_rate: Optional[float] = None
+
+    # IDs above this do not exist; None for no upper bound.
+    max_id: Optional[int] = None
+
+    # Seed of the random generator; item properties (missing, size, form) only depend on the ID and the seed.
+    seed: int = 0
+
+
+@dataclass
+class SimStats:
+    """What the simulated server answered."""
+    requests: int = 0
+    # Requests refused during the outage.
+    refused: int = 0
+    by_status: dict[int, int] = field(default_factory=dict)
+
+
+class SimServer:
+    """Request handler for ``httpx.MockTransport`` simulating the site, configured by a ``SimConfig``."""
+
+    def __init__(self, config: SimConfig = SimConfig()):
+        self.config: SimConfig = config
+        self.stats: SimStats = SimStats()
+        self._rng: random.Random = random.Random(config.seed)
+        # Filler the pages are cut from, generated once.
+        self._filler: bytes = bytes(random.Random(config.seed).choices(b'abcdefghijklmnopqrstuvwxyz <>/="', k=1 << 20))
+        # Loop time of the first request.
+        self._started: Optional[float] = None
+        # Per source: tokens left and loop time of the last refill, for ``source_rate``.
+        self._sources: dict[str, tuple[float, float]] = {}
+
+    def client(self, source: str = 'default', **kwargs) -> httpx.AsyncClient:
+        """
+        Returns a client wired to this server; ``kwargs`` go to ``httpx.AsyncClient``.
+        :param source: Identity of the client's requests for ``source_rate``, like a source address.
+        """
+        kwargs.setdefault('follow_redirects', True)
+        return httpx.AsyncClient(transport=httpx.MockTransport(functools.partial(self.handle, source=source)),
+                                 **kwargs)
+
+    def _over_rate(self, source: str, now: float) -> bool:
+        """Takes a token of the source's bucket, which holds one second of requests. True if there was none."""
+        rate: float = self.config.source_rate
+        tokens, updated = self._sources.get(source, (rate, now))
+        tokens = min(rate, tokens + (now - updated) * rate)
+        over: bool = tokens < 1.0
+        self._sources[source] = (tokens if over else tokens - 1.0, now)
+        return over
+
+    def _item(self, item_id: int) -> tuple[bool, int, bool]:
+        """Returns whether the item exists, its page size, and whether it has the download form."""
+        c: SimConfig = self.config
+        rng = random.Random(c.seed * 1_000_003 + item_id)
+        exists: bool = (c.max_id is None or item_id <= c.max_id) and rng.random() >= c.missing_rate
+        size: int = int(rng.lognormvariate(math.log(c.page_median_bytes), c.page_sigma))
+        return exists, min(size, len(self._filler)), rng.random() < c.download_rate
+
+    def _respond(self, status: int, **kwargs) -> httpx.Response:
+        self.stats.by_status[status] = self.stats.by_status.get(status, 0) + 1
+        return httpx.Response(status, **kwargs)
+
+    async def handle(self, request: httpx.Request, source: str = 'default') -> httpx.Response:
+        c: SimConfig = self.config
+        self.stats.requests += 1
+        now: float = asyncio.get_running_loop().time()
+        if self._started is None:
+            self._started = now
+        if c.outage_start is not None and 0 <= now - self._started - c.outage_start < c.outage_duration:
+            self.stats.refused += 1
+            raise httpx.ConnectError('Connection refused', request=request)
+        await asyncio.sleep(self._rng.lognormvariate(math.log(c.latency_median), c.latency_sigma))
+
+        if request.url.host == _CDN_HOST:
+            return self._respond(200, content=b'PK\x03\x04')
+
+        if c.source_rate is not None and self._over_rate(source, asyncio.get_running_loop().time()):
+            return self._respond(429, headers={'Retry-After': '1'})
+
+        roll: float = self._rng.random()
+        if roll < c.throttle_rate + c.unavailable_rate:
+            headers = {'Retry-After': f'{c.retry_after:g}'} if c.retry_after is not None else {}
+            return self._respond(429 if roll < c.throttle_rate else 503, headers=headers)
+
+        try:
+            item_id: int = int(request.url.params.get('id', ''))
+        except ValueError:
+            return self._respond(400)
+        exists, size, has_form = self._item(item_id)
+        if not exists:
+            return self._respond(404)
+
+        if request.method == 'POST':
+            return self._respond(302, headers={'Location': f'https://{_CDN_HOST}/files/{item_id}.zip'})
+
+        form: bytes = b'<form method="post"><input name="download_link" value=""></form>' if has_form else b''
+        head: bytes = f'<html><head><title>Item {item_id}</title></head><body>'.encode()
+        offset: int = item_id % (len(self._filler) - size + 1)
+        body: bytes = head + form + self._filler[offset:offset + size] + b'</body></html>'
+        return self._respond(200, content=body, headers={'Content-Type': 'text/html; charset=utf-8'})
@@ -0,0 +1,328 @@
+# File: archive.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+import itertools
+import mmap
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Callable, TypeVar, Iterator, Iterable, Awaitable, BinaryIO
+
+from scraper.fetcher import Outcome, GetResp
+from scraper.logger import log
+from scraper.recrawl import content_digest
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+T = TypeVar('T')
+
+# Largest preset dictionary zlib makes use of: its window.
+_ZLIB_DICT_SIZE: int = 32 * 1024
+
+
+class _Codec:
+    """Compresses page bodies with one dictionary, or none. Not thread-safe: one instance per thread."""
+
+    def __init__(self, compression: str, level: int, dictionary: Optional[bytes]):
+        self._compression: str = compression
+        self._level: int = level
+        self._dict: Optional[bytes] = dictionary
+        if compression == 'zstd':
+            zdict = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+            self._zc = zstandard.ZstdCompressor(level=level, dict_data=zdict)
+            self._zd = zstandard.ZstdDecompressor(dict_data=zdict)
+
+    def compress(self, data: bytes) -> bytes:
+        if self._compression == 'zstd':
+            return self._zc.compress(data)
+        c = zlib.compressobj(self._level, zdict=self._dict) if self._dict else zlib.compressobj(self._level)
+        return c.compress(data) + c.flush()
+
+    def decompress(self, data: bytes | memoryview) -> bytes:
+        if self._compression == 'zstd':
+            return self._zd.decompress(data)
+        d = zlib.decompressobj(zdict=self._dict) if self._dict else zlib.decompressobj()
+        return d.decompress(data) + d.flush()
+
+
+def train_dictionary(compression: str, samples: list[bytes], dict_size: int) -> bytes:
+    """
+    Builds a compression dictionary out of sample pages. zstd trains one on the samples; zlib only uses a preset
+    dictionary as history preceding the data, so it gets the tail of the sample of median size, which holds the
+    shared template markup.
+    """
+    if compression == 'zstd':
+        return zstandard.train_dictionary(dict_size, samples).as_bytes()
+    median: bytes = sorted(samples, key=len)[len(samples) // 2]
+    return median[-min(dict_size, _ZLIB_DICT_SIZE):]
+
+
+class PageArchive:
+    """
+    Append-only archive of raw item pages, to parse them again without the network.
+
+    Pages share most of their template markup, so each one is compressed on its own with a dictionary trained on the
+    first pages stored (zstd with the ``zstandard`` package, zlib otherwise): random reads stay cheap while the
+    ratio gets close to that of compressing pages together. Pages stored before the dictionary, or under an older
+    one, keep theirs; ``retrain()`` starts a new dictionary for the pages to come.
+
+    Compressed pages are appended to segment files of at most ``segment_bytes``, and identical pages are stored once.
+    A SQLite index maps each item to its page (the latest one stored) and each page to its place in a segment.
+    Reads slice memory-mapped segments.
+
+    Disk access runs on a single dedicated thread, off the event loop.
+
+    Usage:
+        with PageArchive('archive/') as archive:
+            async with Fetcher(client) as fetcher:
+                await fetcher.fetch_range(range(100), archive.archive_outcome)
+
+        # Later, offline:
+        with PageArchive('archive/') as archive:
+            async with Parser(on_parsed=exporter.export_dataclass) as parser:
+                await archive.replay(parser.submit)
+    """
+
+    def __init__(self, directory: Path, compression: Optional[str] = None, level: int = 9,
+                 segment_bytes: int = 256 * 1024 * 1024, dict_size: int = 112 * 1024, train_samples: int = 256):
+        """
+        :param directory: Directory holding the index and the segments; created if missing.
+        :param compression: 'zstd' (requires the ``zstandard`` package) or 'zlib'. Defaults to the one the archive
+        was created with, else zstd if available.
+        :param level: Compression level.
+        :param segment_bytes: Size after which a new segment file is started.
+        :param dict_size: Size of the trained dictionaries in bytes; zlib uses 32 KiB at most.
+        :param train_samples: Pages the first dictionary is trained on; 0 never trains one.
+        """
+        if compression not in (None, 'zstd', 'zlib'):
+            raise ValueError(f'Unknown compression: {compression}')
+        self._dir: Path = Path(directory)
+        self._compression: Optional[str] = compression
+        self._level: int = level
+        self._segment_bytes: int = segment_bytes
+        self._dict_size: int = dict_size
+        self._train_samples: int = train_samples
+
+        # The only thread touching the index and the segments.
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='PageArchive')
+        self._db: Optional[sqlite3.Connection] = None
+        # Codecs by dictionary ID, 0 for none, and the ID new pages are compressed with.
+        self._codecs: dict[int, _Codec] = {}
+        self._dict_id: int = 0
+        # Pages kept to train the first dictionary on.
+        self._samples: list[bytes] = []
+        # Segment appended to, its number and size.
+        self._segment: Optional[BinaryIO] = None
+        self._segment_no: int = 0
+        self._segment_size: int = 0
+        # Read-only maps of the segments, by number.
+        self._maps: dict[int, mmap.mmap] = {}
+
+    def __enter__(self) -> 'PageArchive':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        self._executor.submit(self._open_sync).result()
+
+    def close(self) -> None:
+        self._executor.submit(self._close_sync).result()
+        self._executor.shutdown()
+
+    async def _run(self, fn: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def store(self, item_id: int, content: bytes) -> bool:
+        """Stores the page of an item, replacing its previous one. Returns False if the same page was stored already."""
+        return await self._run(self._store_sync, item_id, content)
+
+    async def load(self, item_id: int) -> Optional[bytes]:
+        """Returns the page of an item, or None if it is not archived."""
+        return await self._run(self._load_sync, item_id)
+
+    async def archive_outcome(self, outcome: Outcome) -> None:
+        """Fetcher callback archiving each page fetched in full."""
+        if isinstance(page := outcome.res, GetResp) and not page.truncated:
+            await self.store(outcome.item_id, page.content)
+
+    async def replay(self, submit: Callable[[int, bytes], None | Awaitable[None]], ids: Optional[Iterable[int]] = None,
+                     batch_size: int = 64) -> int:
+        """
+        Feeds archived pages to ``submit``, e.g. ``Parser.submit``, reading and decompressing them by batches on the
+        archive's thread. Awaits ``submit`` if it returns an awaitable, so a busy parser holds reading back.
+        :param ids: Items to replay; all of them, in segment order, if None.
+        :returns: The number of pages replayed.
+        """
+        pages: Iterator[tuple[int, bytes]] = self.iter_pages(ids)
+        count: int = 0
+        while batch := await self._run(lambda: list(itertools.islice(pages, batch_size))):
+            for item_id, content in batch:
+                if (r := submit(item_id, content)) is not None:
+                    await r
+                count += 1
+        return count
+
+    def iter_pages(self, ids: Optional[Iterable[int]] = None) -> Iterator[tuple[int, bytes]]:
+        """
+        Yields ``(item_id, page)`` pairs. Blocking, and must run on the archive's thread while it is open; see
+        ``replay()``. Without ``ids``, pages come in the order they are laid out on disk, for sequential reads.
+        """
+        query: str = ('SELECT p.item_id, b.segment, b.offset, b.length, b.dict_id FROM pages p JOIN blobs b '
+                      'USING (digest)')
+        # A connection of its own, whose cursor stays open in between batches while pages are stored.
+        db = sqlite3.connect(self._dir / 'index.sqlite', check_same_thread=False)
+        try:
+            if ids is None:
+                rows = db.execute(f'{query} ORDER BY b.segment, b.offset')
+            else:
+                rows = (row for item_id in ids for row in db.execute(f'{query} WHERE p.item_id = ?', (item_id,)))
+            for item_id, segment, offset, length, dict_id in rows:
+                yield item_id, self._read(segment, offset, length, dict_id)
+        finally:
+            db.close()
+
+    def stats(self) -> dict[str, int]:
+        """Returns the number of items and distinct pages, and the bytes of the pages before and after compression."""
+        return self._executor.submit(self._stats_sync).result()
+
+    def retrain(self, samples: int = 256) -> None:
+        """Trains a new dictionary on archived pages picked at random; pages stored from now on use it."""
+        self._executor.submit(self._retrain_sync, samples).result()
+
+    # Everything below runs on the archive's thread.
+
+    def _segment_path(self, segment: int) -> Path:
+        return self._dir / f'segment-{segment:06}.bin'
+
+    def _open_sync(self) -> None:
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self._dir / 'index.sqlite', check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS dicts (dict_id INTEGER PRIMARY KEY, data BLOB NOT NULL)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS blobs ('
+                             'digest BLOB PRIMARY KEY, segment INTEGER NOT NULL, offset INTEGER NOT NULL, '
+                             'length INTEGER NOT NULL, size INTEGER NOT NULL, dict_id INTEGER NOT NULL'
+                             ') WITHOUT ROWID')
+            self._db.execute('CREATE TABLE IF NOT EXISTS pages ('
+                             'item_id INTEGER PRIMARY KEY, digest BLOB NOT NULL, stored REAL NOT NULL'
+                             ') WITHOUT ROWID')
+
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'compression'").fetchone()
+            if row is not None:
+                if self._compression is not None and self._compression != row[0]:
+                    raise ValueError(f'{self._dir} is a {row[0]} archive, not {self._compression}.')
+                self._compression = row[0]
+            else:
+                self._compression = self._compression or ('zstd' if zstandard is not None else 'zlib')
+                self._db.execute("INSERT INTO meta (key, value) VALUES ('compression', ?)", (self._compression,))
+        if self._compression == 'zstd' and zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package.")
+
+        self._codecs = {0: _Codec(self._compression, self._level, None)}
+        for dict_id, data in self._db.execute('SELECT dict_id, data FROM dicts'):
+            self._codecs[dict_id] = _Codec(self._compression, self._level, data)
+        self._dict_id = max(self._codecs)
+
+        self._segment_no = self._db.execute('SELECT COALESCE(MAX(segment), 1) FROM blobs').fetchone()[0]
+        self._open_segment()
+
+    def _close_sync(self) -> None:
+        for m in self._maps.values():
+            m.close()
+        self._maps.clear()
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _open_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+        self._segment = self._segment_path(self._segment_no).open('ab')
+        self._segment_size = self._segment.tell()
+
+    def _store_sync(self, item_id: int, content: bytes) -> bool:
+        digest: bytes = content_digest(content)
+        known: bool = self._db.execute('SELECT 1 FROM blobs WHERE digest = ?', (digest,)).fetchone() is not None
+        if not known:
+            if self._dict_id == 0 and self._train_samples > 0:
+                self._collect_sample(content)
+            data: bytes = self._codecs[self._dict_id].compress(content)
+            if self._segment_size and self._segment_size + len(data) > self._segment_bytes:
+                self._segment_no += 1
+                self._open_segment()
+            offset: int = self._segment_size
+            # Data first: a crash leaves unreferenced bytes at the end of the segment, never a dangling index entry.
+            self._segment.write(data)
+            self._segment.flush()
+            self._segment_size += len(data)
+        with self._db:
+            if not known:
+                self._db.execute('INSERT INTO blobs (digest, segment, offset, length, size, dict_id) '
+                                 'VALUES (?, ?, ?, ?, ?, ?)',
+                                 (digest, self._segment_no, offset, len(data), len(content), self._dict_id))
+            self._db.execute('INSERT OR REPLACE INTO pages (item_id, digest, stored) VALUES (?, ?, ?)',
+                             (item_id, digest, time.time()))
+        return not known
+
+    def _load_sync(self, item_id: int) -> Optional[bytes]:
+        row = self._db.execute('SELECT b.segment, b.offset, b.length, b.dict_id FROM pages p JOIN blobs b '
+                               'USING (digest) WHERE p.item_id = ?', (item_id,)).fetchone()
+        return self._read(*row) if row is not None else None
+
+    def _read(self, segment: int, offset: int, length: int, dict_id: int) -> bytes:
+        m: Optional[mmap.mmap] = self._maps.get(segment)
+        if m is None or offset + length > len(m):
+            # The segment appended to grew since it was mapped.
+            if m is not None:
+                m.close()
+            with self._segment_path(segment).open('rb') as f:
+                m = self._maps[segment] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._codecs[dict_id].decompress(memoryview(m)[offset:offset + length])
+
+    def _collect_sample(self, content: bytes) -> None:
+        """Keeps a page to train the first dictionary on; trains it once there are enough."""
+        self._samples.append(content)
+        if len(self._samples) >= self._train_samples:
+            samples, self._samples = self._samples, []
+            self._add_dictionary(samples)
+
+    def _retrain_sync(self, samples: int) -> None:
+        rows = self._db.execute('SELECT p.item_id FROM pages p ORDER BY RANDOM() LIMIT ?', (samples,)).fetchall()
+        self._add_dictionary([self._load_sync(item_id) for (item_id,) in rows])
+
+    def _add_dictionary(self, samples: list[bytes]) -> None:
+        try:
+            data: bytes = train_dictionary(self._compression, samples, self._dict_size)
+        except Exception as e:
+            # E.g. too few or too small samples for zstd; pages are compressed without a dictionary.
+            log.warning(f'Failed to train a page archive dictionary on {len(samples)} pages: {e}')
+            self._train_samples = 0
+            return
+        with self._db:
+            dict_id: int = self._db.execute('INSERT INTO dicts (data) VALUES (?)', (data,)).lastrowid
+        self._codecs[dict_id] = _Codec(self._compression, self._level, data)
+        self._dict_id = dict_id
+        log.info(f'Page archive dictionary #{dict_id}: {len(data)} bytes trained on {len(samples)} pages')
+
+    def _stats_sync(self) -> dict[str, int]:
+        items: int = self._db.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+        blobs, size, length = self._db.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(length), 0) FROM blobs').fetchone()
+        return {'items': items, 'pages': blobs, 'raw_bytes': size, 'stored_bytes': length}
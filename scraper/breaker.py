@@ -0,0 +1,193 @@
+# File: breaker.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+import math
+from collections import deque
+from enum import Enum
+from typing import Optional
+
+from scraper.logger import log, Event
+
+
+class BreakerState(Enum):
+    # Requests flow normally.
+    CLOSED = 'closed'
+    # The server is deemed down: nothing is dequeued until the cool-off ends.
+    OPEN = 'open'
+    # The cool-off ended: a single probe request decides whether to close or to open again.
+    HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker:
+    """
+    Fetcher-wide circuit breaker: once the server looks down, the whole queue stops instead of every task burning its
+    own retries against it.
+
+    It opens after ``consecutive_failures`` failures in a row, or once at least ``error_rate`` of the last ``window``
+    attempts failed. While open, the fetcher dequeues nothing, and the tasks whose attempt fails meanwhile are put
+    back in the queue rather than given up. After ``open_for`` seconds it lets a single probe request through: a
+    success closes it and the fetcher resumes at full speed, a failure opens it again for twice as long, up to
+    ``max_open_for``. Only the probe decides: attempts sent before the breaker opened and ending while half-open are
+    ignored.
+
+    Only server-side failures count: 5xx statuses and transport errors. Any other response, 404 or 429 included,
+    shows the server is up.
+    """
+
+    def __init__(self, consecutive_failures: int = 10, error_rate: float = 0.5, window: int = 50,
+                 min_samples: int = 20, open_for: float = 5.0, max_open_for: float = 120.0,
+                 give_up_after: Optional[float] = 3600.0):
+        """
+        :param consecutive_failures: Failures in a row that open the breaker.
+        :param error_rate: Fraction of failed attempts among the last ``window`` that opens the breaker, in ]0, 1].
+        :param window: Number of recent attempts the error rate is computed over.
+        :param min_samples: Attempts needed in the window before the error rate is considered.
+        :param open_for: Seconds the breaker stays open before the first probe.
+        :param max_open_for: Upper bound of the cool-off, which doubles after every failed probe.
+        :param give_up_after: Seconds without recovery after which the breaker disables itself for good, so a site
+        that stays down fails the remaining tasks instead of stalling the run forever. None waits indefinitely.
+        """
+        if consecutive_failures < 1:
+            raise ValueError('consecutive_failures must be at least one.')
+        if not 0.0 < error_rate <= 1.0:
+            raise ValueError('error_rate must be in ]0, 1].')
+        if not 1 <= min_samples <= window:
+            raise ValueError('Expected 1 <= min_samples <= window.')
+        if not 0.0 < open_for <= max_open_for:
+            raise ValueError('Expected 0 < open_for <= max_open_for.')
+
+        self._consecutive_failures: int = consecutive_failures
+        self._error_rate: float = error_rate
+        self._min_samples: int = min_samples
+        self._open_for: float = open_for
+        self._max_open_for: float = max_open_for
+        self._give_up_after: float = math.inf if give_up_after is None else give_up_after
+
+        self._state: BreakerState = BreakerState.CLOSED
+        # Outcomes of the last attempts, True for failures, and how many of them failed.
+        self._outcomes: deque[bool] = deque(maxlen=window)
+        self._failures: int = 0
+        self._streak: int = 0
+
+        # Current cool-off, in seconds.
+        self._cool_off: float = open_for
+        # Loop time the cool-off ends at when open; when half-open, at which the probe is deemed lost.
+        self._until: float = 0.0
+        # Loop time the breaker last opened from the closed state.
+        self._opened_at: float = 0.0
+        # Set once ``give_up_after`` elapsed: the breaker then stays closed.
+        self._disabled: bool = False
+
+        # Set and replaced on every state change, waking whoever waits for admission.
+        self._changed: asyncio.Event = asyncio.Event()
+
+    @property
+    def state(self) -> BreakerState:
+        return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Whether requests are held back: while open, and while half-open for every task but the probe. Attempts
+        failing meanwhile are deferred.
+        """
+        return self._state is not BreakerState.CLOSED
+
+    async def admit(self) -> bool:
+        """
+        Waits until a task may be dequeued: right away when closed. When open, waits for the end of the cool-off,
+        then admits the probe and holds the next tasks until its verdict. A probe without verdict, e.g. a task served
+        without a request, is replaced after ``open_for`` seconds.
+        :returns: True if the task admitted is the probe, which may send its request although ``is_open``.
+        """
+        loop = asyncio.get_running_loop()
+        while self._state is not BreakerState.CLOSED:
+            now: float = loop.time()
+            if now >= self._until:
+                if self._state is BreakerState.OPEN:
+                    self._set_state(BreakerState.HALF_OPEN)
+                    log.info(Event('breaker_half_open'))
+                self._until = now + self._open_for
+                return True
+            changed: asyncio.Event = self._changed
+            try:
+                async with asyncio.timeout(self._until - now):
+                    await changed.wait()
+            except TimeoutError:
+                pass
+        return False
+
+    def on_success(self, probe: bool = False) -> None:
+        """
+        Records an attempt the server answered.
+        :param probe: Whether the attempt is the probe's. While half-open, only the probe's verdict counts.
+        """
+        match self._state:
+            case BreakerState.CLOSED:
+                self._record(False)
+            case BreakerState.HALF_OPEN if not probe:
+                # An attempt sent before the breaker opened; the probe decides.
+                pass
+            case BreakerState.HALF_OPEN:
+                down_for: float = asyncio.get_running_loop().time() - self._opened_at
+                log.info(Event('breaker_closed', down_for=round(down_for, 1)))
+                self._outcomes.clear()
+                self._failures = 0
+                self._streak = 0
+                self._cool_off = self._open_for
+                self._set_state(BreakerState.CLOSED)
+            case BreakerState.OPEN:
+                # An attempt sent before the breaker opened; the probe decides.
+                pass
+
+    def on_failure(self, probe: bool = False) -> bool:
+        """
+        Records an attempt that failed on the server side.
+        :param probe: Whether the attempt is the probe's. While half-open, only the probe's verdict counts: a late
+        failure of an attempt sent before the breaker opened neither opens it again nor lengthens the cool-off.
+        :returns: True if this failure opened the breaker.
+        """
+        now: float = asyncio.get_running_loop().time()
+        match self._state:
+            case BreakerState.CLOSED:
+                if self._disabled:
+                    return False
+                self._record(True)
+                if not (self._streak >= self._consecutive_failures or (
+                        len(self._outcomes) >= self._min_samples
+                        and self._failures >= self._error_rate * len(self._outcomes))):
+                    return False
+                self._opened_at = now
+                self._cool_off = self._open_for
+            case BreakerState.HALF_OPEN if not probe:
+                return False
+            case BreakerState.HALF_OPEN:
+                if now - self._opened_at >= self._give_up_after:
+                    log.error(Event('breaker_disabled', down_for=round(now - self._opened_at, 1)))
+                    self._disabled = True
+                    self._set_state(BreakerState.CLOSED)
+                    return False
+                self._cool_off = min(self._max_open_for, self._cool_off * 2)
+            case BreakerState.OPEN:
+                return False
+
+        self._until = now + self._cool_off
+        self._set_state(BreakerState.OPEN)
+        log.warning(Event('breaker_open', failures=self._failures, attempts=len(self._outcomes), streak=self._streak,
+                          cool_off=round(self._cool_off, 2)))
+        return True
+
+    def _record(self, failed: bool) -> None:
+        if len(self._outcomes) == self._outcomes.maxlen:
+            self._failures -= self._outcomes[0]
+        self._outcomes.append(failed)
+        self._failures += failed
+        self._streak = self._streak + 1 if failed else 0
+
+    def _set_state(self, state: BreakerState) -> None:
+        self._state = state
+        self._changed.set()
+        self._changed = asyncio.Event()
@@ -0,0 +1,219 @@
+# File: cache.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Mapping, Callable, TypeVar
+
+from scraper.logger import log
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """
+    Represents a cached response: the validators to revalidate it, and where its body is.
+    """
+    # Request URL the response belongs to.
+    url: str
+
+    # SHA-256 of the body, which is also the name of the file holding it.
+    digest: str
+
+    # Size of the body in bytes.
+    size: int
+
+    # Validators sent back to the server on revalidation.
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class ResponseCache:
+    """
+    Persistent HTTP cache for conditional GET requests.
+
+    Bodies are content-addressed (``objects/<2 hex>/<sha256>``) so identical pages are stored once,
+    and indexed by URL in SQLite along with their ``ETag``/``Last-Modified`` validators.
+    The total size of the bodies is bounded, evicting the least recently used URLs first.
+
+    Every disk access runs on a single dedicated thread, off the event loop.
+
+    Usage:
+        with ResponseCache('cache/') as cache:
+            async with Fetcher(client, cache=cache) as fetcher:
+                ...
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = 1 << 30):
+        """
+        :param directory: Directory holding the index and the bodies; created if missing.
+        :param max_bytes: Maximum total size of the stored bodies.
+        """
+        self._dir: Path = Path(directory)
+        self._objects: Path = self._dir / 'objects'
+        self._max_bytes: int = max_bytes
+
+        # The only thread touching the index and the files.
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ResponseCache')
+        self._db: Optional[sqlite3.Connection] = None
+        self._total_bytes: int = 0
+
+    def __enter__(self) -> 'ResponseCache':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        self._executor.submit(self._open_sync).result()
+
+    def close(self) -> None:
+        self._executor.submit(self._close_sync).result()
+        self._executor.shutdown()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    async def _run(self, fn: Callable[..., T], *args) -> T:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def lookup(self, url: str) -> Optional[CacheEntry]:
+        """Returns the cached entry for a URL, marking it as recently used, or None."""
+        return await self._run(self._lookup_sync, url)
+
+    async def load(self, entry: CacheEntry) -> Optional[bytes]:
+        """Returns the body of an entry, or None if it is gone from disk."""
+        return await self._run(self._load_sync, entry)
+
+    async def store(self, url: str, content: bytes, headers: Mapping[str, str]) -> Optional[CacheEntry]:
+        """
+        Stores a response body if the response carries validators; otherwise it could never be revalidated.
+        :returns: The new entry, or None if not cacheable.
+        """
+        etag: Optional[str] = headers.get('ETag')
+        last_modified: Optional[str] = headers.get('Last-Modified')
+        if etag is None and last_modified is None:
+            return None
+        if len(content) > self._max_bytes:
+            return None
+        return await self._run(self._store_sync, url, content, etag, last_modified)
+
+    async def invalidate(self, url: str) -> None:
+        await self._run(self._invalidate_sync, url)
+
+    @staticmethod
+    def validators(entry: CacheEntry) -> dict[str, str]:
+        """Returns the conditional request headers revalidating an entry."""
+        headers: dict[str, str] = {}
+        if entry.etag is not None:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified is not None:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    # Everything below runs on the cache's thread.
+
+    def _path(self, digest: str) -> Path:
+        return self._objects / digest[:2] / digest
+
+    def _open_sync(self) -> None:
+        self._objects.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self._dir / 'index.sqlite', check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS entries ('
+                             'url TEXT PRIMARY KEY, digest TEXT NOT NULL, etag TEXT, last_modified TEXT, '
+                             'last_access REAL NOT NULL)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access)')
+            self._db.execute('CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)')
+            self._db.execute('CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, size INTEGER NOT NULL)')
+        self._total_bytes = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+
+    def _close_sync(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _lookup_sync(self, url: str) -> Optional[CacheEntry]:
+        row = self._db.execute(
+            'SELECT e.digest, o.size, e.etag, e.last_modified FROM entries e JOIN objects o USING (digest) '
+            'WHERE e.url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        with self._db:
+            self._db.execute('UPDATE entries SET last_access = ? WHERE url = ?', (time.time(), url))
+        return CacheEntry(url, *row)
+
+    def _load_sync(self, entry: CacheEntry) -> Optional[bytes]:
+        try:
+            return self._path(entry.digest).read_bytes()
+        except FileNotFoundError:
+            log.warning(f'Cached body of {entry.url} is missing; dropping the entry.')
+            self._invalidate_sync(entry.url)
+            return None
+
+    def _store_sync(self, url: str, content: bytes, etag: Optional[str],
+                    last_modified: Optional[str]) -> CacheEntry:
+        digest: str = hashlib.sha256(content).hexdigest()
+        path: Path = self._path(digest)
+        old = self._db.execute('SELECT digest FROM entries WHERE url = ?', (url,)).fetchone()
+        with self._db:
+            is_new: bool = self._db.execute(
+                'INSERT OR IGNORE INTO objects (digest, size) VALUES (?, ?)', (digest, len(content))).rowcount > 0
+            if is_new:
+                path.parent.mkdir(exist_ok=True)
+                tmp: Path = path.with_name(f'.{digest}.tmp')
+                tmp.write_bytes(content)
+                os.replace(tmp, path)
+                self._total_bytes += len(content)
+            self._db.execute('INSERT OR REPLACE INTO entries (url, digest, etag, last_modified, last_access) '
+                             'VALUES (?, ?, ?, ?, ?)', (url, digest, etag, last_modified, time.time()))
+            if old is not None and old[0] != digest:
+                self._collect(old)
+        if self._total_bytes > self._max_bytes:
+            self._evict()
+        return CacheEntry(url, digest, len(content), etag, last_modified)
+
+    def _invalidate_sync(self, url: str) -> None:
+        digests = self._db.execute('SELECT digest FROM entries WHERE url = ?', (url,)).fetchall()
+        with self._db:
+            self._db.execute('DELETE FROM entries WHERE url = ?', (url,))
+            self._collect(*digests)
+
+    def _evict(self) -> None:
+        """Drops the least recently used entries until the bodies fit in the size bound again."""
+        while self._total_bytes > self._max_bytes:
+            rows: list[tuple[str, str]] = self._db.execute(
+                'SELECT url, digest FROM entries ORDER BY last_access LIMIT 64').fetchall()
+            if not rows:
+                break
+            with self._db:
+                for url, digest in rows:
+                    self._db.execute('DELETE FROM entries WHERE url = ?', (url,))
+                    self._collect((digest,))
+                    if self._total_bytes <= self._max_bytes:
+                        break
+
+    def _collect(self, *digests: tuple[str]) -> None:
+        """Deletes the given bodies if no entry refers to them any more. Must run inside a transaction."""
+        for (digest,) in digests:
+            if self._db.execute('SELECT 1 FROM entries WHERE digest = ? LIMIT 1', (digest,)).fetchone():
+                continue
+            row = self._db.execute('SELECT size FROM objects WHERE digest = ?', (digest,)).fetchone()
+            if row is None:
+                continue
+            self._db.execute('DELETE FROM objects WHERE digest = ?', (digest,))
+            self._path(digest).unlink(missing_ok=True)
+            self._total_bytes -= row[0]
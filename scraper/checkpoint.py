@@ -0,0 +1,149 @@
+# File: checkpoint.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import queue
+import sqlite3
+import threading
+import time
+from enum import IntEnum
+from pathlib import Path
+from typing import Optional
+
+from scraper.idset import IdBitmap
+from scraper.logger import log
+
+
+class Progress(IntEnum):
+    """Final state of an item, as recorded in the checkpoint store."""
+    # The item page was fetched.
+    DONE = 1
+    # The server answered that the item does not exist (HTTP 404).
+    MISSING = 2
+    # Every attempt failed; the item should be fetched again.
+    FAILED = 3
+
+
+class CheckpointStore:
+    """
+    On-disk record of each item's outcome, backed by SQLite, so a crawl can resume where it stopped.
+
+    ``record()`` only appends to an in-memory queue; a background thread writes the records and commits them
+    in groups, every ``commit_interval`` seconds or ``batch_size`` records, keeping disk I/O off the event loop.
+
+    Usage:
+        with CheckpointStore('crawl.sqlite') as checkpoint:
+            async with Fetcher(client, checkpoint=checkpoint) as fetcher:
+                ...
+    """
+
+    def __init__(self, path: Path, commit_interval: float = 1.0, batch_size: int = 1000):
+        """
+        :param path: SQLite database file; created if missing.
+        :param commit_interval: Maximum number of seconds a record waits before being committed.
+        :param batch_size: Maximum number of records committed at once.
+        """
+        self._path: Path = Path(path)
+        self._commit_interval: float = commit_interval
+        self._batch_size: int = batch_size
+
+        # Records waiting for the writer thread, None stops it.
+        self._pending: queue.SimpleQueue[Optional[tuple[int, int, float]]] = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS progress ('
+                       'item_id INTEGER PRIMARY KEY, status INTEGER NOT NULL, updated REAL NOT NULL'
+                       ') WITHOUT ROWID')
+        db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self._path)
+        # WAL lets load() read while the writer thread commits.
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    def __enter__(self) -> 'CheckpointStore':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """Starts the writer thread."""
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name='CheckpointWriter', daemon=True)
+            self._writer.start()
+
+    def close(self) -> None:
+        """Commits every pending record and stops the writer thread."""
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def record(self, item_id: int, progress: Progress) -> None:
+        """Records the outcome of an item. Does not block; written by the background thread."""
+        if self._writer is None:
+            raise RuntimeError('CheckpointStore is not open.')
+        self._pending.put((item_id, int(progress), time.time()))
+
+    def load(self) -> tuple[IdBitmap, IdBitmap]:
+        """
+        Reads the committed records. Blocking; run it in a thread from async code.
+        Missing items only count as complete below the highest item done: new items take the IDs past the last one,
+        so those that were missing must be fetched again.
+        :returns: The IDs that are complete (done or missing), and the IDs that failed.
+        """
+        complete, failed, missing = IdBitmap(), IdBitmap(), IdBitmap()
+        db = self._connect()
+        try:
+            for item_id, status in db.execute('SELECT item_id, status FROM progress'):
+                match status:
+                    case Progress.DONE:
+                        complete.add(item_id)
+                    case Progress.MISSING:
+                        missing.add(item_id)
+                    case _:
+                        failed.add(item_id)
+        finally:
+            db.close()
+        missing.truncate(complete.max() + 1)
+        complete.update(missing)
+        return complete, failed
+
+    def _write_loop(self) -> None:
+        db = self._connect()
+        try:
+            stop: bool = False
+            while not stop:
+                # Block for the first record, then gather a group until the interval or the batch is full.
+                batch: list[tuple[int, int, float]] = []
+                if (rec := self._pending.get()) is None:
+                    break
+                batch.append(rec)
+                deadline: float = time.monotonic() + self._commit_interval
+                while len(batch) < self._batch_size:
+                    timeout: float = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        rec = self._pending.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if rec is None:
+                        stop = True
+                        break
+                    batch.append(rec)
+
+                try:
+                    with db:
+                        db.executemany('INSERT OR REPLACE INTO progress (item_id, status, updated) VALUES (?, ?, ?)',
+                                       batch)
+                except sqlite3.Error as e:
+                    log.error(f'Failed to commit {len(batch)} checkpoint records: {e}')
+        finally:
+            db.close()
@@ -0,0 +1,294 @@
+# File: concurrency.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+import math
+from collections import deque
+from typing import Hashable, Iterable
+
+from scraper.logger import log
+
+
+class AdaptiveConcurrency:
+    """
+    Bounds the number of in-flight fetcher tasks, adapting the bound at runtime (AIMD).
+
+    - Additive increase: every ``limit`` successful, fast-enough responses raise the limit by one.
+    - Multiplicative decrease: an overload signal (HTTP 429/502/503/504) multiplies the limit by ``backoff``,
+      at most once per ``cooldown`` seconds.
+    - A latency spike only takes one off the limit, at most once per ``cooldown`` seconds: slower responses hint at
+      a queue building up server-side, not at the server refusing work.
+
+    Latencies are tracked per kind of request, e.g. per HTTP method, since a POST following redirects takes longer
+    than a GET. A response is part of a spike when the median of the last ``_RECENT_SAMPLES`` latencies of its kind
+    exceeds their median over the last ``_BASELINE_SAMPLES`` times ``tolerance``. Comparing medians keeps the
+    natural spread of latencies from passing for spikes, and a lasting change in the server's speed becomes the new
+    baseline once it fills the long window.
+    """
+
+    # Latencies making the short window a spike is detected over.
+    _RECENT_SAMPLES: int = 16
+
+    # Latencies making the long window the baseline is the median of.
+    _BASELINE_SAMPLES: int = 256
+
+    # Latencies needed in the long window before spikes are detected.
+    _MIN_BASELINE_SAMPLES: int = 32
+
+    # The baseline median is recomputed every this many latencies.
+    _BASELINE_EVERY: int = 32
+
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 64,
+                 backoff: float = 0.5, tolerance: float = 2.0, cooldown: float = 1.0):
+        """
+        :param initial: Starting in-flight limit.
+        :param min_limit: The limit never goes below this.
+        :param max_limit: The limit never goes above this.
+        :param backoff: Multiplicative factor applied to the limit on overload, in ]0, 1[.
+        :param tolerance: How much slower than the baseline the recent latencies may be before being a spike.
+        :param cooldown: Minimum number of seconds between two decreases, so a burst of errors
+        coming from the same overload only halves the limit once.
+        """
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError('Expected 1 <= min_limit <= max_limit.')
+        if not 0.0 < backoff < 1.0:
+            raise ValueError('backoff must be in ]0, 1[.')
+
+        self._min_limit: int = min_limit
+        self._max_limit: int = max_limit
+        self._backoff: float = backoff
+        self._tolerance: float = tolerance
+        self._cooldown: float = cooldown
+
+        # Fractional limit; the effective one is its floor.
+        self._limit: float = float(min(max(initial, min_limit), max_limit))
+        self._in_flight: int = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+        # Latency windows and baseline of each kind of request.
+        self._latencies: dict[Hashable, _LatencyWindow] = {}
+        self._last_decrease: float = -math.inf
+
+    @property
+    def limit(self) -> int:
+        """Current in-flight limit."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of slots currently acquired."""
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        """Waits for a free slot and takes it."""
+        while self._in_flight >= self.limit:
+            waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                self._wakeup()
+                raise
+        self._in_flight += 1
+
+    def release(self) -> None:
+        """Gives a slot back."""
+        if self._in_flight <= 0:
+            raise ValueError('release() called too many times')
+        self._in_flight -= 1
+        self._wakeup()
+
+    async def wait_release(self) -> None:
+        """Waits until bytes are given back."""
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            raise
+
+    def _wakeup(self) -> None:
+        """Wakes as many waiters as there are free slots."""
+        free: int = self.limit - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    def on_success(self, latency: float, kind: Hashable = None) -> None:
+        """
+        Feeds the latency in seconds of a successful response.
+        Increases the limit unless the latency shows the server is slowing down.
+        :param kind: Kind of request, e.g. its HTTP method; each kind is compared with its own baseline.
+        """
+        if (window := self._latencies.get(kind)) is None:
+            window = self._latencies[kind] = _LatencyWindow(self._RECENT_SAMPLES, self._BASELINE_SAMPLES,
+                                                            self._BASELINE_EVERY)
+        window.add(latency)
+
+        if (len(window.recent) == self._RECENT_SAMPLES
+                and len(window.baseline_samples) >= self._MIN_BASELINE_SAMPLES
+                and window.recent_median() > window.baseline * self._tolerance):
+            self._decrease('latency spike', self._limit - 1)
+            return
+
+        # Additive increase: +1 per window of `limit` successes.
+        if self._limit < self._max_limit:
+            self._limit = min(self._max_limit, self._limit + 1 / self._limit)
+            self._wakeup()
+
+    def on_overload(self) -> None:
+        """Signals the server pushed back (e.g. HTTP 429 or 503)."""
+        self._decrease('server overload', self._limit * self._backoff)
+
+    def _decrease(self, reason: str, limit: float) -> None:
+        now: float = asyncio.get_running_loop().time()
+        if now - self._last_decrease < self._cooldown:
+            return
+        self._last_decrease = now
+        old: int = self.limit
+        self._limit = max(float(self._min_limit), limit)
+        # Forget the spike so the next window measures the new regime.
+        for window in self._latencies.values():
+            window.recent.clear()
+        if self.limit != old:
+            log.info(f'Concurrency limit {old} -> {self.limit} ({reason})')
+
+
+class _LatencyWindow:
+    """Recent latencies of one kind of request, and the median of a longer window as their baseline."""
+
+    def __init__(self, recent: int, baseline: int, every: int):
+        self.recent: deque[float] = deque(maxlen=recent)
+        self.baseline_samples: deque[float] = deque(maxlen=baseline)
+        # Median of ``baseline_samples`` as of its last computation, every ``every`` samples.
+        self.baseline: float = math.inf
+        self._every: int = every
+        self._count: int = 0
+
+    def add(self, latency: float) -> None:
+        self.recent.append(latency)
+        self.baseline_samples.append(latency)
+        self._count += 1
+        if self._count % self._every == 0:
+            self.baseline = _median(self.baseline_samples)
+
+    def recent_median(self) -> float:
+        return _median(self.recent)
+
+
+def _median(values: Iterable[float]) -> float:
+    ordered: list[float] = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+class ByteBudget:
+    """
+    Global budget of response body bytes held in memory by the fetcher's workers.
+
+    A body is admitted with ``acquire()``, which waits while the budget is exhausted. Bytes read past what was
+    acquired are added with ``charge()``, which never waits: a body already being read is never stalled
+    half-way, which could deadlock workers that each hold part of the budget. Memory therefore stays
+    bounded by the budget plus the overshoot of the bodies in progress.
+
+    Bodies kept once delivered, e.g. an item page waiting for its download POST, are added with ``retain()``. They
+    count against the budget, but cannot hold ``acquire()`` back on their own: only queued tasks free them, and
+    those need the workers that would be waiting. The dispatcher instead holds new bodies back while the budget is
+    ``saturated``, see ``wait_release()``.
+    """
+
+    def __init__(self, capacity: int):
+        """:param capacity: Number of bytes that may be held at once."""
+        if capacity <= 0:
+            raise ValueError('capacity must be positive.')
+        self._capacity: int = capacity
+        self._used: int = 0
+        # Part of _used taken with retain().
+        self._retained: int = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def capacity(self) -> int:
+        return self._capacity
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    @property
+    def saturated(self) -> bool:
+        """True while retained bodies fill the budget: only the tasks freeing them should run."""
+        return self._retained > 0 and self._used >= self._capacity
+
+    async def acquire(self, n: int) -> None:
+        """
+        Waits until ``n`` bytes fit in the budget and takes them. Always admits a body when nothing but retained
+        bodies is held.
+        """
+        while self._used > self._retained and self._used + n > self._capacity:
+            waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                self._wakeup()
+                raise
+        self._used += n
+
+    def charge(self, n: int) -> None:
+        """Takes ``n`` more bytes without waiting, possibly going over the budget."""
+        self._used += n
+
+    def release(self, n: int) -> None:
+        """Gives ``n`` bytes back."""
+        self._used = max(0, self._used - n)
+        self._wakeup()
+
+    def retain(self, n: int) -> None:
+        """Takes ``n`` bytes of a body kept past its delivery, without waiting. Give them back with ``unretain()``."""
+        self._used += n
+        self._retained += n
+
+    def unretain(self, n: int) -> None:
+        """Gives back ``n`` bytes taken with ``retain()``."""
+        self._retained = max(0, self._retained - n)
+        self.release(n)
+
+    async def wait_release(self) -> None:
+        """Waits until bytes are given back."""
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+            raise
+
+    def _wakeup(self) -> None:
+        # Wake everyone: they re-check against the freed room in FIFO order.
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
@@ -0,0 +1,153 @@
+# File: egress.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+import math
+from typing import Optional, Sequence
+
+from httpx import AsyncClient
+
+from scraper.ratelimit import TokenBucket
+from scraper.transport import TransportProfile, build_client
+
+
+class EgressRoute:
+    """
+    One way out to the site, e.g. a proxy or a local address to bind: its own client and connection pool, its own
+    rate limit, and a health score.
+
+    The score is 1.0 for a route that works. Each transport error halves it, each throttling episode (429s until the
+    route resumes) takes a fifth off, and each success brings it a fifth closer to 1.0. It also recovers on its own,
+    halving the gap to 1.0 every ``recovery`` seconds, so a route left aside is tried again eventually.
+    """
+
+    def __init__(self, name: str, client: AsyncClient, rate_limiter: Optional[TokenBucket] = None,
+                 recovery: float = 30.0, owns_client: bool = False):
+        """
+        :param name: Name of the route, for logs and metrics.
+        :param client: Client sending the route's requests.
+        :param rate_limiter: Paces the route's requests, and is paused when the route receives a 429. Defaults to a
+        bucket without rate limit, which only applies pauses.
+        :param recovery: Seconds in which the health score's gap to 1.0 halves without any request.
+        :param owns_client: Whether ``aclose()`` closes the client.
+        """
+        self.name: str = name
+        self.client: AsyncClient = client
+        self.rate_limiter: TokenBucket = rate_limiter if rate_limiter is not None else TokenBucket()
+        self._recovery: float = recovery
+        self._owns_client: bool = owns_client
+
+        # Attempts currently going out through the route, from the rate limiter's wait to the response.
+        self.in_flight: int = 0
+
+        # Health score at the loop time it was last updated.
+        self._health: float = 1.0
+        self._updated: float = 0.0
+
+    @classmethod
+    def build(cls, name: str, profile: str | TransportProfile = 'polite', proxy: Optional[str] = None,
+              local_address: Optional[str] = None, rate: Optional[float] = None, burst: int = 1,
+              recovery: float = 30.0) -> 'EgressRoute':
+        """
+        Builds a route with a client of its own, closed by ``aclose()``.
+        :param profile: Transport profile of the route's client; see ``scraper.transport.build_client()``.
+        :param proxy: URL of the proxy the requests go through, e.g. ``http://127.0.0.1:3128``.
+        :param local_address: Local IP address the connections are bound to.
+        :param rate: Sustained requests per second through this route; None for no limit.
+        :param burst: Requests the route may send back-to-back.
+        """
+        client: AsyncClient = build_client(profile, proxy=proxy, local_address=local_address)
+        return cls(name, client, TokenBucket(rate, burst), recovery, owns_client=True)
+
+    @property
+    def health(self) -> float:
+        """Current health score, in [0, 1]."""
+        elapsed: float = asyncio.get_running_loop().time() - self._updated
+        return 1.0 - (1.0 - self._health) * 0.5 ** (elapsed / self._recovery)
+
+    def _set_health(self, health: float) -> None:
+        self._health = health
+        self._updated = asyncio.get_running_loop().time()
+
+    def on_success(self) -> None:
+        """Records a response received through the route, whatever its status."""
+        health: float = self.health
+        self._set_health(health + (1.0 - health) * 0.2)
+
+    def on_failure(self) -> None:
+        """Records a transport error, e.g. the proxy refusing the connection."""
+        self._set_health(self.health * 0.5)
+
+    def on_throttled(self, pause: float) -> None:
+        """Records a 429 received through the route: only this route backs off, for ``pause`` seconds."""
+        if self.rate_limiter.paused_for() <= 0:
+            # The other requests in flight when the first 429 came in get theirs too; penalise the episode once.
+            self._set_health(self.health * 0.8)
+        self.rate_limiter.pause(pause)
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.client.aclose()
+
+
+class EgressPool:
+    """
+    Routes the fetcher spreads its requests over. Each attempt goes out through the least loaded healthy route: among
+    the routes whose health score is at least ``min_health``, one whose rate limiter is not paused, with the fewest
+    attempts in flight. If they are all paused, the one resuming first is used; if none is healthy, the healthiest.
+
+    Usage:
+        routes = [EgressRoute.build(f'proxy{i}', 'balanced', proxy=url, rate=5.0) for i, url in enumerate(proxies)]
+        async with EgressPool(routes) as egress:
+            async with Fetcher(egress=egress) as fetcher:
+                ...
+    """
+
+    def __init__(self, routes: Sequence[EgressRoute], min_health: float = 0.5):
+        """
+        :param routes: The routes; their names must be unique.
+        :param min_health: Health score under which a route is only used when no other route qualifies.
+        """
+        if not routes:
+            raise ValueError('An egress pool needs at least one route.')
+        if len({r.name for r in routes}) != len(routes):
+            raise ValueError('Egress route names must be unique.')
+        self.routes: tuple[EgressRoute, ...] = tuple(routes)
+        self._min_health: float = min_health
+
+    async def __aenter__(self) -> 'EgressPool':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.aclose()
+
+    def acquire(self) -> EgressRoute:
+        """Picks the route of the next attempt and counts the attempt in its load. Give it back with ``release()``."""
+        best: Optional[EgressRoute] = None
+        best_key: tuple[float, float, float] = (math.inf, math.inf, 0.0)
+        for route in self.routes:
+            health: float = route.health
+            if health < self._min_health:
+                continue
+            key: tuple[float, float, float] = (route.rate_limiter.paused_for(), route.in_flight, -health)
+            if key < best_key:
+                best, best_key = route, key
+        if best is None:
+            best = max(self.routes, key=lambda r: r.health)
+        best.in_flight += 1
+        return best
+
+    def healthy(self) -> bool:
+        """Whether any route's health score is at least ``min_health``."""
+        return any(route.health >= self._min_health for route in self.routes)
+
+    @staticmethod
+    def release(route: EgressRoute) -> None:
+        """Ends an attempt counted by ``acquire()``."""
+        route.in_flight -= 1
+
+    async def aclose(self) -> None:
+        """Closes the clients the routes built."""
+        await asyncio.gather(*(route.aclose() for route in self.routes))
@@ -0,0 +1,226 @@
+# File: export.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+import dataclasses
+import gzip
+import json
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Mapping, Optional
+
+from scraper.fetcher import Outcome, GetResp, PostResp, ItemRecord
+from scraper.logger import log
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def outcome_to_record(outcome: Outcome) -> dict[str, Any]:
+    """Makes a JSON-serializable record out of an ``Outcome``. Page bodies are left out, only their size is kept."""
+    record: dict[str, Any] = {'item_id': outcome.item_id, 'url': str(outcome.req_url)}
+    match outcome.res:
+        case GetResp(status_code=status, content=content, truncated=truncated):
+            record.update(kind='get', status=status, size=len(content), truncated=truncated)
+        case PostResp(status_code=status, url=url):
+            record.update(kind='post', status=status, location=str(url))
+        case None:
+            record.update(kind='failed')
+    return record
+
+
+def item_to_record(item: ItemRecord) -> dict[str, Any]:
+    """Makes a JSON-serializable record out of an ``ItemRecord``, leaving the page body out like ``outcome_to_record``."""
+    record: dict[str, Any] = {'item_id': item.item_id, 'latency': round(item.latency, 6)}
+    if item.page is not None:
+        record.update(status=item.page.status_code, size=len(item.page.content), truncated=item.page.truncated)
+    else:
+        record.update(status=None)
+    if item.download_requested:
+        record['download'] = str(item.download.url) if item.download is not None else None
+    return record
+
+
+class NdjsonExporter:
+    """
+    Writes records as compressed NDJSON files, off the event loop.
+
+    Records go through a bounded queue, so producers slow down when the disk cannot keep up. A writer
+    coroutine takes them from the queue in batches and hands each batch to a dedicated thread, which
+    serializes, compresses and writes it. Files are fsync'ed once every ``fsync_interval`` seconds rather
+    than per record, and rotated once they reach ``max_file_bytes`` on disk.
+
+    Usage:
+        async with NdjsonExporter('out/') as exporter:
+            async with Fetcher(client) as fetcher:
+                await fetcher.fetch_range(range(100), exporter.export_outcome)
+    """
+
+    # File name suffix by compression.
+    _SUFFIXES: dict[Optional[str], str] = {None: '.ndjson', 'gzip': '.ndjson.gz', 'zstd': '.ndjson.zst'}
+
+    def __init__(self, directory: Path, prefix: str = 'items', compression: Optional[str] = 'gzip',
+                 max_file_bytes: int = 256 * 1024 * 1024, fsync_interval: float = 5.0,
+                 batch_size: int = 1000, queue_size: int = 10_000):
+        """
+        :param directory: Directory the files are written to; created if missing.
+        :param prefix: Start of the file names, followed by the creation time and a sequence number.
+        :param compression: 'gzip', 'zstd' (requires the ``zstandard`` package) or None.
+        :param max_file_bytes: Size on disk after which a new file is started.
+        :param fsync_interval: Maximum number of seconds written records may sit in OS buffers.
+        :param batch_size: Maximum number of records handed to the writer thread at once.
+        :param queue_size: Maximum number of records waiting to be written.
+        """
+        if compression not in self._SUFFIXES:
+            raise ValueError(f'Unknown compression: {compression}')
+        if compression == 'zstd' and zstandard is None:
+            raise RuntimeError("zstd compression requires the 'zstandard' package.")
+
+        self._dir: Path = Path(directory)
+        self._prefix: str = prefix
+        self._compression: Optional[str] = compression
+        self._max_file_bytes: int = max_file_bytes
+        self._fsync_interval: float = fsync_interval
+        self._batch_size: int = batch_size
+
+        self._queue: asyncio.Queue[Mapping[str, Any]] = asyncio.Queue(maxsize=queue_size)
+        self._writer_task: Optional[asyncio.Task] = None
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='NdjsonExporter')
+
+        # Owned by the writer thread.
+        self._raw: Optional[BinaryIO] = None
+        self._stream: Optional[BinaryIO] = None
+        self._file_seq: int = 0
+        self._last_sync: float = time.monotonic()
+        self._dirty: bool = False
+
+        # Statistics.
+        self.records_written: int = 0
+        self.files_written: int = 0
+
+    async def __aenter__(self) -> 'NdjsonExporter':
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._writer_task = asyncio.create_task(self._write_loop(), name='NdjsonExporter')
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self._queue.join()
+        self._writer_task.cancel()
+        try:
+            await self._writer_task
+        except asyncio.CancelledError:
+            pass
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_file)
+        self._executor.shutdown()
+        log.info(f'Exported {self.records_written} records to {self.files_written} files in {self._dir}')
+
+    async def put(self, record: Mapping[str, Any]) -> None:
+        """Queues a record for writing; waits while the queue is full."""
+        if self._writer_task is None or self._writer_task.done():
+            raise RuntimeError('Exporter is not running; please use a context manager.')
+        await self._queue.put(record)
+
+    async def export_outcome(self, outcome: Outcome) -> None:
+        """Fetcher callback exporting each outcome."""
+        await self.put(outcome_to_record(outcome))
+
+    async def export_item(self, item: ItemRecord) -> None:
+        """``Fetcher.fetch_items()`` callback exporting each item record."""
+        await self.put(item_to_record(item))
+
+    async def export_dataclass(self, item: Any) -> None:
+        """Exports a dataclass instance, e.g. a ``ParsedItem``; usable as the parser's callback."""
+        await self.put(dataclasses.asdict(item))
+
+    async def _write_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                first: Mapping[str, Any] = await asyncio.wait_for(self._queue.get(), self._fsync_interval)
+            except asyncio.TimeoutError:
+                # Idle: make sure what was written before is durable.
+                await loop.run_in_executor(self._executor, self._sync, False)
+                continue
+
+            batch: list[Mapping[str, Any]] = [first]
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            try:
+                await loop.run_in_executor(self._executor, self._write_batch, batch)
+            except (OSError, TypeError, ValueError) as e:
+                log.error(f'Failed to export {len(batch)} records: {e}')
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    # Everything below runs on the writer thread.
+
+    def _open_file(self) -> None:
+        self._file_seq += 1
+        name: str = f'{self._prefix}-{time.strftime("%Y%m%d-%H%M%S")}-{self._file_seq:05}'
+        path: Path = self._dir / f'{name}{self._SUFFIXES[self._compression]}'
+        self._raw = path.open('xb')
+        match self._compression:
+            case 'gzip':
+                self._stream = gzip.GzipFile(filename='', mode='wb', fileobj=self._raw)
+            case 'zstd':
+                self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+            case _:
+                self._stream = self._raw
+        self.files_written += 1
+        log.debug(f'Exporting to {path}')
+
+    def _close_file(self) -> None:
+        if self._raw is None:
+            return
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._raw.close()
+        self._raw = self._stream = None
+        self._dirty = False
+
+    def _sync(self, if_due: bool) -> None:
+        """Flushes the compressor and fsyncs the file, if anything was written (and the interval elapsed)."""
+        if self._raw is None or not self._dirty:
+            return
+        if if_due and time.monotonic() - self._last_sync < self._fsync_interval:
+            return
+        match self._compression:
+            case 'gzip':
+                self._stream.flush(zlib.Z_SYNC_FLUSH)
+            case 'zstd':
+                self._stream.flush(zstandard.FLUSH_BLOCK)
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._last_sync = time.monotonic()
+        self._dirty = False
+
+    def _write_batch(self, batch: list[Mapping[str, Any]]) -> None:
+        data: bytes = b''.join(
+            json.dumps(record, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8') + b'\n'
+            for record in batch
+        )
+        if self._raw is None:
+            self._open_file()
+        self._stream.write(data)
+        self._dirty = True
+        self.records_written += len(batch)
+
+        # The raw file position lags behind by what the compressor buffers, which is fine for rotation.
+        if self._raw.tell() >= self._max_file_bytes:
+            self._close_file()
+        else:
+            self._sync(True)
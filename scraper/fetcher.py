@@ -4,17 +4,37 @@
 # License: MIT
 
 import asyncio
+from array import array
+import contextlib
+import functools
+import inspect
+import math
 import random
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, replace
 from itertools import islice
 from pathlib import Path
-from typing import Iterable, Callable, Generator, Optional, Awaitable, Mapping, Any
+from typing import Iterable, Callable, Generator, Optional, Awaitable, Mapping, Any, AsyncIterator, Hashable, Iterator
 
 import httpx
 from httpx import AsyncClient, Response
 from yarl import URL
 
-from scraper.logger import log
+from scraper.breaker import CircuitBreaker
+from scraper.cache import ResponseCache, CacheEntry
+from scraper.checkpoint import CheckpointStore, Progress
+from scraper.concurrency import AdaptiveConcurrency, ByteBudget
+from scraper.egress import EgressPool, EgressRoute
+from scraper.headers import HeaderPool, HeaderPairs
+from scraper.idset import IdBitmap
+from scraper.logger import log, Event
+from scraper.memo import ResultMemo
+from scraper.metrics import Metrics
+from scraper.ratelimit import TokenBucket, parse_retry_after
+from scraper.recrawl import ChangeStore, RecrawlPlan, content_digest
+from scraper.retry import RetryPolicy, TimeoutPolicy, HedgeBudget, OVERLOAD_STATUSES
+from scraper.tracing import Tracer, NULL_SPAN, span
+from scraper.transport import TransportProfile, get_profile, build_client
 
 
 @dataclass(frozen=True)
@@ -25,6 +45,10 @@ class GetResp:
     status_code: int
     # Content of the response in bytes
     content: bytes
+    # True if the server answered 304 Not Modified and the content was read from the response cache.
+    from_cache: bool = False
+    # True if the body was cut short, by the byte cap or because the chunk consumer had seen enough.
+    truncated: bool = False
 
 
 @dataclass(frozen=True)
@@ -37,16 +61,16 @@ class PostResp:
     url: URL
 
 
-# TODO: Each task should has its own retry/timeout?
-# TODO: Each task should has its own retry/timeout?
-# TODO: Each task should has its own retry/timeout?
-
 # A task that'll get queued up into the fetcher's task queue to be later executed based on its type.
-type Task = GetTask | PostTask | StopTask
+type Task = GetTask | PostTask | RangeTask | StopTask
 
 # Possible types of responses.
 type Resp = GetResp | PostResp
 
+# Identifies the request of a task for coalescing: method, URL, and what else makes two requests differ (body, byte
+# cap).
+type FlightKey = tuple[str, str, Hashable]
+
 
 @dataclass(frozen=True)
 class Outcome:
@@ -65,7 +89,36 @@ class Outcome:
 
 # Callback function that gets called when both HTTP GET & HTTP POST requests are done,
 # sending the resulting bytes to the parser.
-type ReqCb = Callable[[Outcome], None]
+# It may be a coroutine function: the worker then awaits it, which lets a slow consumer hold the fetcher back.
+type ReqCb = Callable[[Outcome], None | Awaitable[None]]
+
+@dataclass(frozen=True)
+class ItemRecord:
+    """
+    Represents an item once its whole pipeline ran: the item page, then the download form POST if the page has one.
+    """
+    # ID of the item.
+    item_id: int
+
+    # Item page; None if it could not be fetched.
+    page: Optional[GetResp] = None
+
+    # True if the page called for the download form POST.
+    download_requested: bool = False
+
+    # Response to the download form POST; None if not requested or if it failed.
+    download: Optional[PostResp] = None
+
+    # Seconds from a worker taking the item's page task to this record.
+    latency: float = 0.0
+
+
+# Callback function called with each item record of ``Fetcher.fetch_items()``. May be a coroutine function too.
+type ItemCb = Callable[[ItemRecord], None | Awaitable[None]]
+
+# Incremental consumer of a response body, called with each chunk as it arrives.
+# Returns True once it has seen what it wanted, which aborts the download.
+type ChunkConsumer = Callable[[bytes], bool]
 
 
 @dataclass(frozen=True)
@@ -85,6 +138,20 @@ class GetTask:
     # Callback that'll get called with the outcome
     callback: Optional[ReqCb] = None
 
+    # Maximum number of body bytes to read; overrides the fetcher's default cap.
+    max_bytes: Optional[int] = None
+
+    # If set, the body is streamed to it chunk by chunk instead of being buffered; the outcome's content is empty.
+    consumer: Optional[ChunkConsumer] = None
+
+    # Retry and timeout policies; override the fetcher's defaults.
+    retry: Optional[RetryPolicy] = None
+    timeout: Optional[TimeoutPolicy] = None
+
+    # Whether the checkpoint records the item done once this GET succeeds. False when more requests make up the
+    # item, e.g. in ``Fetcher.fetch_items()``, which records the item once all of them ran.
+    checkpoint_done: bool = True
+
 
 @dataclass(frozen=True)
 class PostTask:
@@ -106,6 +173,50 @@ class PostTask:
     # Callback that'll get called with the outcome
     callback: Optional[ReqCb] = None
 
+    # Retry and timeout policies; override the fetcher's defaults. Hedging never applies to POST requests.
+    retry: Optional[RetryPolicy] = None
+    timeout: Optional[TimeoutPolicy] = None
+
+
+class RangeTask:
+    """
+    A block of HTTP GET tasks, one per ID, held compactly in the queue: the IDs are a ``range`` or an ``array``, and
+    the ``GetTask`` of each ID is only made by ``make_task`` when a worker takes it.
+    """
+    __slots__ = ('ids', 'pos', 'make_task', 'keep')
+
+    def __init__(self, ids: range | array, make_task: Callable[[int], GetTask],
+                 keep: Optional[Callable[[int], bool]] = None):
+        """
+        :param ids: IDs of the block.
+        :param make_task: Makes the task of an ID.
+        :param keep: If set, IDs it returns False for are skipped, e.g. the ones known to be missing.
+        """
+        self.ids: range | array = ids
+        # Index of the next ID to hand out.
+        self.pos: int = 0
+        self.make_task: Callable[[int], GetTask] = make_task
+        self.keep: Optional[Callable[[int], bool]] = keep
+
+    def __len__(self) -> int:
+        """Returns the number of IDs left, skipped ones included."""
+        return len(self.ids) - self.pos
+
+    def next_task(self, max_scan: int) -> Optional[GetTask]:
+        """
+        Returns the task of the next kept ID, looking at ``max_scan`` IDs at most.
+        Returns None if there is no kept ID among them; check ``len()`` to know if the block is exhausted.
+        """
+        ids, keep = self.ids, self.keep
+        end: int = min(len(ids), self.pos + max_scan)
+        for pos in range(self.pos, end):
+            item_id: int = ids[pos]
+            if keep is None or keep(item_id):
+                self.pos = pos + 1
+                return self.make_task(item_id)
+        self.pos = end
+        return None
+
 
 @dataclass(frozen=True)
 class StopTask:
@@ -120,177 +231,345 @@ class StopTask:
 type ReqFunc = Callable[[Task], Awaitable[Resp]]
 
 
+class _Deferred(Exception):
+    """Raised out of a task's retry loop when the circuit breaker is open: the task is put back in the queue."""
+
+
 class TaskPriorityQueue:
     """
     Represents the task queue with POST tasks always being prioritized.
+
+    Getters and putters park on futures and are woken directly by the opposite operation, nothing polls.
+    GET tasks age: once the oldest GET has waited ``get_max_wait`` seconds behind POST tasks, it is served ahead of
+    them, but at most once per ``posts_per_aged_get`` POST tasks served meanwhile. A steady stream of POST tasks thus
+    cannot starve the GET lane, while a deep GET backlog, always aged, cannot starve the POST lane either.
+
+    A ``RangeTask`` takes a single slot of the GET lane and hands out its GET tasks one by one; until it is
+    exhausted it counts as one unfinished task, plus one per GET task handed out.
     """
 
-    def __init__(self, size: int):
-        self.q_post: asyncio.Queue[PostTask | StopTask] = asyncio.Queue(maxsize=size)  # high priority
-        self.q_get: asyncio.Queue[GetTask | StopTask] = asyncio.Queue(maxsize=size)  # low priority
+    # Default number of seconds a GET task may wait behind POST tasks before being served anyway.
+    _GET_MAX_WAIT: float = 1.0
+
+    # Default number of POST tasks served in between two aged GET tasks.
+    _POSTS_PER_AGED_GET: int = 8
+
+    # Number of IDs of a ``RangeTask`` looked at per dequeue, so a block of skipped IDs cannot hold the loop long.
+    _RANGE_SCAN: int = 1024
+
+    def __init__(self, size: int, get_max_wait: Optional[float] = None, posts_per_aged_get: Optional[int] = None):
+        """
+        :param size: Maximum number of tasks buffered in each lane (POST and GET). Zero or less means unbounded.
+        :param get_max_wait: Aging threshold in seconds for GET tasks; defaults to ``_GET_MAX_WAIT``.
+        :param posts_per_aged_get: POST tasks served in between two aged GET tasks; defaults to
+        ``_POSTS_PER_AGED_GET``.
+        """
+        self._maxsize: int = size
+        self._get_max_wait: float = self._GET_MAX_WAIT if get_max_wait is None else get_max_wait
+        self._posts_per_aged_get: int = (self._POSTS_PER_AGED_GET if posts_per_aged_get is None
+                                         else max(1, posts_per_aged_get))
+        # POST tasks served since the last GET task, while GET tasks were waiting.
+        self._posts_since_get: int = 0
+
+        # Tasks along with their enqueue time, for GET aging and for tracing queue waits.
+        self._q_post: deque[tuple[float, PostTask | StopTask]] = deque()  # high priority
+        # GET tasks and blocks.
+        self._q_get: deque[tuple[float, GetTask | RangeTask]] = deque()  # low priority
+
+        # Parked coroutines waiting for a task, or for room in a lane.
+        self._getters: deque[asyncio.Future] = deque()
+        self._putters_post: deque[asyncio.Future] = deque()
+        self._putters_get: deque[asyncio.Future] = deque()
+
+        # Number of tasks handed out or buffered that were not marked done yet.
+        self._unfinished: int = 0
+        self._finished: asyncio.Event = asyncio.Event()
+        self._finished.set()
 
         # If true, never accepts any task.
         self._is_sealed: bool = False
 
+    def qsize(self) -> int:
+        """Returns the number of buffered tasks across both lanes."""
+        return len(self._q_post) + len(self._q_get)
+
+    def empty(self) -> bool:
+        """Returns True if no task is buffered."""
+        return not self._q_post and not self._q_get
+
+    def posts_waiting(self) -> bool:
+        """Returns True if a task is buffered in the POST lane."""
+        return bool(self._q_post)
+
+    @staticmethod
+    def _wakeup_next(waiters: deque[asyncio.Future]) -> None:
+        """Wakes up the first parked waiter that is still waiting."""
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    @staticmethod
+    async def _park(waiters: deque[asyncio.Future]) -> None:
+        """Parks the current coroutine until woken up by ``_wakeup_next()``."""
+        waiter: asyncio.Future = asyncio.get_running_loop().create_future()
+        waiters.append(waiter)
+        try:
+            await waiter
+        except BaseException:
+            waiter.cancel()
+            try:
+                waiters.remove(waiter)
+            except ValueError:
+                pass
+            raise
+
+    def _is_full(self, lane: deque) -> bool:
+        return 0 < self._maxsize <= len(lane)
+
     async def put(self, task: Task) -> bool:
         """
         Calls the matching put() method. Adding a Task to the queue.
 
         Returns True for enqueued, False for otherwise.
         """
-        log.debug(f'Enqueueing task {type(task)}...')
+        log.debug(Event('enqueue', task=type(task).__name__))
         if self._is_sealed:
             log.warning('Cannot put; queue sealed.')
             return False
 
         match task:
             case PostTask():
-                await self.q_post.put(task)
-            case GetTask():
-                await self.q_get.put(task)
+                lane, putters = self._q_post, self._putters_post
+            case GetTask() | RangeTask():
+                lane, putters = self._q_get, self._putters_get
             case StopTask():
                 self._is_sealed = True
-                # Decide to use the POST queue to enqueue the stop tasks.
-                await self.q_post.put(task)
-        return True
-
-    async def get(self) -> Task:
-        """Returns a Task from the queue. Always prioritizes POST tasks."""
-        # log.debug(f'POST QUEUE: {self.q_post}')
-        # log.debug(f'GET QUEUE: {self.q_get}')
-        while True:
-            # Return directly without waiting for queue if a POST task is inside.
-            try:
-                return self.q_post.get_nowait()
-            except asyncio.QueueEmpty:
-                pass
+                # Decide to use the POST lane to enqueue the stop tasks.
+                lane, putters = self._q_post, self._putters_post
+            case _:
+                raise TypeError(f'Task cannot be {type(task)}.')
 
-            # If not, wait a bit for a GET task.
-            # Without the loop, if the GET queue would be empty, and
-            # we were awaiting a .get() on it, the function would never return.
+        while self._is_full(lane):
             try:
-                return await asyncio.wait_for(self.q_get.get(), timeout=0.05)
-            except asyncio.TimeoutError:
-                pass
-
-    def task_done(self, item: Task):
-        """Mark the item as processed on its originating queue."""
-        match item:
-            case PostTask():
-                self.q_post.task_done()
-            case GetTask():
-                self.q_get.task_done()
-            case StopTask():
-                # We decided to only use the POST queue for stop tasks.
-                self.q_post.task_done()
-
-    async def join(self):
-        """Awaits the corresponding .join() method on all queues, waiting for them to be finished processing."""
-        await asyncio.gather(
-            self.q_post.join(),
-            self.q_get.join()
-        )
-
-
-class AsyncCounter:
-    """Asynchronous-safe counter."""
-
-    def __init__(self, start: int = 0):
-        self._value: int = start
-        self._lock: asyncio.Lock = asyncio.Lock()
-
-    async def inc(self, value: Optional[int] = 1) -> int:
-        """Increments the counter by ``value``, one by default. Returns the current value incremented by value."""
-        async with self._lock:
-            self._value += value
-            return self._value
-
-    async def dec(self, value: Optional[int] = 1) -> int:
-        """Decrements the counter by ``value``, one by default. Returns the current value decremented by value."""
-        async with self._lock:
-            self._value -= value
-            return self._value
-
-    async def get(self) -> int:
-        async with self._lock:
-            return self._value
-
-
-class Metrics:
-    """Metrics during the app"""
-
-    def __init__(self):
-        self.request_count: dict[str, AsyncCounter] = {}
+                await self._park(putters)
+            except BaseException:
+                # We may have been woken up right before being cancelled; pass the turn on.
+                if not self._is_full(lane):
+                    self._wakeup_next(putters)
+                raise
 
-    async def inc_req(self, req_type: str) -> int:
-        """Increments the counter for the given request type."""
-        # Inc global count
-        await self.request_count['ALL'].inc()
+        entry = (asyncio.get_running_loop().time(), task)
+        if isinstance(task, GetTask | RangeTask):
+            self._q_get.append(entry)
+        else:
+            self._q_post.append(entry)
+        self._unfinished += 1
+        self._finished.clear()
+        self._wakeup_next(self._getters)
+        return True
 
-        # Create if not exist.
-        if req_type not in self.request_count:
-            self.request_count[req_type] = AsyncCounter(1)
-            return 1
+    def put_nowait(self, task: GetTask | PostTask) -> None:
+        """
+        Enqueues a follow-up task right away, ignoring the lane capacity and the seal.
+        Meant for workers chaining requests: waiting for room while holding a worker slot could deadlock the consumer.
+        """
+        entry = (asyncio.get_running_loop().time(), task)
+        if isinstance(task, GetTask):
+            self._q_get.append(entry)
+        elif self._q_post and isinstance(self._q_post[-1][1], StopTask):
+            # Still ahead of the stop sentinel.
+            self._q_post.insert(len(self._q_post) - 1, entry)
+        else:
+            self._q_post.append(entry)
+        self._unfinished += 1
+        self._finished.clear()
+        self._wakeup_next(self._getters)
 
-        # if exists, inc
-        return await self.request_count[req_type].inc()
+    async def get(self) -> GetTask | PostTask | StopTask:
+        """Returns a Task from the queue. Prioritizes POST tasks, unless the oldest GET task has aged out and is due."""
+        return (await self.get_timed())[0]
 
-    @classmethod
-    def hook_httpx_client(cls, client: httpx.AsyncClient):
-        client.event_hooks = {
-            'request': [cls._on_httpx_request],
-            'response': [cls._on_httpx_response]
-        }
-
-    async def _on_httpx_request(self, request) -> None:
-        # count by current request method on the wire
-        print(request)
-        await self.inc_req(request.method)
+    async def get_timed(self, posts_only: bool = False) -> tuple[GetTask | PostTask | StopTask, float]:
+        """
+        Like ``get()``, also returning the seconds the task waited in the queue. Tasks of a ``RangeTask`` count from
+        the moment they reached the head of the GET lane.
+        :param posts_only: Serve the POST lane only, aged GETs included; the POST lane must not be empty.
+        """
+        while True:
+            while self.empty():
+                try:
+                    await self._park(self._getters)
+                except BaseException:
+                    if not self.empty():
+                        self._wakeup_next(self._getters)
+                    raise
+
+            if (entry := self._pop(posts_only)) is not None:
+                enqueued, task = entry
+                return task, asyncio.get_running_loop().time() - enqueued
+            # A block only had skipped IDs so far; let the loop run before scanning on.
+            await asyncio.sleep(0)
+
+    def _pop(self, posts_only: bool = False) -> Optional[tuple[float, GetTask | PostTask | StopTask]]:
+        """
+        Pops the next task to serve along with its enqueue time; the queue must not be empty.
+        Returns None if the GET lane's head is a block that had no task in the IDs scanned.
+        """
+        if self._q_get and not posts_only and (
+                not self._q_post
+                # The stop sentinel seals the queue, so it is the last POST; it must also come after every GET.
+                or isinstance(self._q_post[0][1], StopTask)
+                or (self._posts_since_get >= self._posts_per_aged_get
+                    and asyncio.get_running_loop().time() - self._q_get[0][0] >= self._get_max_wait)
+        ):
+            self._posts_since_get = 0
+            entry = self._q_get[0]
+            enqueued, task = entry
+            if isinstance(task, RangeTask):
+                task = self._pop_range(task)
+                return (enqueued, task) if task is not None else None
+            self._drop_get_head()
+        else:
+            entry = self._q_post.popleft()
+            self._wakeup_next(self._putters_post)
+            if self._q_get:
+                self._posts_since_get += 1
+        return entry
 
-    async def _on_httpx_response(self, response: httpx.Response) -> None:
-        return
-        # Count redirects by the *original request method* for this hop
-        if response.is_redirect:
-            await self.metrics.redirects_total.inc()
-            m = response.request.method  # method that received the redirect
-            if m in self.metrics.redirects_by_method:
-                await self.metrics.redirects_by_method[m].inc()
+    def _pop_range(self, block: RangeTask) -> Optional[GetTask]:
+        """
+        Takes the next task out of the block heading the GET lane, dropping the block once exhausted.
+        The block is stamped again each time it hands a task out: each of its IDs ages from the moment it reaches the
+        head of the lane, as if enqueued on its own behind the previous one. Aged from the block's enqueue time, all
+        the IDs of a large block would soon count as aged and outrank the POST lane.
+        """
+        task: Optional[GetTask] = block.next_task(self._RANGE_SCAN)
+        if task is not None:
+            self._unfinished += 1
+        if not len(block):
+            self._drop_get_head()
+            self.task_done(block)
+        elif task is not None:
+            self._q_get[0] = (asyncio.get_running_loop().time(), block)
+        return task
+
+    def _drop_get_head(self) -> None:
+        """Removes the head of the GET lane. A block becoming the head is stamped: its first ID ages from now on."""
+        self._q_get.popleft()
+        if self._q_get and isinstance(self._q_get[0][1], RangeTask):
+            self._q_get[0] = (asyncio.get_running_loop().time(), self._q_get[0][1])
+        self._wakeup_next(self._putters_get)
 
-    async def make_string(self) -> str:
-        """Creates a human string representation of the metrics."""
-        reqs: str = ''
-        for method, value in self.request_count.items():
-            # indentation + metrics
-            reqs += f'    {method}: {await value.get():>5}\n'
+    def task_done(self, item: Task):
+        """Mark the item as processed."""
+        if self._unfinished <= 0:
+            raise ValueError('task_done() called too many times')
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
 
-        return f"""Network Metrics:
-  Sent HTTP Requests:
-{reqs}"""
+    async def join(self):
+        """Waits until every task put in the queue has been marked done."""
+        if self._unfinished > 0:
+            await self._finished.wait()
 
 
 class Fetcher:
     """Component that fetches the website by sending HTTP GET requests."""
 
-    # Random time interval to wait for inside each worker in seconds, in between first and second value included.
-    _WORKER_JITTER: tuple[float, float] = 0.05, 0.3
-
-    # Number of times to retry if server HTTP error code.
-    _MAX_RETRIES: int = 10
-
     # Maximum number of tasks to be buffered in the fetcher's task queue, at maximum.
     _TASK_QUEUE_SIZE: int = 100
 
-    def __init__(self, client: AsyncClient, base_url: str = 'https://doujinstyle.com/',
+    # Size of the chunks response bodies are streamed by, in bytes.
+    _STREAM_CHUNK_SIZE: int = 64 * 1024
+
+    # Number of IDs in each block of tasks ``fetch_range()`` and ``fetch_items()`` enqueue.
+    _ID_BLOCK_SIZE: int = 4096
+
+    # Number of consecutive IDs discovery probes before deciding a point of the ID space is past the last item,
+    # so deleted items do not end the search early.
+    _DISCOVERY_WINDOW: int = 4
+
+    def __init__(self, client: Optional[AsyncClient] = None, base_url: str = 'https://doujinstyle.com/',
                  user_agents_file: str = Path(__file__).parent.with_name("user_agents.txt"),
-                 print_metrics: bool = False
+                 print_metrics: bool = False,
+                 concurrency: Optional[AdaptiveConcurrency] = None,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 metrics_file: Optional[Path] = None,
+                 metrics_interval: float = 60.0,
+                 checkpoint: Optional[CheckpointStore] = None,
+                 cache: Optional[ResponseCache] = None,
+                 max_response_bytes: Optional[int] = None,
+                 inflight_bytes: Optional[int] = None,
+                 missing_ids_file: Optional[Path] = None,
+                 results_size: int = 0,
+                 transport: str | TransportProfile = 'polite',
+                 retry_policy: Optional[RetryPolicy] = None,
+                 timeout_policy: Optional[TimeoutPolicy] = None,
+                 hedge_budget: Optional[HedgeBudget] = None,
+                 user_agent_weights: Optional[Mapping[str, float]] = None,
+                 tracer: Optional[Tracer] = None,
+                 trace_file: Optional[Path] = None,
+                 coalesce: bool = True,
+                 memo_ttl: float = 0.0,
+                 memo_bytes: int = 32 << 20,
+                 breaker: Optional[CircuitBreaker] = None,
+                 egress: Optional[EgressPool] = None
                  ) -> None:
         """
         Constructor of the `Fetcher` component.
-        :param client: Asynchronous client the `Fetcher` uses to do its HTTP GET requests.
+        :param client: Asynchronous client the `Fetcher` uses to do its HTTP GET requests. If None, the fetcher
+        builds its own from the ``transport`` profile, and closes it when the instance goes out of scope.
         :param base_url: Base URL of the website.
         :param user_agents_file: A text file with user agents on each line. Each HTTP request will have a randomly
-        :param print_metrics: Prints some statistics on sent requests when the instance goes out of scope.
         selected user agent from this file. If none selected, a single default user agent will be used.
+        Lines may be prefixed by a category and a pipe, e.g. ``windows|Mozilla/5.0 ...``.
+        :param print_metrics: Prints some statistics on sent requests when the instance goes out of scope.
+        :param concurrency: Controller bounding the number of in-flight tasks. Defaults to an
+        ``AdaptiveConcurrency`` with its default bounds.
+        :param rate_limiter: Token bucket shared by all workers, each request takes a token. Defaults to a bucket
+        without rate limit, which still pauses every worker when the server asks to back off.
+        :param metrics_file: If set, a metrics snapshot is written there every ``metrics_interval`` seconds and when
+        the instance goes out of scope. Prometheus text format if the file ends with ``.prom``, JSON otherwise.
+        :param metrics_interval: Seconds in between two metrics snapshots.
+        :param checkpoint: Open store recording the outcome of each fetched item. ``fetch_range()`` then skips the
+        items completed by previous runs.
+        :param cache: Open response cache. GET requests then revalidate cached pages with conditional requests,
+        and unchanged pages are read from disk.
+        :param max_response_bytes: Default cap on the body bytes read per GET; longer bodies are truncated.
+        :param inflight_bytes: Budget of body bytes held in memory across all workers. A body is only read once it
+        fits, and is held until its callback returns; with ``fetch_items()``, an item page is held until its download
+        POST ends. None means unbounded.
+        :param missing_ids_file: File persisting the IDs known to be missing (HTTP 404) across runs. It is loaded
+        here and saved when the instance goes out of scope; ``fetch_range()`` skips those IDs. Only the IDs below an
+        item seen to exist are saved: new items take the IDs past the last one, which must be fetched again.
+        :param results_size: If positive, every outcome is also sent to a channel of this capacity, read with
+        ``results()``. When the channel is full, workers wait, which stops the fetcher from dequeuing more tasks.
+        :param transport: A ``TransportProfile``, or the name of one of ``scraper.transport.PROFILES``. Its worker
+        jitter always applies; its protocol, pool and timeouts only if the fetcher builds its own client.
+        :param retry_policy: Retry policy of the tasks that do not carry their own. Defaults to ``RetryPolicy()``.
+        :param timeout_policy: Timeout policy of the tasks that do not carry their own. Defaults to no deadline and
+        no hedging.
+        :param hedge_budget: Caps the hedged requests sent by all workers. Defaults to ``HedgeBudget()``.
+        :param user_agent_weights: Relative weight of each user agent category, see ``HeaderPool``.
+        :param tracer: Records per-task spans: queue wait, jitter, rate limiting, pool wait, connect, TLS, time to
+        first byte, body download, backoff and callback. Use ``Tracer(sample_rate=...)`` to trace only a fraction.
+        :param trace_file: If set, the trace is written there when the instance goes out of scope; Chrome trace JSON
+        if the file ends with ``.json``, compact binary log otherwise. Traces every task if ``tracer`` is None.
+        :param coalesce: Tasks sending the same request (method, URL and body) as a task in flight do not send their
+        own: they wait for it and their callbacks get its outcome. GET tasks streaming to a chunk consumer are never
+        coalesced.
+        :param memo_ttl: If positive and ``coalesce`` is set, outcomes are also kept this many seconds, and tasks
+        sending the same request meanwhile get them without a request.
+        :param memo_bytes: Maximum total body bytes the outcome memo holds.
+        :param breaker: Circuit breaker pausing the whole queue while the server is down; tasks failing meanwhile
+        are put back in the queue instead of being given up. Defaults to ``CircuitBreaker()``.
+        :param egress: Routes (proxies, local addresses) the requests go out through instead of ``client``, which
+        must then be None. Each attempt takes the least loaded healthy route and its own rate limiter on top of
+        ``rate_limiter``; a 429 only pauses the route that received it. Discovery probes use the first route. The
+        caller closes the pool.
         """
 
         # If True, disallows any task to enter the task queue. Effectively disallowing put().
@@ -298,25 +577,93 @@ class Fetcher:
 
         # Base URL of the website.
         self._base_url: URL = URL(base_url)
-
-        self._client: AsyncClient = client
-        # Load the user agents in memory.
-        self._user_agents: list[str] = Fetcher._load_user_agents(Path(user_agents_file))
+        # Item URLs without their ID, e.g. https://doujinstyle.com/?p=page&type=1&id=
+        self._item_url_prefix: str = f'{self._base_url.with_query(p="page", type="1")}&id='
+
+        self.transport: TransportProfile = get_profile(transport)
+        # Random time interval to wait for inside each worker in seconds, in between first and second value included.
+        self._worker_jitter: tuple[float, float] = self.transport.worker_jitter
+
+        if client is not None and egress is not None:
+            raise ValueError('Pass either a client or an egress pool, not both.')
+        # Routes the requests are spread over; None sends them all through ``self._client``.
+        self.egress: Optional[EgressPool] = egress
+        # Whether the client was built here, and so must be closed here.
+        self._owns_client: bool = client is None and egress is None
+        self._client: AsyncClient = (client if client is not None else egress.routes[0].client if egress is not None
+                                     else build_client(self.transport))
+        clients: list[AsyncClient] = [r.client for r in egress.routes] if egress is not None else [self._client]
+        # Prebuilt headers of the user agents, parsed once per process.
+        self._headers: HeaderPool = HeaderPool.from_file(Path(user_agents_file), user_agent_weights)
 
         # Queue of tasks to execute.
-        self._task_queue: TaskPriorityQueue = TaskPriorityQueue(100)
+        self._task_queue: TaskPriorityQueue = TaskPriorityQueue(self._TASK_QUEUE_SIZE)
 
         # Our task group to run concurrently our tasks.
         self._tg: asyncio.TaskGroup | None = None
 
+        # Bounds and adapts the number of tasks running at once.
+        self.concurrency: AdaptiveConcurrency = concurrency if concurrency is not None else AdaptiveConcurrency()
+
+        # Paces requests across all workers, and holds them all back on 429s and the like.
+        self.rate_limiter: TokenBucket = rate_limiter if rate_limiter is not None else TokenBucket()
+
+        self.retry_policy: RetryPolicy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.timeout_policy: TimeoutPolicy = timeout_policy if timeout_policy is not None else TimeoutPolicy()
+        self._hedge_budget: HedgeBudget = hedge_budget if hedge_budget is not None else HedgeBudget()
+
+        # Stops dequeuing while the server is down, and probes it before resuming.
+        self.breaker: CircuitBreaker = breaker if breaker is not None else CircuitBreaker()
+
         # Records some metrics.
         self.metrics: Metrics = Metrics()
 
         # Hook some httpx events to count requests
-        self.metrics.hook_httpx_client(client)
+        for c in clients:
+            self.metrics.hook_httpx_client(c)
+
+        self._trace_file: Optional[Path] = Path(trace_file) if trace_file is not None else None
+        self.tracer: Optional[Tracer] = tracer if tracer is not None or trace_file is None else Tracer()
+        if self.tracer is not None:
+            for c in clients:
+                self.tracer.hook_httpx_client(c)
 
         self._print_metrics = print_metrics
 
+        self._metrics_file: Optional[Path] = Path(metrics_file) if metrics_file is not None else None
+        self._metrics_interval: float = metrics_interval
+        self._metrics_dumper: Optional[asyncio.Task] = None
+
+        self._checkpoint: Optional[CheckpointStore] = checkpoint
+        # Items completed (fetched or missing) and failed in previous runs, loaded on first use.
+        self._checkpoint_state: Optional[tuple[IdBitmap, IdBitmap]] = None
+
+        self._cache: Optional[ResponseCache] = cache
+
+        self._max_response_bytes: Optional[int] = max_response_bytes
+        self._byte_budget: Optional[ByteBudget] = ByteBudget(inflight_bytes) if inflight_bytes else None
+
+        # IDs the server answered 404 for.
+        self._missing_ids_file: Optional[Path] = Path(missing_ids_file) if missing_ids_file is not None else None
+        self.missing_ids: IdBitmap = (IdBitmap.load(self._missing_ids_file) if self._missing_ids_file is not None
+                                      else IdBitmap())
+        # Highest ID the server served a page for in this run. Missing IDs past it may belong to items not created
+        # yet: discovery probes them anyway, and they are not saved.
+        self._max_live_id: int = -1
+        # The loaded missing IDs were saved below an ID that existed back then.
+        self._missing_bound: int = self.missing_ids.max()
+
+        self._coalesce: bool = coalesce
+        # Requests in flight, along with the duplicate tasks waiting for their outcome.
+        self._in_flight: dict[FlightKey, list[GetTask | PostTask]] = {}
+        # Recent outcomes: how the task ended, and its response.
+        self._memo: Optional[ResultMemo[FlightKey, tuple[Progress, Optional[Resp]]]] = (
+            ResultMemo(memo_ttl, max_bytes=memo_bytes) if coalesce and memo_ttl > 0 else None)
+
+        # Outcomes in completion order, None marks the end.
+        self._results: Optional[asyncio.Queue[Optional[Outcome]]] = (
+            asyncio.Queue(maxsize=results_size) if results_size > 0 else None)
+
     async def __aenter__(self):
         self._tg = asyncio.TaskGroup()
         await self._tg.__aenter__()
@@ -324,23 +671,40 @@ class Fetcher:
         # Start consuming queue
         self._tg.create_task(self._consume_queue(), name='QueueConsumer')
 
+        if self._metrics_file is not None:
+            self._metrics_dumper = self._tg.create_task(
+                self.metrics.dump_periodically(self._metrics_file, self._metrics_interval), name='MetricsDumper')
+
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         assert self._tg is not None
 
         # Close the queue listener and wait for the queue to empty.
-        await self._enqueue_stop()
+        await self.close()
         await self._task_queue.join()
 
+        if self._metrics_dumper is not None:
+            self._metrics_dumper.cancel()
+            self._metrics_dumper = None
+
         await self._tg.__aexit__(exc_type, exc_val, exc_tb)
         self._tg = None
+        if self._owns_client:
+            await self._client.aclose()
+        if self._metrics_file is not None:
+            self.metrics.write_snapshot(self._metrics_file)
+        if self._trace_file is not None:
+            self.tracer.dump(self._trace_file)
+        if self._missing_ids_file is not None:
+            self.missing_ids.truncate(max(self._max_live_id, self._missing_bound) + 1)
+            self.missing_ids.save(self._missing_ids_file)
         if self._print_metrics:
             print(f'\n{await self.make_metrics()}')
 
     async def make_metrics(self) -> str:
         """Creates a human-readable metrics string for printing."""
-        return await self.metrics.make_string()
+        return self.metrics.make_string()
 
     async def enqueue(self, task: Task, timeout: Optional[float] = None):
         """
@@ -351,24 +715,101 @@ class Fetcher:
         if self._is_sealed:
             raise RuntimeError('Queue sealed; fetcher is closed to new tasks.')
 
-        if not isinstance(task, GetTask | PostTask | StopTask):
+        if not isinstance(task, GetTask | PostTask | RangeTask | StopTask):
             raise RuntimeError(f'Task cannot be {type(task)}.')
 
-        if timeout is None or timeout <= 0:
-            await self._task_queue.put(task)
-        else:
-            await asyncio.wait_for(self._task_queue.put(task), timeout)
+        # Producer side: shows how long a full queue holds back whatever enqueues tasks.
+        with self.tracer.producer_span('enqueue') if self.tracer is not None else NULL_SPAN:
+            if timeout is None or timeout <= 0:
+                await self._task_queue.put(task)
+            else:
+                await asyncio.wait_for(self._task_queue.put(task), timeout)
 
     async def join(self):
         """Blocks until all """
         await self._task_queue.join()
 
-    async def _wrap_and_mark(self, t: Task) -> None:
-        """Wraps the worker to honour the join()."""
+    async def close(self) -> None:
+        """
+        Seals the fetcher: no task can be enqueued anymore. The tasks already queued still run, after which
+        the ``results()`` iterator ends. Called when the instance goes out of scope.
+        """
+        if self._is_sealed:
+            return
+        self._is_sealed = True
+        await self._enqueue_stop()
+
+    async def results(self) -> AsyncIterator[Outcome]:
+        """
+        Iterates over the outcomes of all tasks in completion order, until the fetcher is closed and drained.
+        Needs ``results_size``. Consume it in its own task, concurrently with whatever enqueues tasks:
+
+            async with Fetcher(client, results_size=100) as fetcher:
+                async def produce():
+                    await fetcher.fetch_range(range(1000), None)
+                    await fetcher.close()
+                producer = asyncio.create_task(produce())
+                async for outcome in fetcher.results():
+                    ...
+        """
+        if self._results is None:
+            raise RuntimeError('The results channel is disabled; set results_size.')
+        while (outcome := await self._results.get()) is not None:
+            # The consumer owns the body from now on.
+            self._release_body(outcome.res)
+            yield outcome
+
+    async def _wrap_and_mark(self, t: Task, queue_wait: float = 0.0, key: Optional[FlightKey] = None,
+                             probe: bool = False) -> None:
+        """
+        Wraps the worker to honour the join() and give its concurrency slot back.
+        :param queue_wait: Seconds the task waited in the queue, for tracing.
+        :param key: Coalescing key of the task, whose duplicates are served along with it.
+        :param probe: Whether the task is the circuit breaker's probe.
+        """
+        if self.tracer is not None:
+            self.tracer.start_task(t.item_id, 'GET' if isinstance(t, GetTask) else 'POST', queue_wait)
         try:
-            await self._worker_ex_task(t)
+            await self._worker_ex_task(t, key, probe)
         finally:
+            self.concurrency.release()
             self._task_queue.task_done(t)
+            if key is not None:
+                # The duplicates were served along with this task, or it failed for them too.
+                for follower in self._in_flight.pop(key, ()):
+                    self._task_queue.task_done(follower)
+
+    def _dispatch(self, task: GetTask | PostTask, queue_wait: float, probe: bool = False) -> None:
+        """
+        Runs a dequeued task in a worker, which holds the concurrency slot just acquired. A duplicate of a task in
+        flight instead waits for the latter's outcome, without a worker, and gives the slot back.
+        :param probe: Whether the circuit breaker admitted the task as its probe.
+        """
+        if (key := self._flight_key(task)) is not None:
+            if (followers := self._in_flight.get(key)) is not None:
+                followers.append(task)
+                self.metrics.duplicates_suppressed += 1
+                self.concurrency.release()
+                return
+            self._in_flight[key] = []
+        self._tg.create_task(self._wrap_and_mark(task, queue_wait, key, probe))
+
+    def _flight_key(self, task: GetTask | PostTask) -> Optional[FlightKey]:
+        """Returns the key identifying the request of a task, None if it must not be coalesced."""
+        if not self._coalesce:
+            return None
+        match task:
+            case GetTask(url=url, max_bytes=max_bytes, consumer=None):
+                return 'GET', str(url), max_bytes
+            case PostTask(url=url, data=data):
+                try:
+                    body: Hashable = tuple(sorted(data.items())) if data else None
+                    hash(body)
+                except TypeError:
+                    # E.g. a list of values; such requests are not coalesced.
+                    return None
+                return 'POST', str(url), body
+        return None
 
     async def _consume_queue(self):
         """Listens on the queue and consumes it, executing tasks."""
@@ -376,45 +817,65 @@ class Fetcher:
             raise ValueError('TaskGroup is None; please use a context manager.')
 
         while True:
-            match task := await self._task_queue.get():
+            # Only dequeue once a worker slot is free, leaving pending tasks in the priority queue.
+            await self.concurrency.acquire()
+            task, waited, probe = await self._next_task()
+            match task:
                 case GetTask() | PostTask():
-                    self._tg.create_task(self._wrap_and_mark(task))
+                    self._dispatch(task, waited, probe)
                 case StopTask(reason=reason):
+                    self.concurrency.release()
                     self._task_queue.task_done(task)
                     log.info(f'Awaiting queue drainage...; stopped listening, reason: {reason}')
-                    await self._task_queue.join()
+                    await self._drain()
+                    if self._results is not None:
+                        await self._results.put(None)
                     break
 
-    async def _enqueue_stop(self):
-        """Enqueues a StopTask, when read by the consumer, the latter will cease to listen on the queue."""
-        log.debug('Enqueueing stop sentinel task.')
-        await self._task_queue.put(StopTask())
+    async def _drain(self) -> None:
+        """Waits for the queue to be joined, still running the follow-up tasks workers enqueue meanwhile."""
+        joined: asyncio.Future = asyncio.ensure_future(self._task_queue.join())
+        try:
+            while True:
+                await self.concurrency.acquire()
+                getter: asyncio.Future = asyncio.ensure_future(self._next_task())
+                await asyncio.wait((joined, getter), return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    self._dispatch(*getter.result())
+                    if joined.done():
+                        # The queue was joined before this task came in.
+                        joined = asyncio.ensure_future(self._task_queue.join())
+                    continue
+                getter.cancel()
+                self.concurrency.release()
+                return
+        finally:
+            joined.cancel()
 
-    @staticmethod
-    def _load_user_agents(filename: Path) -> list[str]:
+    async def _next_task(self) -> tuple[GetTask | PostTask | StopTask, float, bool]:
         """
-        Returns a list of user agents from a user agents text file.
-        The file format should be: one user agent per line.
-        Returns a default user agent if file empty/does not exist.
+        Dequeues the next task once the circuit breaker admits one. Returns it along with its queue wait, and whether
+        it is the breaker's probe.
         """
-        default_ua: list[str] = [
-            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
-        ]
-
-        if not filename.exists():
-            log.warning(f'User agents file: {filename} does not exist; using default.')
-            return default_ua
+        probe: bool = await self.breaker.admit()
+        if (budget := self._byte_budget) is not None:
+            # Pages waiting for their download POST fill the byte budget: hold the GETs back, aged or not, until
+            # bytes are given back, and meanwhile only run the POSTs.
+            while budget.saturated and not self._task_queue.posts_waiting():
+                await budget.wait_release()
+            task, waited = await self._task_queue.get_timed(posts_only=budget.saturated)
+        else:
+            task, waited = await self._task_queue.get_timed()
+        return task, waited, probe
 
-        with filename.open('r', encoding='utf-8') as f:
-            # Deduplicate
-            if ua := set(
-                    [agent.strip() if len((part := agent.split('|', 1))) == 1 else part[1].strip() for agent in f]):
-                return list(ua)
-            return default_ua
+    async def _enqueue_stop(self):
+        """Enqueues a StopTask, when read by the consumer, the latter will cease to listen on the queue."""
+        log.debug('Enqueueing stop sentinel task.')
+        await self._task_queue.put(StopTask())
 
-    def _make_headers(self, referer_url: URL) -> dict[str, str]:
-        """Makes a unique header (random user agent) for each HTTP request. Add redirect referer."""
-        return {'User-Agent': random.choice(self._user_agents), 'Referer': str(referer_url)}
+    def _make_headers(self, referer: str) -> HeaderPairs:
+        """Returns the prebuilt headers of the next user agent in rotation, with the redirect referer."""
+        return self._headers.with_referer(referer)
 
     @staticmethod
     def _get_id_from_url(url: URL) -> Optional[int]:
@@ -426,142 +887,650 @@ class Fetcher:
 
         return None
 
-    async def _do_get(self, url: URL, headers: Optional[Mapping[str, str]]) -> GetResp:
-        """Sends an HTTP GET request to URL and returns the bytes."""
-        r: Response = await self._client.get(
-            url=str(url),
-            headers=(headers if headers else self._make_headers(url))
-        )
-        r.raise_for_status()
-        count: int = await self.metrics.request_count['GET'].get()
-        log.debug(f'GET #{count} {url} -> {r.status_code}')
-
-        return GetResp(r.status_code, r.content)
-
-    async def _do_post(self, url: URL, headers: Optional[Mapping[str, str]], data: Mapping[str, Any]) -> PostResp:
-        """Sends an HTTP POST request to URL and returns the bytes."""
-        # if not (url_id := str(self._get_id_from_url(url))):
-        #     raise ValueError('missing id in URL query; cannot HTTP POST')
-        # data: dict = {
-        #     'type': '1',
-        #     'id': url_id,
-        #     'source': '',
-        #     'download_link': ''
-        # }
-        r: Response = await self._client.post(
-            url=str(url),
+    async def _do_get(self, url: URL, headers: Optional[Mapping[str, str] | HeaderPairs], max_bytes: Optional[int] = None,
+                      consumer: Optional[ChunkConsumer] = None, client: Optional[AsyncClient] = None) -> GetResp:
+        """
+        Sends an HTTP GET request to URL and streams the body back. Revalidates the cached copy if there is one.
+        The returned content is accounted in the byte budget; release it with ``_release_body()``.
+        :param client: Client of the egress route to send it through; the fetcher's own client by default.
+        """
+        client = client if client is not None else self._client
+        url_str: str = str(url)
+        headers = headers if headers else self._make_headers(url_str)
+        entry: Optional[CacheEntry] = None
+        if self._cache is not None and (entry := await self._cache.lookup(url_str)) is not None:
+            headers = {**dict(headers), **self._cache.validators(entry)}
+        if max_bytes is None:
+            max_bytes = self._max_response_bytes
+
+        async with client.stream('GET', url_str, headers=headers) as r:
+            not_modified: bool = r.status_code == 304 and entry is not None
+            if not not_modified:
+                r.raise_for_status()
+                status: int = r.status_code
+                resp_headers: httpx.Headers = r.headers
+                content, size, truncated = await self._read_body(r, max_bytes, consumer)
+
+        if not_modified:
+            if (content := await self._cache.load(entry)) is not None:
+                self.metrics.cache_hit(entry.size)
+                log.debug(Event('get', n=self.metrics.requests_by_method.get('GET', 0), url=url, status=304,
+                                cached=True))
+                if consumer is not None:
+                    consumer(content)
+                    return GetResp(200, b'', from_cache=True)
+                if self._byte_budget is not None:
+                    self._byte_budget.charge(len(content))
+                return GetResp(200, content, from_cache=True)
+            # The body vanished from the cache; fetch it again unconditionally.
+            return await self._do_get(url, None, max_bytes, consumer, client)
+
+        self.metrics.observe_size(size)
+        log.debug(Event('get', n=self.metrics.requests_by_method.get('GET', 0), url=url, status=status))
+        if self._cache is not None:
+            self.metrics.cache_miss()
+            if consumer is None and not truncated:
+                await self._cache.store(url_str, content, resp_headers)
+
+        return GetResp(status, content, truncated=truncated)
+
+    async def _read_body(self, r: Response, max_bytes: Optional[int],
+                         consumer: Optional[ChunkConsumer]) -> tuple[bytes, int, bool]:
+        """
+        Reads a streamed response body by chunks, honouring the byte cap, the consumer and the byte budget.
+        :returns: The content (empty when a consumer is given), the number of body bytes read, and whether the body
+        was cut short.
+        """
+        budget: Optional[ByteBudget] = self._byte_budget if consumer is None else None
+        held: int = 0
+        if budget is not None:
+            # Admit the body against its announced size, else its cap, else a single chunk;
+            # anything read past that is charged as it comes.
+            length: str = r.headers.get('Content-Length', '')
+            if length.isdigit():
+                expected: int = int(length) if max_bytes is None else min(int(length), max_bytes)
+            else:
+                expected: int = max_bytes if max_bytes is not None else self._STREAM_CHUNK_SIZE
+            await budget.acquire(expected)
+            held = expected
+
+        chunks: list[bytes] = []
+        size: int = 0
+        truncated: bool = False
+        try:
+            async for chunk in r.aiter_bytes(self._STREAM_CHUNK_SIZE):
+                if max_bytes is not None and size + len(chunk) > max_bytes:
+                    chunk = chunk[:max_bytes - size]
+                    truncated = True
+                size += len(chunk)
+                if consumer is not None:
+                    truncated = consumer(chunk) or truncated
+                else:
+                    chunks.append(chunk)
+                    if budget is not None and size > held:
+                        budget.charge(size - held)
+                        held = size
+                if truncated:
+                    # Leaving the stream context closes the connection instead of downloading the rest.
+                    break
+        except BaseException:
+            if budget is not None:
+                budget.release(held)
+            raise
+
+        if budget is not None:
+            # Only keep the bytes actually held by the content.
+            budget.release(held - size)
+        return b''.join(chunks), size, truncated
+
+    def _release_body(self, resp: Optional[Resp]) -> None:
+        """Gives the bytes of a delivered GET response back to the byte budget."""
+        if self._byte_budget is not None and isinstance(resp, GetResp) and resp.content:
+            self._byte_budget.release(len(resp.content))
+
+    async def _do_post(self, url: URL, headers: Optional[Mapping[str, str]], data: Mapping[str, Any],
+                       client: Optional[AsyncClient] = None) -> PostResp:
+        """Sends an HTTP POST request to URL and returns the bytes. See ``_download_form()`` for the item form."""
+        url_str: str = str(url)
+        r: Response = await (client if client is not None else self._client).post(
+            url=url_str,
             data=data,
-            headers=(headers if headers else self._make_headers(url)),
+            headers=(headers if headers else self._make_headers(url_str)),
             follow_redirects=True
         )
         r.raise_for_status()
-        count: int = await self.metrics.request_count['POST'].get()
-        log.debug(f'POST #{count} {url} -> {r.status_code}')
+        log.debug(Event('post', n=self.metrics.requests_by_method.get('POST', 0), url=url, status=r.status_code))
 
-        return PostResp(r.status_code, URL(r.url))
+        return PostResp(r.status_code, URL(str(r.url)))
 
     # Note: maybe would be better as a function decorator.
-    async def _worker_ex_task(self, task: Task) -> None:
+    async def _worker_ex_task(self, task: Task, key: Optional[FlightKey] = None, probe: bool = False) -> None:
         """
         Executes the corresponding request function to the task. Wrapping the execution in retries and exception handling
         making the process "safe".
 
         This function is being tasked using the `tg_` TaskGroup object.
-        The httpx ``Limits`` in main.py is what throttles the connections.
+        The number of such workers running at once is bounded by ``self.concurrency``, which this function
+        feeds with the latency of each response and with overload signals.
 
         :param task: What type of task to execute, encapsulating task data.
+        :param key: Coalescing key of the task. The outcome is also delivered to the duplicate tasks waiting on it,
+        and served from the memo if there is a recent one.
+        :param probe: Whether the task is the circuit breaker's probe, the only one sending requests while half-open.
         :returns: An ``Outcome`` which has an ``Optional[Resp]`` inside.
         :raises: Safe: does not raise any exceptions.
         :returns: Nothing; calls the callback function of the tasks and pass in an ``Outcome``.
         """
-        retries_count: int = 0
-        # Loop to retry fetch if rate-limited.
-        for _ in range(self._MAX_RETRIES):
-            retries_count += 1
-            if retries_count > 1:
-                log.info(f'Try #{retries_count:02}{self._MAX_RETRIES:02}')
+        if isinstance(task, StopTask):
+            log.error('Worker received StopTask; undefined behavior; ignored.')
+            # Since this function is supposed to be safe, we will not either raise nor exit().
+            return None
 
-            await asyncio.sleep(random.uniform(*self._WORKER_JITTER))  # stagger start, a bit of jitter
+        if key is not None and self._memo is not None and (hit := self._memo.get(key)) is not None:
+            self.metrics.duplicates_suppressed += 1
+            progress, resp = hit
+            self._share_body(resp)
+        else:
             try:
-                # Fetch the website.
-                match task:
-                    case GetTask(item_id=item_id, url=url, headers=headers, callback=cb):
-                        resp: Resp = await self._do_get(url, headers)
-                    case PostTask(item_id=item_id, url=url, headers=headers, data=data, callback=cb):
-                        resp: Resp = await self._do_post(url, headers, data)
-                    case StopTask():
-                        log.error('Worker received StopTask; undefined behavior; ignored.')
-                        # Since this function is supposed to be safe, we will not either raise nor exit().
-                        return None
-
-                # Send the Outcome to the parser via callback.
-                if cb is not None:
-                    cb(Outcome(item_id, url, resp))
-            except httpx.ConnectError as e:
-                log.warning(f'Failed to connect to server: {e}')
-            except httpx.HTTPStatusError as e:
-                match e.response.status_code:
-                    case 429 | 502 | 503 | 504:
-                        ra: str = str(e.response.headers.get("Retry-After"))
-                        delay = float(ra) if ra and ra.isdigit() else 5.0
-                        log.warning(f'HTTP {e.response.status_code} - Retrying; sleeping for {delay}s: {e}')
-                        await asyncio.sleep(delay)
-                        continue
-                    case _:
-                        log.warning(f'HTTP {e.response.status_code}: {e}')
-            except httpx.RequestError as e:
-                log.warning(f'Request error for {task.url}: {e}')
-            except asyncio.CancelledError:
-                # Rethrow the TaskGroup cancellation.
-                raise
-            except Exception as e:
-                log.warning(f'Exception in worker for {task.url}: {e}')
+                progress, resp = await self._run_task(task, probe)
+            except _Deferred:
+                self._defer(task, key)
                 return None
+            if key is not None and self._memo is not None and progress is not Progress.FAILED:
+                self._memo.put(key, (progress, resp), len(resp.content) if isinstance(resp, GetResp) else 0)
+
+        await self._complete(task, progress, resp)
+        # Iterating the live list: duplicates coming in while callbacks run are served too.
+        for follower in self._in_flight.get(key, ()) if key is not None else ():
+            self._share_body(resp)
+            await self._complete(follower, progress, resp)
+
+    def _defer(self, task: GetTask | PostTask, key: Optional[FlightKey]) -> None:
+        """Puts a task back in the queue along with the duplicates waiting on it, to run once the breaker closes."""
+        followers: list[GetTask | PostTask] = self._in_flight.get(key, []) if key is not None else []
+        for t in (task, *followers):
+            self._task_queue.put_nowait(t)
+        self.metrics.tasks_deferred += 1 + len(followers)
+        log.debug(Event('deferred', url=task.url, followers=len(followers)))
+
+    def _on_server_failure(self, probe: bool = False) -> None:
+        """
+        Feeds a server-side failure to the circuit breaker. Raises ``_Deferred`` if the breaker is open.
+        :param probe: Whether the failed attempt is the breaker's probe.
+        """
+        if self.breaker.on_failure(probe):
+            self.metrics.breaker_trips += 1
+        if self.breaker.is_open:
+            raise _Deferred()
+
+    async def _complete(self, task: GetTask | PostTask, progress: Progress, resp: Optional[Resp]) -> None:
+        """Records how a task ended in the checkpoint, and delivers its outcome unless the item page is missing."""
+        if (self._checkpoint is not None and isinstance(task, GetTask)
+                and (progress is not Progress.DONE or task.checkpoint_done)):
+            self._checkpoint.record(task.item_id, progress)
+        # A POST answered 404 is still delivered: its callback may hold on to the item, see fetch_items().
+        if progress is not Progress.MISSING or isinstance(task, PostTask):
+            await self._deliver(task, Outcome(task.item_id, task.url, resp))
+
+    def _share_body(self, resp: Optional[Resp]) -> None:
+        """
+        Charges the byte budget for one more delivery of a GET response's body, which each delivery releases.
+        """
+        if self._byte_budget is not None and isinstance(resp, GetResp) and resp.content:
+            self._byte_budget.charge(len(resp.content))
 
-            return None
+    async def _deliver(self, task: GetTask | PostTask, outcome: Outcome) -> None:
+        """
+        Hands an outcome to the task's callback, then to the results channel.
+        A failing callback is logged; it never makes the request be retried.
+        """
+        queued: bool = False
+        try:
+            if (cb := task.callback) is not None:
+                try:
+                    with span('callback'):
+                        if inspect.isawaitable(r := cb(outcome)):
+                            await r
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.warning(f'Exception in callback for {task.url}: {e}')
+            if self._results is not None:
+                with span('results'):
+                    await self._results.put(outcome)
+                queued = True
+        finally:
+            if not queued:
+                self._release_body(outcome.res)
 
-        if cb := task.callback is not None:
-            cb(Outcome(task.item_id, task.url, None))
-        return None
+    async def _run_task(self, task: GetTask | PostTask, probe: bool = False) -> tuple[Progress, Optional[Resp]]:
+        """
+        Body of ``_worker_ex_task()``: sends the request, retrying per the task's retry and timeout policies.
+        Returns how the task ended, for checkpointing, and the response if it succeeded.
+        :param probe: Whether the task is the circuit breaker's probe, which may send requests while half-open.
+        """
+        retry: RetryPolicy = task.retry if task.retry is not None else self.retry_policy
+        timeouts: TimeoutPolicy = task.timeout if task.timeout is not None else self.timeout_policy
+        loop = asyncio.get_running_loop()
+        deadline: float = loop.time() + timeouts.deadline if timeouts.deadline is not None else math.inf
+        # Previous backoff wait, for decorrelated jitter.
+        delay: float = 0.0
+
+        for attempt in range(1, retry.max_attempts + 1):
+            if attempt > 1:
+                self.metrics.retries_total += 1
+                log.info(Event('retry', attempt=attempt, max_attempts=retry.max_attempts, url=task.url))
+
+            if self._worker_jitter[1] > 0:
+                with span('jitter'):
+                    await asyncio.sleep(random.uniform(*self._worker_jitter))  # stagger start, a bit of jitter
+            with self._lease_route() as route:
+                with span('rate_limit'):
+                    await self.rate_limiter.acquire()
+                    if route is not None:
+                        await route.rate_limiter.acquire()
+                if self.breaker.is_open and not probe:
+                    # The server went down while this task waited, e.g. in its backoff sleep; it runs again after
+                    # recovery. Half-open, only the probe is sent.
+                    raise _Deferred()
+                if (remaining := deadline - loop.time()) <= 0:
+                    break
+                self._hedge_budget.on_attempt()
+                client: AsyncClient = route.client if route is not None else self._client
+                try:
+                    # Fetch the website.
+                    start: float = loop.time()
+                    with span('attempt', attempt=attempt) as attempt_span:
+                        if route is not None:
+                            attempt_span.set(route=route.name)
+                            self.metrics.inc_route_attempt(route.name)
+                        async with asyncio.timeout(timeouts.attempt_budget(remaining)):
+                            resp: Resp = await self._attempt(task, timeouts, client)
+                    self.concurrency.on_success(loop.time() - start, 'GET' if isinstance(task, GetTask) else 'POST')
+                    self.breaker.on_success(probe)
+                    if route is not None:
+                        route.on_success()
+                    if isinstance(task, GetTask):
+                        self._on_live(task.item_id)
+                    return Progress.DONE, resp
+                except httpx.HTTPStatusError as e:
+                    status: int = e.response.status_code
+                    if status < 500:
+                        self.breaker.on_success(probe)
+                    if route is not None and status != 429:
+                        route.on_success()
+                    if status == 404:
+                        log.warning(Event('missing', url=task.url, status=status))
+                        if isinstance(task, GetTask):
+                            self.missing_ids.add(task.item_id)
+                        return Progress.MISSING, None
+                    if status not in retry.retry_statuses:
+                        if status >= 500 and self.breaker.on_failure(probe):
+                            self.metrics.breaker_trips += 1
+                        log.warning(f'HTTP {status}: {e}')
+                        return Progress.FAILED, None
+                    delay = retry.backoff(delay)
+                    if status >= 500:
+                        self._on_server_failure(probe)
+                    if status in OVERLOAD_STATUSES:
+                        retry_after: Optional[float] = parse_retry_after(e.response.headers.get('Retry-After'))
+                        pause: float = delay if retry_after is None else retry_after
+                        if route is not None and status == 429:
+                            # Rate limited per source: only this route backs off, the retry goes out another one.
+                            route.on_throttled(pause)
+                            self.metrics.inc_route_throttle(route.name)
+                            log.warning(Event('throttled', url=task.url, route=route.name, pause=round(pause, 2)))
+                            continue
+                        self.concurrency.on_overload()
+                        # Pause the shared bucket: the next attempt of every worker waits it out.
+                        self.rate_limiter.pause(pause)
+                        log.warning(Event('overload', url=task.url, status=status, pause=round(pause, 2)))
+                        continue
+                    log.warning(Event('retry_status', url=task.url, status=status, delay=round(delay, 2)))
+                except (httpx.TransportError, TimeoutError) as e:
+                    reason: str = str(e) or type(e).__name__
+                    if route is not None:
+                        route.on_failure()
+                    if not retry.is_retryable(e, idempotent=isinstance(task, GetTask)):
+                        log.warning(f'Request error for {task.url}: {reason}')
+                        return Progress.FAILED, None
+                    # Only retryable errors defer the task: it is sent again after recovery. With egress routes, the
+                    # route is to blame as long as others work.
+                    if route is None or not self.egress.healthy():
+                        self._on_server_failure(probe)
+                    delay = retry.backoff(delay)
+                    log.warning(Event('retry_error', url=task.url, error=reason, delay=round(delay, 2)))
+                except asyncio.CancelledError:
+                    # Rethrow the TaskGroup cancellation.
+                    raise
+                except Exception as e:
+                    log.warning(f'Exception in worker for {task.url}: {e}')
+                    return Progress.FAILED, None
+
+            # Only this task backs off.
+            if loop.time() + delay >= deadline:
+                break
+            with span('backoff'):
+                await asyncio.sleep(delay)
+        else:
+            log.warning(f'Giving up on {task.url} after {retry.max_attempts} attempts')
+            return Progress.FAILED, None
+
+        log.warning(f'Giving up on {task.url}: deadline of {timeouts.deadline}s exceeded')
+        return Progress.FAILED, None
+
+    @contextlib.contextmanager
+    def _lease_route(self) -> Iterator[Optional[EgressRoute]]:
+        """Picks the egress route of an attempt, counted in its load until the context exits; None without a pool."""
+        if self.egress is None:
+            yield None
+            return
+        route: EgressRoute = self.egress.acquire()
+        try:
+            yield route
+        finally:
+            self.egress.release(route)
+
+    async def _attempt(self, task: GetTask | PostTask, timeouts: TimeoutPolicy, client: AsyncClient) -> Resp:
+        """Sends the request of one attempt through ``client``, hedged if the timeout policy says so."""
+        match task:
+            case PostTask(url=url, headers=headers, data=data):
+                return await self._do_post(url, headers, data, client)
+            case GetTask(url=url, headers=headers, max_bytes=max_bytes, consumer=consumer):
+                send = functools.partial(self._do_get, url, headers, max_bytes, consumer, client)
+                # A chunk consumer cannot be fed by two bodies at once.
+                if timeouts.hedge_after is None or consumer is not None:
+                    return await send()
+                return await self._hedged(send, timeouts.hedge_after)
+
+    async def _hedged(self, send: Callable[[], Awaitable[GetResp]], hedge_after: float) -> GetResp:
+        """
+        Runs ``send()``. If it has not answered within ``hedge_after`` seconds and the hedge budget allows, a duplicate
+        races it: the first response wins and the other request is cancelled. Fails once every request failed.
+        """
+        attempts: list[asyncio.Task] = [asyncio.ensure_future(send())]
+        winner: Optional[asyncio.Task] = None
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+            if not done and self._hedge_budget.spend():
+                self.metrics.hedges_sent += 1
+                attempts.append(asyncio.ensure_future(self._send_hedge(send)))
+
+            pending: set[asyncio.Task] = set(attempts)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        winner = t
+                        if t is not attempts[0]:
+                            self.metrics.hedges_won += 1
+                        return t.result()
+                    error = error or t.exception()
+            raise error
+        finally:
+            for t in attempts:
+                t.cancel()
+            for t, r in zip(attempts, await asyncio.gather(*attempts, return_exceptions=True)):
+                # A losing request may have completed too; its body is not delivered.
+                if t is not winner and isinstance(r, GetResp):
+                    self._release_body(r)
+
+    async def _send_hedge(self, send: Callable[[], Awaitable[GetResp]]) -> GetResp:
+        """Sends a hedged duplicate request, paced like any other."""
+        await self.rate_limiter.acquire()
+        return await send()
 
     def _make_url_item(self, item_id: int) -> URL:
         """Returns the URL corresponding to an ID."""
         # E.g., https://doujinstyle.com/?p=page&type=1&id=198
-        return self._base_url.with_query(p="page", type="1", id=item_id)
+        # Appending to the prebuilt, already encoded prefix skips building and encoding the query each time.
+        return URL(self._item_url_prefix + str(item_id), encoded=True)
 
-    def _generate_batch_urls(self, ids: Iterable[int], size: int) -> Generator[list[URL], None, None]:
+    def _generate_id_blocks(self, ids: Iterable[int]) -> Generator[range | array, None, None]:
         """
-        Generates batches of the URLs corresponding to an ID range.
-        :param ids: An arbitrary number of IDs.
-        :param size: The number of URLs in each yielded batch.
-        :returns: A generator that generates lists of URLs.
+        Splits IDs into blocks of ``_ID_BLOCK_SIZE`` IDs at most. A ``range`` is sliced, which costs nothing per ID;
+        other iterables are packed into arrays of 64-bit integers.
         """
-        it = iter(self._make_url_item(item_id) for item_id in ids)
-        while batch := list(islice(it, size)):
-            yield batch
-
-    @staticmethod
-    def _make_get_task(item_id: int, url: URL, cb: ReqCb) -> GetTask:
-        """Creates an HTTP GET task from a URL."""
+        size: int = self._ID_BLOCK_SIZE
+        if isinstance(ids, range):
+            for i in range(0, len(ids), size):
+                yield ids[i:i + size]
+            return
+        it = iter(ids)
+        while block := array('q', islice(it, size)):
+            yield block
+
+    def _make_get_task(self, item_id: int, cb: ReqCb) -> GetTask:
+        """Creates the HTTP GET task of an item."""
         return GetTask(
             item_id,
-            url,
+            self._make_url_item(item_id),
             callback=cb
         )
 
-    async def fetch_range(self, ids_range: Iterable[int], callback: ReqCb) -> None:
+    async def _load_checkpoint(self) -> tuple[IdBitmap, IdBitmap]:
+        """Returns the complete and failed IDs from the checkpoint store, read once in a thread."""
+        if self._checkpoint_state is None:
+            self._checkpoint_state = await asyncio.to_thread(self._checkpoint.load)
+            complete, failed = self._checkpoint_state
+            log.info(f'Checkpoint: {len(complete)} items complete, {len(failed)} failed')
+        return self._checkpoint_state
+
+    async def fetch_range(self, ids_range: Iterable[int], callback: ReqCb, failed_only: bool = False) -> None:
         """
         Fetches the HTTP response byte data returned by each request. Calls the callable with it.
         :param ids_range: The range of IDs the fetcher will try to fetch. First ID is zero.
         :param callback: Called with the HTTP responses passed in.
-        Read the README.md to get the highest ID.
+        :param failed_only: With a checkpoint store, only fetch the IDs that failed in previous runs.
+        Without, items already complete in previous runs are skipped.
+        IDs known to be missing are always skipped. Use ``discover_max_id()`` to get the highest ID.
         """
-        for item_id in ids_range:
-            await self.enqueue(self._make_get_task(item_id, self._make_url_item(item_id), callback))
-
-        # Optional pause between batches to be gentler on server.
-        # await asyncio.sleep(0.5)
+        keep: Callable[[int], bool] = await self._id_filter(failed_only)
+        make_task: Callable[[int], GetTask] = functools.partial(self._make_get_task, cb=callback)
+        # The queue holds whole blocks and only makes each GET task when a worker takes it, so scheduling
+        # millions of IDs takes constant memory.
+        for block in self._generate_id_blocks(ids_range):
+            await self.enqueue(RangeTask(block, make_task, keep))
 
     async def fetch_single(self, item_id: int, callback: ReqCb) -> None:
         """Same as fetch_range() but with a single ID."""
         await self.fetch_range((item_id,), callback)
+
+    async def _id_filter(self, failed_only: bool) -> Callable[[int], bool]:
+        """
+        Returns the predicate keeping the IDs ``fetch_range()`` fetches: not known missing, and not complete or
+        failed per checkpoint. It is evaluated when a worker takes the ID, so IDs found missing meanwhile are skipped.
+        """
+        missing: IdBitmap = self.missing_ids
+        if self._checkpoint is None:
+            if failed_only:
+                raise ValueError('failed_only requires a checkpoint store.')
+            return lambda item_id: item_id not in missing
+        complete, failed = await self._load_checkpoint()
+        if failed_only:
+            return lambda item_id: item_id in failed and item_id not in missing
+        return lambda item_id: item_id not in missing and item_id not in complete
+
+    async def fetch_items(self, ids_range: Iterable[int], callback: ItemCb, failed_only: bool = False) -> None:
+        """
+        Runs the whole pipeline of each item: GETs its page, then if the page has the download form, POSTs it.
+        The POST jumps ahead of the queued GETs, so items complete steadily rather than all pages first.
+        :param ids_range: IDs of the items, filtered like ``fetch_range()`` does.
+        :param callback: Called with one ``ItemRecord`` per item, once its pipeline ended. Items the server answers
+        404 for get none.
+        :param failed_only: As in ``fetch_range()``.
+        """
+        loop = asyncio.get_running_loop()
+
+        async def emit(started: float, record: ItemRecord) -> None:
+            # Only now is the item complete: a crash before the download POST ran must fetch it again.
+            if self._checkpoint is not None:
+                ok: bool = record.page is not None and (not record.download_requested or record.download is not None)
+                self._checkpoint.record(record.item_id, Progress.DONE if ok else Progress.FAILED)
+            latency: float = loop.time() - started
+            self.metrics.observe_item_latency(latency)
+            record = replace(record, latency=latency)
+            if inspect.isawaitable(r := callback(record)):
+                await r
+
+        async def on_download(started: float, page: GetResp, outcome: Outcome) -> None:
+            try:
+                await emit(started, ItemRecord(outcome.item_id, page, True, outcome.res))
+            finally:
+                if self._byte_budget is not None:
+                    self._byte_budget.unretain(len(page.content))
+
+        async def on_page(started: float, outcome: Outcome) -> None:
+            page: Optional[GetResp] = outcome.res
+            if page is None or (form := self._download_form(outcome.item_id, page)) is None:
+                await emit(started, ItemRecord(outcome.item_id, page))
+                return
+            # The page is kept until its POST ends, past its delivery: it stays counted in the byte budget.
+            if self._byte_budget is not None:
+                self._byte_budget.retain(len(page.content))
+            # Bypasses the queue capacity: this worker holds a slot, it must not wait for room.
+            self._task_queue.put_nowait(PostTask(
+                outcome.item_id, outcome.req_url, form, callback=functools.partial(on_download, started, page)))
+
+        def make_task(item_id: int) -> GetTask:
+            # The block was enqueued as a whole; the item starts once a worker takes its page task. Each task
+            # carries its own start time, so the same ID taken twice makes two records.
+            return GetTask(item_id, self._make_url_item(item_id), callback=functools.partial(on_page, loop.time()),
+                           checkpoint_done=False)
+
+        keep: Callable[[int], bool] = await self._id_filter(failed_only)
+        for block in self._generate_id_blocks(ids_range):
+            await self.enqueue(RangeTask(block, make_task, keep))
+
+    async def recrawl(self, store: ChangeStore, budget: int, callback: ReqCb, max_id: Optional[int] = None,
+                      fingerprint: Callable[[bytes], bytes] = content_digest) -> RecrawlPlan:
+        """
+        Fetches at most ``budget`` item pages, picked by ``store``: IDs past the highest one it recorded first, then
+        the known items most likely to have changed since they were last fetched. The fingerprint of each page
+        fetched is recorded back, which refines the change rate of its item for the next runs.
+        Checkpointed items are fetched again; IDs known to be missing are skipped.
+        :param store: Open change store.
+        :param budget: Item pages to fetch at most.
+        :param callback: Called with the outcome of each page, as in ``fetch_range()``.
+        :param max_id: Highest item ID on the site; found with ``discover_max_id()`` if None.
+        :param fingerprint: Returns what identifies the content of a page; pages changed iff it changed. The default
+        hashes the whole body, pass e.g. a hash of the parsed fields to ignore markup that varies on every request.
+        :returns: The plan of the run.
+        """
+        if max_id is None:
+            max_id = await self.discover_max_id(max(await asyncio.to_thread(store.max_id), 0))
+        missing: IdBitmap = self.missing_ids
+        plan: RecrawlPlan = await asyncio.to_thread(store.plan, budget, max_id, missing)
+
+        async def on_page(outcome: Outcome) -> None:
+            if isinstance(page := outcome.res, GetResp) and not page.truncated:
+                store.record(outcome.item_id, fingerprint(page.content))
+            if inspect.isawaitable(r := callback(outcome)):
+                await r
+
+        make_task: Callable[[int], GetTask] = functools.partial(self._make_get_task, cb=on_page)
+        keep: Callable[[int], bool] = lambda item_id: item_id not in missing
+        # The GET lane is first in, first out: the queue keeps the plan's order.
+        for ids in (plan.new_ids, plan.known_ids):
+            for block in self._generate_id_blocks(ids):
+                await self.enqueue(RangeTask(block, make_task, keep))
+        return plan
+
+    @staticmethod
+    def _download_form(item_id: int, page: GetResp) -> Optional[dict[str, str]]:
+        """Returns the download form data to POST for an item page, or None if the page has no download form."""
+        if b'download_link' not in page.content:
+            return None
+        return {
+            'type': '1',
+            'id': str(item_id),
+            'source': '',
+            'download_link': ''
+        }
+
+    async def _probe(self, item_id: int) -> bool:
+        """
+        Returns True if the item exists, False if the server answers 404. Only the status matters: the body is
+        dropped after its first chunk. Backs off and retries like the workers, per the fetcher's retry policy, on 429
+        and the like, on the other retried statuses (e.g. a transient 500), and on transport errors.
+        :raises RuntimeError: If every attempt failed.
+        """
+        url: URL = self._make_url_item(item_id)
+        retry: RetryPolicy = self.retry_policy
+        delay: float = 0.0
+        for _ in range(retry.max_attempts):
+            await self.rate_limiter.acquire()
+            try:
+                await self._do_get(url, None, consumer=lambda chunk: True)
+                self._on_live(item_id)
+                return True
+            except httpx.HTTPStatusError as e:
+                match e.response.status_code:
+                    case 404:
+                        self.missing_ids.add(item_id)
+                        return False
+                    case status if status in OVERLOAD_STATUSES:
+                        delay = retry.backoff(delay)
+                        retry_after: Optional[float] = parse_retry_after(e.response.headers.get('Retry-After'))
+                        self.rate_limiter.pause(delay if retry_after is None else retry_after)
+                    case status if status in retry.retry_statuses:
+                        log.warning(f'Probe of item {item_id} failed: HTTP {status}')
+                        delay = retry.backoff(delay)
+                        await asyncio.sleep(delay)
+                    case _:
+                        raise
+            except httpx.TransportError as e:
+                if not retry.is_retryable(e, idempotent=True):
+                    raise
+                log.warning(f'Probe of item {item_id} failed: {e}')
+                delay = retry.backoff(delay)
+                await asyncio.sleep(delay)
+        raise RuntimeError(f'Giving up probing item {item_id}.')
+
+    def _on_live(self, item_id: int) -> None:
+        """Records that an item exists, e.g. one created since it was found missing."""
+        self._max_live_id = max(self._max_live_id, item_id)
+        self.missing_ids.discard(item_id)
+
+    async def _probe_window(self, item_id: int) -> Optional[int]:
+        """
+        Returns the first existing ID in ``[item_id, item_id + _DISCOVERY_WINDOW[``, None if there is none.
+        Known missing IDs are skipped below the highest ID seen to exist only: past it, new items may have come.
+        """
+        for probe_id in range(item_id, item_id + self._DISCOVERY_WINDOW):
+            if (probe_id > self._max_live_id or probe_id not in self.missing_ids) and await self._probe(probe_id):
+                return probe_id
+        return None
+
+    async def discover_max_id(self, start: int = 0) -> int:
+        """
+        Finds the highest existing item ID with a few probe requests: doubles the step from ``start`` until a
+        probe lands past the last item (galloping), then binary searches the boundary.
+        Each probe checks ``_DISCOVERY_WINDOW`` consecutive IDs, so isolated deleted items are skipped over.
+        :param start: An ID known, or expected, to exist.
+        :returns: The highest ID found, -1 if not even ``start`` exists.
+        """
+        requests_before: int = self.metrics.requests_by_method.get('GET', 0)
+        if (best := await self._probe_window(start)) is None:
+            return -1
+
+        # Galloping: lo exists, double the step until the window at lo + step is empty.
+        lo: int = best
+        step: int = 1
+        while (found := await self._probe_window(lo + step)) is not None:
+            lo = best = found
+            step *= 2
+        hi: int = lo + step
+
+        # Binary search: lo exists, the window at hi is empty.
+        while hi - lo > 1:
+            mid: int = (lo + hi) // 2
+            if (found := await self._probe_window(mid)) is not None:
+                lo = best = max(best, found)
+            else:
+                hi = mid
+
+        log.info(f'Highest item ID: {best} '
+                 f'({self.metrics.requests_by_method.get("GET", 0) - requests_before} probe requests)')
+        return best
@@ -0,0 +1,147 @@
+# File: headers.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import marshal
+import os
+import random
+from pathlib import Path
+from typing import Mapping, Optional, Sequence
+
+from scraper.logger import log
+
+# Request headers as httpx takes them, without building a dict per request.
+type HeaderPairs = tuple[tuple[str, str], ...]
+
+DEFAULT_USER_AGENT: str = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/138.0.0.0 Safari/537.36'
+)
+
+# Parsed user agent files by path, along with the (mtime, size) they were parsed at.
+_parsed: dict[Path, tuple[tuple[int, int], tuple[tuple[str, str], ...]]] = {}
+
+# Format of the pre-parsed sidecar files; bumped whenever their layout or the parsing rules change.
+_SIDECAR_VERSION: int = 1
+
+
+def _sidecar_path(filename: Path) -> Path:
+    """Returns the pre-parsed sidecar of a user agents file, kept next to it."""
+    return filename.with_name(f'.{filename.name}.parsed')
+
+
+def _read_sidecar(filename: Path, stamp: tuple[int, int]) -> Optional[tuple[tuple[str, str], ...]]:
+    """Returns the pairs stored in the sidecar of ``filename`` if it was written for ``stamp``, else None."""
+    try:
+        data = marshal.loads(_sidecar_path(filename).read_bytes())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if type(data) is tuple and len(data) == 3 and data[0] == _SIDECAR_VERSION and data[1] == stamp:
+        return data[2]
+    return None
+
+
+def _write_sidecar(filename: Path, stamp: tuple[int, int], parsed: tuple[tuple[str, str], ...]) -> None:
+    """Atomically writes the sidecar of ``filename``; a read-only directory only costs the next process a parse."""
+    path: Path = _sidecar_path(filename)
+    tmp: Path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        tmp.write_bytes(marshal.dumps((_SIDECAR_VERSION, stamp, parsed)))
+        os.replace(tmp, path)
+    except OSError as e:
+        log.debug(f'Could not write the user agents sidecar {path}: {e}')
+        tmp.unlink(missing_ok=True)
+
+
+def _parse_user_agents(filename: Path) -> tuple[tuple[str, str], ...]:
+    agents: dict[str, str] = {}
+    with filename.open('r', encoding='utf-8') as f:
+        for line in f:
+            category, sep, agent = line.partition('|')
+            if not sep:
+                category, agent = '', category
+            if agent := agent.strip():
+                agents.setdefault(agent, category.strip())
+    return tuple((category, agent) for agent, category in agents.items()) or (('', DEFAULT_USER_AGENT),)
+
+
+def load_user_agents(filename: Path) -> tuple[tuple[str, str], ...]:
+    """
+    Returns the deduplicated ``(category, user agent)`` pairs of a user agents file, in file order.
+    Each line is ``category|user agent``, or a bare user agent with an empty category.
+    A file is parsed once: the pairs are kept in memory for the process and in a pre-parsed sidecar next to the
+    file (``.<name>.parsed``) for the next processes, such as CLI runs and shard workers. Both are keyed by the
+    file's mtime and size, so editing the file parses it again.
+    Returns the default user agent if the file is empty or does not exist.
+    """
+    filename = Path(filename)
+    try:
+        st: os.stat_result = filename.stat()
+    except FileNotFoundError:
+        log.warning(f'User agents file: {filename} does not exist; using default.')
+        return (('', DEFAULT_USER_AGENT),)
+
+    stamp: tuple[int, int] = (st.st_mtime_ns, st.st_size)
+    if (hit := _parsed.get(filename)) is not None and hit[0] == stamp:
+        return hit[1]
+
+    parsed: Optional[tuple[tuple[str, str], ...]] = _read_sidecar(filename, stamp)
+    if parsed is None:
+        parsed = _parse_user_agents(filename)
+        _write_sidecar(filename, stamp, parsed)
+    _parsed[filename] = (stamp, parsed)
+    return parsed
+
+
+class HeaderPool:
+    """
+    Prebuilt, immutable request headers: one set per user agent, handed out in a precomputed rotation.
+
+    The rotation is drawn once with the category weights, so picking the headers of a request is an index bump
+    rather than a weighted random choice.
+    """
+
+    # Length of the precomputed rotation.
+    _ROTATION_SIZE: int = 4096
+
+    def __init__(self, agents: Sequence[tuple[str, str]], weights: Optional[Mapping[str, float]] = None,
+                 extra: Optional[Mapping[str, str]] = None, seed: Optional[int] = None):
+        """
+        :param agents: ``(category, user agent)`` pairs, e.g. from ``load_user_agents()``.
+        :param weights: Relative weight of each category, e.g. ``{'windows': 3, 'mac': 1}``; categories not listed
+        weigh 1, and 0 excludes a category. None picks every user agent evenly.
+        :param extra: Headers sent along with every request.
+        :param seed: Seed of the rotation.
+        """
+        if not agents:
+            raise ValueError('At least one user agent is needed.')
+        common: HeaderPairs = tuple((extra or {}).items())
+        self._headers: tuple[HeaderPairs, ...] = tuple((('User-Agent', agent), *common) for _, agent in agents)
+
+        w: Optional[list[float]] = None
+        if weights is not None:
+            w = [weights.get(category, 1.0) for category, _ in agents]
+            if not any(w):
+                raise ValueError('The weights exclude every user agent.')
+        self._rotation: tuple[HeaderPairs, ...] = tuple(
+            random.Random(seed).choices(self._headers, weights=w, k=self._ROTATION_SIZE))
+        self._pos: int = 0
+
+    @classmethod
+    def from_file(cls, filename: Path, weights: Optional[Mapping[str, float]] = None,
+                  extra: Optional[Mapping[str, str]] = None) -> 'HeaderPool':
+        return cls(load_user_agents(filename), weights, extra)
+
+    def __len__(self) -> int:
+        """Returns the number of distinct header sets."""
+        return len(self._headers)
+
+    def next(self) -> HeaderPairs:
+        """Returns the next headers of the rotation."""
+        headers: HeaderPairs = self._rotation[self._pos]
+        self._pos = (self._pos + 1) % self._ROTATION_SIZE
+        return headers
+
+    def with_referer(self, referer: str) -> HeaderPairs:
+        """Returns the next headers of the rotation, plus a ``Referer``."""
+        return *self.next(), ('Referer', referer)
@@ -0,0 +1,84 @@
+# File: idset.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+
+class IdBitmap:
+    """
+    Compact set of non-negative item IDs, one bit per ID.
+    Item IDs are dense integers, so three million of them fit in under 400 KB.
+    """
+
+    def __init__(self, ids: Iterable[int] = ()):
+        self._bits: bytearray = bytearray()
+        self.update(ids)
+
+    def _grow(self, item_id: int) -> None:
+        needed: int = item_id // 8 + 1
+        if needed > len(self._bits):
+            # Over-allocate so adding increasing IDs one by one stays linear.
+            self._bits.extend(bytes(max(needed, len(self._bits) * 2) - len(self._bits)))
+
+    def add(self, item_id: int) -> None:
+        if item_id < 0:
+            raise ValueError(f'Item ID cannot be negative: {item_id}')
+        self._grow(item_id)
+        self._bits[item_id >> 3] |= 1 << (item_id & 7)
+
+    def discard(self, item_id: int) -> None:
+        if 0 <= item_id < len(self._bits) * 8:
+            self._bits[item_id >> 3] &= ~(1 << (item_id & 7)) & 0xFF
+
+    def truncate(self, end: int) -> None:
+        """Drops every ID from ``end`` on."""
+        size: int = (max(end, 0) + 7) >> 3
+        del self._bits[size:]
+        if end & 7 and len(self._bits) == size:
+            self._bits[-1] &= (1 << (end & 7)) - 1
+
+    def update(self, ids: Iterable[int]) -> None:
+        for item_id in ids:
+            self.add(item_id)
+
+    def __contains__(self, item_id: int) -> bool:
+        return 0 <= item_id < len(self._bits) * 8 and bool(self._bits[item_id >> 3] & (1 << (item_id & 7)))
+
+    def __len__(self) -> int:
+        return int.from_bytes(self._bits, 'little').bit_count()
+
+    def __iter__(self) -> Iterator[int]:
+        for byte_idx, byte in enumerate(self._bits):
+            if byte:
+                base: int = byte_idx << 3
+                for bit in range(8):
+                    if byte & (1 << bit):
+                        yield base + bit
+
+    def max(self) -> int:
+        """Returns the highest ID in the set, -1 if empty."""
+        for byte_idx in range(len(self._bits) - 1, -1, -1):
+            if byte := self._bits[byte_idx]:
+                return (byte_idx << 3) + byte.bit_length() - 1
+        return -1
+
+    def save(self, path: Path) -> None:
+        """Atomically writes the bitmap to a file."""
+        path = Path(path)
+        tmp: Path = path.with_name(f'.{path.name}.tmp')
+        tmp.write_bytes(self._bits.rstrip(b'\0'))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'IdBitmap':
+        """Reads a bitmap written by ``save()``; a missing file gives an empty bitmap."""
+        bitmap = cls()
+        try:
+            bitmap._bits = bytearray(Path(path).read_bytes())
+        except FileNotFoundError:
+            pass
+        return bitmap
@@ -3,21 +3,216 @@
 # Date: 2025-08-15
 # License: MIT
 
+"""
+The app's logger. Records are handed to a background thread through a queue, so formatting and writing them never
+runs on the event loop. The thread starts with the first record, not at import, and stops at exit. Processes forked
+from the one that configured the logger, e.g. the parser's pool workers, have no such thread: they write their
+records directly.
+
+Configured per run by environment variables, or by calling ``configure()``:
+    SCRAPER_LOG_LEVEL   level name or number (default DEBUG)
+    SCRAPER_LOG_FORMAT  'text' (default) or 'json', one object per line
+    SCRAPER_LOG_FILE    also write the log to this file
+    SCRAPER_LOG_RATE    'N/S': at most N records per call site every S seconds at WARNING and below
+                        (default 20/10); 0 disables the limit
+    SCRAPER_LOG_SAMPLE  fraction of the DEBUG records kept, in [0, 1] (default 1)
+"""
+
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+from pathlib import Path
+from typing import Any, Optional
 
+_TEXT_FORMAT: str = '[%(asctime)s] [%(name)-15s] [%(levelname)-8s] %(message)s'
+_DATE_FORMAT: str = '%Y-%m-%d %H:%M:%S'
+
+
+class Event:
+    """
+    Structured log message: an event name and key/value fields, only turned into text if the record is emitted,
+    on the logging thread. E.g. ``log.debug(Event('get', url=url, status=200))`` logs ``get url=... status=200``.
+    Field values must not be mutated afterwards.
+    """
+    __slots__ = ('name', 'fields')
+
+    def __init__(self, name: str, **fields: Any):
+        self.name: str = name
+        self.fields: dict[str, Any] = fields
+
+    def __str__(self) -> str:
+        return ' '.join((self.name, *(f'{k}={v}' for k, v in self.fields.items())))
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most ``burst`` records per call site every ``window`` seconds, at WARNING and below, so a storm
+    of retries logs a few lines rather than one per request. The first record let through after some were dropped
+    tells how many. DEBUG records may also be sampled.
+    """
+
+    def __init__(self, burst: int = 20, window: float = 10.0, debug_sample: float = 1.0):
+        """
+        :param burst: Records let through per call site and window; 0 for no limit.
+        :param window: Length of a window in seconds.
+        :param debug_sample: Fraction of the DEBUG records kept.
+        """
+        super().__init__()
+        self._burst: int = burst
+        self._window: float = window
+        self._debug_sample: float = debug_sample
+        # Call site -> (window start, records let through, records dropped)
+        self._sites: dict[tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and self._debug_sample < 1.0 and random.random() >= self._debug_sample:
+            return False
+        if self._burst <= 0 or record.levelno > logging.WARNING:
+            return True
+        now: float = record.created
+        site: tuple[str, int] = (record.pathname, record.lineno)
+        if (state := self._sites.get(site)) is None or now - state[0] >= self._window:
+            dropped: int = state[2] if state is not None else 0
+            self._sites[site] = [now, 1, 0]
+            if dropped:
+                record.suppressed = dropped
+            return True
+        if state[1] < self._burst:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueues records as they are: the message is merged with its arguments on the logging thread, started with the
+    first record. In a forked process, records are written directly instead.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if os.getpid() != _configured_pid:
+            # The logging thread did not survive the fork.
+            if _listener is not None:
+                _listener.handle(record)
+            return
+        if _listener is not None and not _listener_started:
+            _start_listener()
+        super().emit(record)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__(_TEXT_FORMAT, datefmt=_DATE_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text: str = super().format(record)
+        if suppressed := getattr(record, 'suppressed', 0):
+            text += f' [{suppressed} similar messages suppressed]'
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; the fields of an ``Event`` become keys of their own."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: dict[str, Any] = {'ts': round(record.created, 6), 'level': record.levelname, 'logger': record.name}
+        if isinstance(record.msg, Event) and not record.args:
+            entry['event'] = record.msg.name
+            entry.update((k, v if isinstance(v, int | float | bool | None) else str(v))
+                         for k, v in record.msg.fields.items())
+        else:
+            entry['message'] = record.getMessage()
+        if suppressed := getattr(record, 'suppressed', 0):
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# Writes the records on its own thread; replaced by each configure(), started by the first record.
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_started: bool = False
+_listener_lock: threading.Lock = threading.Lock()
+# Process that configured the logger, the only one that runs the logging thread.
+_configured_pid: int = os.getpid()
+
+
+def _start_listener() -> None:
+    global _listener_started
+    with _listener_lock:
+        if _listener is not None and not _listener_started:
+            _listener.start()
+            _listener_started = True
+
+
+def _stop_listener() -> None:
+    """Writes the records still queued, and stops the logging thread."""
+    global _listener, _listener_started
+    if _listener is not None and os.getpid() == _configured_pid:
+        if _listener_started:
+            _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    _listener = None
+    _listener_started = False
+
+
+def configure(level: Optional[int | str] = None, fmt: Optional[str] = None, file: Optional[Path] = None,
+              rate: Optional[str] = None, debug_sample: Optional[float] = None) -> logging.Logger:
+    """
+    (Re)configures the app's logger. Arguments left to None are read from the environment, see the module docstring.
+    :param level: Level name or number.
+    :param fmt: 'text' or 'json'.
+    :param file: File the log is also written to.
+    :param rate: 'N/S': at most N records per call site every S seconds, at WARNING and below.
+    :param debug_sample: Fraction of the DEBUG records kept.
+    """
+    global _listener, _configured_pid
+    env = os.environ
+    level = level if level is not None else env.get('SCRAPER_LOG_LEVEL', 'DEBUG')
+    fmt = fmt if fmt is not None else env.get('SCRAPER_LOG_FORMAT', 'text')
+    file = file if file is not None else env.get('SCRAPER_LOG_FILE')
+    rate = rate if rate is not None else env.get('SCRAPER_LOG_RATE', '20/10')
+    debug_sample = debug_sample if debug_sample is not None else float(env.get('SCRAPER_LOG_SAMPLE', '1'))
+    if fmt not in ('text', 'json'):
+        raise ValueError(f'Unknown log format {fmt!r}; expected text or json.')
+    burst, _, window = str(rate).partition('/')
 
-def setup_logger() -> logging.Logger:
-    """Creates the app's logger."""
-    # Our own logger.
-    # Change this to logging.WARNING to not bother with all the debug logging.
     logger: logging.Logger = logging.getLogger('scraper')
-    logger.setLevel(logging.DEBUG)
-    handler = logging.StreamHandler()
-    handler.setFormatter(logging.Formatter(
-        "[%(asctime)s] [%(name)-15s] [%(levelname)-8s] %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    ))
-    logger.addHandler(handler)
+    logger.setLevel(int(level) if str(level).isdigit() else str(level).upper())
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    _stop_listener()
+
+    formatter: logging.Formatter = JsonFormatter() if fmt == 'json' else TextFormatter()
+    handlers: list[logging.Handler] = [logging.StreamHandler()]
+    if file:
+        handlers.append(logging.FileHandler(file, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(RateLimitFilter(int(burst), float(window or 10), debug_sample))
+    logger.addHandler(queue_handler)
+    _listener = logging.handlers.QueueListener(records, *handlers)
+    _configured_pid = os.getpid()
+    return logger
+
+
+def setup_logger() -> logging.Logger:
+    """Creates the app's logger, configured from the environment."""
+    logger: logging.Logger = configure()
+    atexit.register(_stop_listener)
     return logger
 
 
@@ -5,14 +5,14 @@
 
 import asyncio
 
-from httpx import Limits, Timeout, AsyncClient
-
+from scraper.export import NdjsonExporter
 from scraper.fetcher import Fetcher, Outcome
 from scraper.logger import log
+from scraper.parser import Parser
 
 
 def fetcher_callback(resp: Outcome) -> None:
-    log.debug(resp.res.status_code)
+    log.debug(resp.res.status_code if resp.res is not None else f'Item {resp.item_id} failed')
     # g: bytes = resp.resp_get_content
     # p: URL = resp.resp_post_url
     # # print(f'GET Resp: {g}')
@@ -21,16 +21,17 @@ def fetcher_callback(resp: Outcome) -> None:
 
 
 async def main() -> None:
-    limits: Limits = Limits(max_connections=1, max_keepalive_connections=2)
-    timeout: Timeout = Timeout(10.0)
-    # follow_redirects=True is important for the POST.
-    async with AsyncClient(limits=limits, timeout=timeout, follow_redirects=True) as client:
-        async with Fetcher(client, print_metrics=True) as fetcher:
-            await fetcher.fetch_single(0, fetcher_callback)
-            await fetcher.fetch_single(1, fetcher_callback)
-
-            # Wait for all tasks to finish.
-            await fetcher.join()
+    # The fetcher builds its HTTP client from the transport profile: polite, balanced or aggressive.
+    async with NdjsonExporter('output') as exporter, \
+            Parser(on_parsed=exporter.export_dataclass) as parser, \
+            Fetcher(transport='polite', print_metrics=True) as fetcher:
+        await fetcher.fetch_single(0, fetcher_callback)
+        await fetcher.fetch_single(1, parser.fetcher_callback)
+        # Page, then download link.
+        await fetcher.fetch_items((2,), exporter.export_item)
+
+        # Wait for all tasks to finish.
+        await fetcher.join()
 
 
 
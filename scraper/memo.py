@@ -0,0 +1,63 @@
+# File: memo.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+class ResultMemo(Generic[K, V]):
+    """
+    In-memory memo of recent results, each kept for ``ttl`` seconds. Memory is bounded by a number of entries and a
+    total of sizes given by the caller, evicting the least recently stored entries first.
+    """
+
+    def __init__(self, ttl: float, max_entries: int = 10_000, max_bytes: int = 32 << 20):
+        """
+        :param ttl: Seconds a result is served from the memo after it was stored.
+        :param max_entries: Maximum number of results kept.
+        :param max_bytes: Maximum total size of the results kept, as given to ``put()``.
+        """
+        if ttl <= 0:
+            raise ValueError('ttl must be positive.')
+        self._ttl: float = ttl
+        self._max_entries: int = max_entries
+        self._max_bytes: int = max_bytes
+        # key -> (expiry, size, value), oldest first.
+        self._entries: OrderedDict[K, tuple[float, int, V]] = OrderedDict()
+        self._bytes: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        """Returns the result stored under ``key`` if it has not expired, None otherwise."""
+        if (entry := self._entries.get(key)) is None:
+            return None
+        if entry[0] <= time.monotonic():
+            self._drop(key)
+            return None
+        return entry[2]
+
+    def put(self, key: K, value: V, size: int = 0) -> None:
+        """Stores a result; one larger than the whole memo is not stored."""
+        if key in self._entries:
+            self._drop(key)
+        if size > self._max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self._ttl, size, value)
+        self._bytes += size
+        # Entries are stored in expiry order, so the oldest are both the first to expire and the first evicted.
+        now: float = time.monotonic()
+        while self._entries and (len(self._entries) > self._max_entries or self._bytes > self._max_bytes
+                                 or next(iter(self._entries.values()))[0] <= now):
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, key: K) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,442 @@
+# File: metrics.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Optional, Sequence
+
+import httpx
+
+from scraper.logger import log
+
+# Histogram bucket upper bounds for request latencies, in seconds.
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+# Histogram bucket upper bounds for item pipelines, in seconds. Retries, backoffs and circuit breaker pauses make
+# them far longer than single requests.
+ITEM_LATENCY_BUCKETS: tuple[float, ...] = (
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0
+)
+
+# Histogram bucket upper bounds for response body sizes, in bytes.
+SIZE_BUCKETS: tuple[float, ...] = (
+    1_024, 4_096, 16_384, 32_768, 65_536, 131_072, 262_144, 524_288, 1_048_576, 4_194_304
+)
+
+# Histogram bucket upper bounds for waits that are mostly near zero, in seconds.
+WAIT_BUCKETS: tuple[float, ...] = (
+    0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0
+)
+
+# Key under which the request hook stashes the send time into ``httpx.Request.extensions``.
+_START_EXT: str = 'scraper.start'
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram.
+    Plain attributes only: everything runs on one event loop, so no locking is needed.
+    """
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds: tuple[float, ...] = tuple(sorted(bounds))
+        # One count per bound, plus the +Inf bucket. Not cumulative.
+        self.counts: list[int] = [0] * (len(self.bounds) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimates the ``q`` quantile (0 <= q <= 1) by interpolating inside the matching bucket.
+        Returns None if nothing was observed.
+        """
+        if not self.count:
+            return None
+        rank: float = q * self.count
+        seen: int = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low: float = self.bounds[i - 1] if i > 0 else 0.0
+                if i == len(self.bounds):
+                    # Nothing better to say about the +Inf bucket than its lower bound.
+                    return low
+                return low + (self.bounds[i] - low) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+    def overflows(self, q: float) -> bool:
+        """Whether the ``q`` quantile lands in the +Inf bucket, for which ``quantile()`` only returns the last bound."""
+        return self.counts[-1] > 0 and self.count - self.counts[-1] < q * self.count
+
+    def merge(self, other: 'Histogram') -> None:
+        """Adds the observations of another histogram with the same buckets."""
+        if other.bounds != self.bounds:
+            raise ValueError('Cannot merge histograms with different buckets.')
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+
+    def to_dict(self) -> dict[str, Any]:
+        return {'bounds': list(self.bounds), 'counts': list(self.counts), 'count': self.count, 'sum': self.sum}
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> 'Histogram':
+        h = cls(d['bounds'])
+        h.counts = list(d['counts'])
+        h.count = d['count']
+        h.sum = d['sum']
+        return h
+
+
+class Metrics:
+    """Metrics during the app"""
+
+    def __init__(self):
+        # Monotonic start time, for rates.
+        self._started: float = time.monotonic()
+
+        # Requests on the wire, redirect hops included.
+        self.requests_total: int = 0
+        self.requests_by_method: dict[str, int] = {}
+
+        # Responses on the wire, by status code.
+        self.responses_by_status: dict[int, int] = {}
+
+        # Redirect responses, by the method of the request that received them.
+        self.redirects_total: int = 0
+        self.redirects_by_method: dict[str, int] = {}
+
+        # Time from sending a request to receiving its response headers, by method.
+        self.latency_by_method: dict[str, Histogram] = {}
+
+        # Time a request waited for a connection of the pool, and connections opened.
+        # Only measured by transports reporting httpcore trace events, i.e. not by ``httpx.MockTransport``.
+        self.pool_wait: Histogram = Histogram(WAIT_BUCKETS)
+        self.connections_opened: int = 0
+
+        # Size of the response bodies read by the fetcher.
+        self.response_size: Histogram = Histogram(SIZE_BUCKETS)
+
+        # Time from taking an item's page task off the queue to the end of its pipeline (page GET, then download POST
+        # if any).
+        self.item_latency: Histogram = Histogram(ITEM_LATENCY_BUCKETS)
+
+        # Attempts past the first one, hedged duplicate GETs sent, and hedges that answered first.
+        self.retries_total: int = 0
+        self.hedges_sent: int = 0
+        self.hedges_won: int = 0
+
+        # Tasks served by the request of an identical task in flight, or by the outcome memo, without a request.
+        self.duplicates_suppressed: int = 0
+
+        # Times the circuit breaker opened, and tasks put back in the queue because their attempt failed while open.
+        self.breaker_trips: int = 0
+        self.tasks_deferred: int = 0
+
+        # Attempts sent through each egress route, and 429s each route received.
+        self.attempts_by_route: dict[str, int] = {}
+        self.throttles_by_route: dict[str, int] = {}
+
+        # Response cache: pages served from disk after a 304, pages downloaded, and body bytes not downloaded.
+        self.cache_hits: int = 0
+        self.cache_misses: int = 0
+        self.cache_bytes_saved: int = 0
+
+    def inc_req(self, req_type: str) -> int:
+        """Increments the counter for the given request type. Returns its new value."""
+        self.requests_total += 1
+        count: int = self.requests_by_method.get(req_type, 0) + 1
+        self.requests_by_method[req_type] = count
+        return count
+
+    def inc_route_attempt(self, route: str) -> None:
+        self.attempts_by_route[route] = self.attempts_by_route.get(route, 0) + 1
+
+    def inc_route_throttle(self, route: str) -> None:
+        self.throttles_by_route[route] = self.throttles_by_route.get(route, 0) + 1
+
+    def observe_latency(self, method: str, seconds: float) -> None:
+        if (h := self.latency_by_method.get(method)) is None:
+            h = self.latency_by_method[method] = Histogram(LATENCY_BUCKETS)
+        h.observe(seconds)
+
+    def observe_size(self, size: int) -> None:
+        """Records the size in bytes of a response body."""
+        self.response_size.observe(size)
+
+    def observe_item_latency(self, seconds: float) -> None:
+        """Records the end-to-end latency of an item pipeline."""
+        self.item_latency.observe(seconds)
+
+    def cache_hit(self, size: int) -> None:
+        """Records a page served from the response cache, ``size`` being the body size not downloaded."""
+        self.cache_hits += 1
+        self.cache_bytes_saved += size
+
+    def cache_miss(self) -> None:
+        self.cache_misses += 1
+
+    def hook_httpx_client(self, client: httpx.AsyncClient) -> None:
+        """Registers this instance's hooks on the client, next to any hooks already installed."""
+        hooks = client.event_hooks
+        hooks['request'] = [*hooks.get('request', ()), self._on_httpx_request]
+        hooks['response'] = [*hooks.get('response', ()), self._on_httpx_response]
+        client.event_hooks = hooks
+
+    async def _on_httpx_request(self, request: httpx.Request) -> None:
+        # count by current request method on the wire
+        self.inc_req(request.method)
+        start: float = time.perf_counter()
+        request.extensions[_START_EXT] = start
+        request.extensions['trace'] = self._make_trace(start, request.extensions.get('trace'))
+
+    def _make_trace(self, start: float, inner: Optional[Any]):
+        """
+        Returns an httpcore trace callback timing the pool wait of one request: the first event httpcore reports
+        happens once the pool handed the request a connection, new (``connect_tcp``) or reused (``send_request_headers``).
+        Events are passed on to ``inner``, a trace callback already set on the request.
+        """
+        waiting: bool = True
+
+        async def trace(event: str, info: dict[str, Any]) -> None:
+            nonlocal waiting
+            if waiting:
+                waiting = False
+                self.pool_wait.observe(time.perf_counter() - start)
+            if event == 'connection.connect_tcp.complete':
+                self.connections_opened += 1
+            if inner is not None:
+                await inner(event, info)
+
+        return trace
+
+    async def _on_httpx_response(self, response: httpx.Response) -> None:
+        request: httpx.Request = response.request
+        status: int = response.status_code
+        self.responses_by_status[status] = self.responses_by_status.get(status, 0) + 1
+
+        if (start := request.extensions.get(_START_EXT)) is not None:
+            self.observe_latency(request.method, time.perf_counter() - start)
+
+        # Count redirects by the *original request method* for this hop
+        if response.is_redirect:
+            self.redirects_total += 1
+            self.redirects_by_method[request.method] = self.redirects_by_method.get(request.method, 0) + 1
+
+    def to_dict(self) -> dict[str, Any]:
+        """Returns a JSON-serializable snapshot of the metrics."""
+        return {
+            'uptime_seconds': time.monotonic() - self._started,
+            'requests_total': self.requests_total,
+            'requests_by_method': dict(self.requests_by_method),
+            'responses_by_status': {str(k): v for k, v in self.responses_by_status.items()},
+            'redirects_total': self.redirects_total,
+            'redirects_by_method': dict(self.redirects_by_method),
+            'latency_by_method': {m: h.to_dict() for m, h in self.latency_by_method.items()},
+            'pool_wait': self.pool_wait.to_dict(),
+            'connections_opened': self.connections_opened,
+            'response_size': self.response_size.to_dict(),
+            'item_latency': self.item_latency.to_dict(),
+            'retries_total': self.retries_total,
+            'hedges_sent': self.hedges_sent,
+            'hedges_won': self.hedges_won,
+            'duplicates_suppressed': self.duplicates_suppressed,
+            'breaker_trips': self.breaker_trips,
+            'tasks_deferred': self.tasks_deferred,
+            'attempts_by_route': dict(self.attempts_by_route),
+            'throttles_by_route': dict(self.throttles_by_route),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_bytes_saved': self.cache_bytes_saved,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict[str, Any]) -> 'Metrics':
+        """Rebuilds metrics from a ``to_dict()`` snapshot, e.g. one sent by another process."""
+        m = cls()
+        m.requests_total = d['requests_total']
+        m.requests_by_method = dict(d['requests_by_method'])
+        m.responses_by_status = {int(k): v for k, v in d['responses_by_status'].items()}
+        m.redirects_total = d['redirects_total']
+        m.redirects_by_method = dict(d['redirects_by_method'])
+        m.latency_by_method = {k: Histogram.from_dict(h) for k, h in d['latency_by_method'].items()}
+        m.pool_wait = Histogram.from_dict(d['pool_wait'])
+        m.connections_opened = d['connections_opened']
+        m.response_size = Histogram.from_dict(d['response_size'])
+        m.item_latency = Histogram.from_dict(d['item_latency'])
+        m.retries_total = d['retries_total']
+        m.hedges_sent = d['hedges_sent']
+        m.hedges_won = d['hedges_won']
+        m.duplicates_suppressed = d['duplicates_suppressed']
+        m.breaker_trips = d['breaker_trips']
+        m.tasks_deferred = d['tasks_deferred']
+        m.attempts_by_route = dict(d['attempts_by_route'])
+        m.throttles_by_route = dict(d['throttles_by_route'])
+        m.cache_hits = d['cache_hits']
+        m.cache_misses = d['cache_misses']
+        m.cache_bytes_saved = d['cache_bytes_saved']
+        return m
+
+    def merge(self, other: 'Metrics') -> None:
+        """Adds the counters and histograms of another instance to this one. Uptime is left untouched."""
+        def add(into: dict, src: dict) -> None:
+            for k, v in src.items():
+                into[k] = into.get(k, 0) + v
+
+        self.requests_total += other.requests_total
+        add(self.requests_by_method, other.requests_by_method)
+        add(self.responses_by_status, other.responses_by_status)
+        self.redirects_total += other.redirects_total
+        add(self.redirects_by_method, other.redirects_by_method)
+        for method, h in other.latency_by_method.items():
+            if (mine := self.latency_by_method.get(method)) is None:
+                mine = self.latency_by_method[method] = Histogram(h.bounds)
+            mine.merge(h)
+        self.pool_wait.merge(other.pool_wait)
+        self.connections_opened += other.connections_opened
+        self.response_size.merge(other.response_size)
+        self.item_latency.merge(other.item_latency)
+        self.retries_total += other.retries_total
+        self.hedges_sent += other.hedges_sent
+        self.hedges_won += other.hedges_won
+        self.duplicates_suppressed += other.duplicates_suppressed
+        self.breaker_trips += other.breaker_trips
+        self.tasks_deferred += other.tasks_deferred
+        add(self.attempts_by_route, other.attempts_by_route)
+        add(self.throttles_by_route, other.throttles_by_route)
+        self.cache_hits += other.cache_hits
+        self.cache_misses += other.cache_misses
+        self.cache_bytes_saved += other.cache_bytes_saved
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+    def to_prometheus(self) -> str:
+        """Returns a snapshot of the metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+
+        def counter(name: str, help_: str, samples: list[tuple[str, float]]) -> None:
+            lines.append(f'# HELP {name} {help_}')
+            lines.append(f'# TYPE {name} counter')
+            lines.extend(f'{name}{labels} {value}' for labels, value in samples)
+
+        def histogram(name: str, help_: str, hists: list[tuple[str, Histogram]]) -> None:
+            lines.append(f'# HELP {name} {help_}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, h in hists:
+                sep: str = ',' if labels else ''
+                cumulative: int = 0
+                for bound, n in zip((*h.bounds, '+Inf'), h.counts):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+                braces: str = f'{{{labels}}}' if labels else ''
+                lines.append(f'{name}_sum{braces} {h.sum}')
+                lines.append(f'{name}_count{braces} {h.count}')
+
+        counter('scraper_requests_total', 'HTTP requests sent, by method.',
+                [(f'{{method="{m}"}}', v) for m, v in self.requests_by_method.items()])
+        counter('scraper_responses_total', 'HTTP responses received, by status code.',
+                [(f'{{code="{c}"}}', v) for c, v in self.responses_by_status.items()])
+        counter('scraper_redirects_total', 'HTTP redirect responses, by request method.',
+                [(f'{{method="{m}"}}', v) for m, v in self.redirects_by_method.items()])
+        histogram('scraper_request_duration_seconds', 'Time to response headers, by method.',
+                  [(f'method="{m}"', h) for m, h in self.latency_by_method.items()])
+        histogram('scraper_pool_wait_seconds', 'Time requests waited for a pool connection.',
+                  [('', self.pool_wait)])
+        counter('scraper_connections_opened_total', 'Connections opened by the HTTP client.',
+                [('', self.connections_opened)])
+        histogram('scraper_response_size_bytes', 'Size of response bodies.', [('', self.response_size)])
+        histogram('scraper_item_duration_seconds', 'Time from dequeuing an item to the end of its pipeline.',
+                  [('', self.item_latency)])
+        counter('scraper_retries_total', 'Task attempts past the first one.', [('', self.retries_total)])
+        counter('scraper_hedged_requests_total', 'Hedged duplicate GET requests, by whether they answered first.',
+                [('{won="true"}', self.hedges_won), ('{won="false"}', self.hedges_sent - self.hedges_won)])
+        counter('scraper_duplicates_suppressed_total', 'Tasks served by an identical request in flight or memoized.',
+                [('', self.duplicates_suppressed)])
+        counter('scraper_breaker_trips_total', 'Times the circuit breaker opened.', [('', self.breaker_trips)])
+        counter('scraper_tasks_deferred_total', 'Tasks put back in the queue while the circuit breaker was open.',
+                [('', self.tasks_deferred)])
+        counter('scraper_route_attempts_total', 'Request attempts sent, by egress route.',
+                [(f'{{route="{r}"}}', v) for r, v in self.attempts_by_route.items()])
+        counter('scraper_route_throttles_total', 'HTTP 429 responses, by egress route.',
+                [(f'{{route="{r}"}}', v) for r, v in self.throttles_by_route.items()])
+        counter('scraper_cache_requests_total', 'GET requests made with the response cache, by result.',
+                [('{result="hit"}', self.cache_hits), ('{result="miss"}', self.cache_misses)])
+        counter('scraper_cache_saved_bytes_total', 'Body bytes served from the response cache.',
+                [('', self.cache_bytes_saved)])
+        return '\n'.join(lines) + '\n'
+
+    def write_snapshot(self, path: Path) -> None:
+        """
+        Atomically writes a snapshot to ``path``: Prometheus text format if it ends with ``.prom``, JSON otherwise.
+        """
+        path = Path(path)
+        text: str = self.to_prometheus() if path.suffix == '.prom' else self.to_json()
+        tmp: Path = path.with_name(f'.{path.name}.tmp')
+        tmp.write_text(text, encoding='utf-8')
+        os.replace(tmp, path)
+
+    async def dump_periodically(self, path: Path, interval: float) -> None:
+        """Writes a snapshot to ``path`` every ``interval`` seconds, until cancelled."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.write_snapshot(path)
+            except OSError as e:
+                log.warning(f'Failed to write metrics snapshot to {path}: {e}')
+
+    def make_string(self) -> str:
+        """Creates a human string representation of the metrics."""
+        reqs: str = ''
+        for method, value in self.requests_by_method.items():
+            # indentation + metrics
+            reqs += f'    {method}: {value:>5}\n'
+
+        statuses: str = ''.join(f'    {code}: {n:>5}\n' for code, n in sorted(self.responses_by_status.items()))
+
+        latencies: str = ''
+        for method, h in self.latency_by_method.items():
+            latencies += (f'    {method}: p50 {h.quantile(0.5) * 1000:>7.1f} ms'
+                          f'  p99 {h.quantile(0.99) * 1000:>7.1f} ms\n')
+
+        items: str = ''
+        if self.item_latency.count:
+            items = (f'  Items: {self.item_latency.count}, p50 {self.item_latency.quantile(0.5) * 1000:.1f} ms'
+                     f'  p99 {self.item_latency.quantile(0.99) * 1000:.1f} ms\n')
+
+        pool: str = ''
+        if self.pool_wait.count:
+            pool = (f'  Pool wait: p50 {self.pool_wait.quantile(0.5) * 1000:.2f} ms'
+                    f'  p99 {self.pool_wait.quantile(0.99) * 1000:.2f} ms, {self.connections_opened} connections\n')
+
+        routes: str = ''
+        if self.attempts_by_route:
+            routes = '  Routes:\n'
+            for route, n in self.attempts_by_route.items():
+                routes += f'    {route}: {n:>5} attempts, {self.throttles_by_route.get(route, 0)} throttled\n'
+
+        elapsed: float = max(time.monotonic() - self._started, 1e-9)
+        return f"""Network Metrics:
+  Sent HTTP Requests: {self.requests_total} ({self.requests_total / elapsed:.2f}/s)
+{reqs}  Responses:
+{statuses}  Redirects: {self.redirects_total}
+  Latency:
+{latencies}{pool}{routes}  Response size: mean {self.response_size.sum / max(self.response_size.count, 1):.0f} B
+  Retries: {self.retries_total}, hedges: {self.hedges_sent} sent, {self.hedges_won} won
+  Duplicates suppressed: {self.duplicates_suppressed}
+  Circuit breaker: {self.breaker_trips} trips, {self.tasks_deferred} tasks deferred
+  Cache: {self.cache_hits} hits, {self.cache_misses} misses, {self.cache_bytes_saved} B saved
+{items}"""
@@ -3,24 +3,232 @@
 # Date: 2025-08-15
 # License: MIT
 import asyncio
-from asyncio import AbstractEventLoop, Semaphore
-from concurrent.futures.thread import ThreadPoolExecutor
+import inspect
+import os
+import time
+from asyncio import Semaphore
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from typing import Optional, Callable, Awaitable
 
+from scraper.fetcher import Outcome, GetResp
+from scraper.logger import log
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+
+@dataclass(frozen=True)
+class ParsedItem:
+    """
+    Represents the data extracted from an item page.
+    """
+    # ID of the item.
+    item_id: int
+
+    # Content of the <title> tag.
+    title: Optional[str] = None
+
+    # <meta> tags content, by their property or name (e.g. og:title, og:image, description).
+    meta: dict[str, str] = field(default_factory=dict)
+
+    # Named <input> fields of the page forms, e.g. the download form (type, id, source, download_link).
+    form: dict[str, str] = field(default_factory=dict)
+
+    # Targets of the page links, in document order.
+    links: list[str] = field(default_factory=list)
+
+
+class _PageParser(HTMLParser):
+    """Single pass over an item page, collecting what ``ParsedItem`` holds."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title: Optional[str] = None
+        self.meta: dict[str, str] = {}
+        self.form: dict[str, str] = {}
+        self.links: list[str] = []
+        self._in_title: bool = False
+        self._title_parts: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        match tag:
+            case 'title':
+                self._in_title = True
+            case 'meta':
+                a = dict(attrs)
+                if (key := a.get('property') or a.get('name')) and (content := a.get('content')) is not None:
+                    self.meta[key] = content
+            case 'input':
+                a = dict(attrs)
+                if name := a.get('name'):
+                    self.form[name] = a.get('value') or ''
+            case 'a':
+                if href := dict(attrs).get('href'):
+                    self.links.append(href)
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == 'title' and self._in_title:
+            self._in_title = False
+            self.title = ''.join(self._title_parts).strip()
+
+    def handle_data(self, data: str) -> None:
+        if self._in_title:
+            self._title_parts.append(data)
+
+
+def parse_page_stdlib(item_id: int, content: bytes) -> ParsedItem:
+    """Parses an item page with the pure Python ``html.parser``."""
+    p = _PageParser()
+    p.feed(content.decode('utf-8', errors='replace'))
+    p.close()
+    return ParsedItem(item_id, p.title, p.meta, p.form, p.links)
+
+
+def parse_page_lexbor(item_id: int, content: bytes) -> ParsedItem:
+    """Parses an item page with selectolax's compiled lexbor parser; same result as ``parse_page_stdlib()``."""
+    tree = LexborHTMLParser(content.decode('utf-8', errors='replace'))
+    title: Optional[str] = None
+    for node in tree.css('title'):
+        title = node.text().strip()
+    meta: dict[str, str] = {}
+    for node in tree.css('meta'):
+        a = node.attributes
+        if (key := a.get('property') or a.get('name')) and (content_attr := a.get('content')) is not None:
+            meta[key] = content_attr
+    form: dict[str, str] = {}
+    for node in tree.css('input[name]'):
+        a = node.attributes
+        if name := a.get('name'):
+            form[name] = a.get('value') or ''
+    links: list[str] = [href for node in tree.css('a[href]') if (href := node.attributes.get('href'))]
+    return ParsedItem(item_id, title, meta, form, links)
+
+
+def parse_page(item_id: int, content: bytes) -> ParsedItem:
+    """
+    Parses an item page. Runs in a worker process, so arguments and result must be picklable.
+    Uses selectolax if it is installed, several times faster, else the standard library's ``html.parser``.
+    """
+    if LexborHTMLParser is not None:
+        return parse_page_lexbor(item_id, content)
+    return parse_page_stdlib(item_id, content)
 
 
 class Parser:
-    def __init__(self, max_threads: int = 8, parse_concurrency: int = 4):
-        self._max_threads: int = max_threads if max_threads > 0 else 4
-        self._parse_concurrency: int = parse_concurrency if parse_concurrency > 0 else 2
+    """
+    Parses the pages the ``Fetcher`` fetches, in a process pool so parsing is not bound by the GIL.
+
+    Pass ``fetcher_callback`` as the fetcher's callback. It waits while ``max_pending`` pages are already
+    being parsed, which holds back the fetcher's worker, so the fetcher slows down to the parsing speed
+    instead of buffering page bodies without bound.
+
+    Usage:
+        async with Parser(on_parsed=print) as parser:
+            async with Fetcher(client) as fetcher:
+                await fetcher.fetch_range(range(100), parser.fetcher_callback)
+    """
+
+    def __init__(self, on_parsed: Optional[Callable[[ParsedItem], None | Awaitable[None]]] = None,
+                 max_workers: Optional[int] = None, max_pending: int = 0):
+        """
+        :param on_parsed: Called on the event loop with each parsed item. If it returns an awaitable, the page keeps
+        counting as pending until it completes, so a slow consumer (e.g. an exporter) holds the pipeline back too.
+        :param max_workers: Number of parsing processes; defaults to the number of CPUs.
+        :param max_pending: Maximum number of pages submitted and not parsed yet; defaults to twice the
+        number of processes, enough to keep them all busy.
+        """
+        self._on_parsed: Optional[Callable[[ParsedItem], None | Awaitable[None]]] = on_parsed
+        self._max_workers: int = max_workers if max_workers and max_workers > 0 else (os.cpu_count() or 2)
+        self._max_pending: int = max_pending if max_pending > 0 else 2 * self._max_workers
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._parse_sem: Semaphore = asyncio.Semaphore(self._max_pending)
+        self._parse_tasks: set[asyncio.Future] = set()
+
+        # Statistics.
+        self._started: float = time.monotonic()
+        self.parsed_count: int = 0
+        self.failed_count: int = 0
+        self.peak_pending: int = 0
+
+    async def __aenter__(self) -> 'Parser':
+        self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+        self._started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.drain()
+        self._executor.shutdown()
+        self._executor = None
+        log.info(self.make_string())
+
+    @property
+    def pending(self) -> int:
+        """Number of pages submitted and not parsed yet; the queue depth."""
+        return len(self._parse_tasks)
+
+    @property
+    def throughput(self) -> float:
+        """Parsed pages per second since the parser started."""
+        return self.parsed_count / max(time.monotonic() - self._started, 1e-9)
+
+    async def fetcher_callback(self, outcome: Outcome) -> None:
+        """Submits the fetched page for parsing. Waits while too many pages are pending."""
+        if not isinstance(outcome.res, GetResp):
+            return
+        await self.submit(outcome.item_id, outcome.res.content)
+
+    async def submit(self, item_id: int, content: bytes) -> None:
+        """Submits a page for parsing. Waits while too many pages are pending."""
+        if self._executor is None:
+            raise RuntimeError('Parser is not started; please use a context manager.')
+
+        await self._parse_sem.acquire()
+        fut: asyncio.Future = asyncio.get_running_loop().run_in_executor(self._executor, parse_page, item_id, content)
+        self._parse_tasks.add(fut)
+        self.peak_pending = max(self.peak_pending, len(self._parse_tasks))
+        fut.add_done_callback(self._on_done)
+
+    def _on_done(self, fut: asyncio.Future) -> None:
+        self._parse_tasks.discard(fut)
+        if fut.cancelled():
+            self._parse_sem.release()
+            return
+        if (e := fut.exception()) is not None:
+            self.failed_count += 1
+            log.warning(f'Failed to parse page: {e}')
+            self._parse_sem.release()
+            return
+
+        self.parsed_count += 1
+        if self._on_parsed is not None:
+            try:
+                if inspect.isawaitable(r := self._on_parsed(fut.result())):
+                    # Keep the slot until the callback completes.
+                    delivery: asyncio.Future = asyncio.ensure_future(r)
+                    self._parse_tasks.add(delivery)
+                    delivery.add_done_callback(self._on_delivered)
+                    return
+            except Exception as e:
+                log.warning(f'Exception in parsed item callback: {e}')
+        self._parse_sem.release()
 
-        _loop: AbstractEventLoop = asyncio.get_running_loop()
-        _executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=self._max_threads)
-        _parse_sem: Semaphore = asyncio.Semaphore(self._parse_concurrency)
-        _parse_tasks: set[asyncio.Task] = set()
+    def _on_delivered(self, delivery: asyncio.Future) -> None:
+        self._parse_tasks.discard(delivery)
+        self._parse_sem.release()
+        if not delivery.cancelled() and (e := delivery.exception()) is not None:
+            log.warning(f'Exception in parsed item callback: {e}')
 
-    def fetcher_callback(self, item):
-        pass
+    async def drain(self) -> None:
+        """Waits for every submitted page to be parsed."""
+        while self._parse_tasks:
+            await asyncio.wait(set(self._parse_tasks))
 
-    def parse_sync(self, item: None) -> None:
-        """Runs in a thread: bs4 + JSON dumping"""
-        pass
+    def make_string(self) -> str:
+        """Creates a human string representation of the parsing statistics."""
+        return (f'Parser: {self.parsed_count} parsed, {self.failed_count} failed, '
+                f'{self.throughput:.1f} pages/s, {self.pending} pending (peak {self.peak_pending}/{self._max_pending})')
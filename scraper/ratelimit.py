@@ -0,0 +1,134 @@
+# File: ratelimit.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from scraper.logger import log
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """
+    Parses an HTTP ``Retry-After`` header value into a delay in seconds.
+    :param value: Either a number of seconds, or an HTTP-date (e.g. ``Wed, 21 Oct 2015 07:28:00 GMT``).
+    :param now: Current UNIX time used to turn an HTTP-date into a delay; defaults to ``time.time()``.
+    :returns: The non-negative delay, or None if the value is missing or malformed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date is None or date.tzinfo is None:
+        # HTTP-dates are always GMT; a naive datetime means a malformed header.
+        return None
+    return max(0.0, date.timestamp() - (time.time() if now is None else now))
+
+
+class TokenBucket:
+    """
+    Token bucket rate limiter shared by all the fetcher's workers.
+
+    Each request takes one token; tokens refill at ``rate`` per second up to ``burst``.
+    The whole bucket can be paused when the server asks to back off, so a single ``Retry-After``
+    holds back every worker instead of only the one that received it.
+    """
+
+    def __init__(self, rate: Optional[float] = None, burst: int = 1):
+        """
+        :param rate: Sustained requests per second. None means no rate limit, only pauses apply.
+        :param burst: Maximum number of tokens that can accumulate, i.e. requests sent back-to-back.
+        """
+        if rate is not None and rate <= 0:
+            raise ValueError('rate must be positive.')
+        if burst < 1:
+            raise ValueError('burst must be at least one.')
+
+        self._rate: Optional[float] = rate
+        self._burst: int = burst
+        self._tokens: float = float(burst)
+        self._updated: Optional[float] = None
+
+        # Loop time before which no token is handed out.
+        self._paused_until: float = 0.0
+
+        # Serializes acquirers so tokens are handed out in FIFO order.
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    @property
+    def rate(self) -> Optional[float]:
+        return self._rate
+
+    @property
+    def burst(self) -> int:
+        return self._burst
+
+    def _refill(self, now: float) -> None:
+        if self._rate is None:
+            self._tokens = float(self._burst)
+        elif self._updated is not None:
+            self._tokens = min(float(self._burst), self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def paused_for(self) -> float:
+        """Returns the number of seconds left in the current pause, zero if not paused."""
+        return max(0.0, self._paused_until - asyncio.get_running_loop().time())
+
+    def pause(self, delay: float) -> bool:
+        """
+        Stops handing out tokens for ``delay`` seconds.
+        Overlapping pauses do not add up: the bucket resumes at the latest requested deadline.
+        :returns: True if this call extended the pause, False if an ongoing pause already covered it.
+        """
+        until: float = asyncio.get_running_loop().time() + delay
+        if until <= self._paused_until:
+            return False
+        self._paused_until = until
+        # Resume with a single token and refill from the end of the pause, rather than
+        # releasing a full burst the instant the server allows requests again.
+        self._tokens = min(self._tokens, 1.0)
+        self._updated = until
+        log.warning(f'Rate limiter paused for {delay:.2f}s')
+        return True
+
+    def take(self, n: int) -> int:
+        """
+        Takes up to ``n`` tokens without waiting, e.g. to hand them out to another process.
+        :returns: The number of tokens taken; zero while paused.
+        """
+        now: float = asyncio.get_running_loop().time()
+        if now < self._paused_until or self._lock.locked():
+            # Waiting acquirers go first.
+            return 0
+        self._refill(now)
+        taken: int = min(n, int(self._tokens))
+        self._tokens -= taken
+        return taken
+
+    async def acquire(self) -> None:
+        """Waits until a token is available and takes it."""
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            while True:
+                now: float = loop.time()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self._rate)
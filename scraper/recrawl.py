@@ -0,0 +1,220 @@
+# File: recrawl.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import hashlib
+import heapq
+import math
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Optional, Container
+
+from scraper.logger import log
+
+# Seconds in a day.
+_DAY: float = 86_400.0
+
+
+def content_digest(content: bytes) -> bytes:
+    """Default fingerprint of an item page: a 128-bit BLAKE2b hash of its body."""
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+@dataclass(frozen=True)
+class RecrawlPlan:
+    """
+    The items a re-crawl run fetches, in order: new IDs first, then known items by decreasing expected staleness.
+    """
+    # IDs past the highest ID seen by previous runs, in increasing order.
+    new_ids: array
+
+    # Known items, stalest first.
+    known_ids: array
+
+    # Expected number of known items that changed since they were last fetched, among those planned.
+    expected_changes: float
+
+    def __len__(self) -> int:
+        return len(self.new_ids) + len(self.known_ids)
+
+
+class ChangeStore:
+    """
+    On-disk history of each item's content, backed by SQLite: the fingerprint of its page when last fetched, when it
+    was first and last fetched, when it last changed, and how many fetches saw it changed.
+
+    Each item's change rate is estimated from that history, so a re-crawl spends its request budget on the items most
+    likely to have changed rather than sweeping every ID. Changes are modelled as a Poisson process with a gamma prior
+    of one change per ``prior_period``, weighing as much as ``prior_weight`` observed changes: an item never seen
+    changing still grows stale, only slowly, and a few fetches are enough to tell frequently updated items apart.
+
+    Like ``CheckpointStore``, ``record()`` only appends to an in-memory queue; a background thread writes the records.
+
+    Usage:
+        with ChangeStore('changes.sqlite') as store:
+            async with Fetcher(client) as fetcher:
+                await fetcher.recrawl(store, budget=5000, callback=parser.fetcher_callback)
+    """
+
+    def __init__(self, path: Path, prior_period: float = 30 * _DAY, prior_weight: float = 0.1,
+                 commit_interval: float = 1.0, batch_size: int = 1000):
+        """
+        :param path: SQLite database file; created if missing.
+        :param prior_period: Seconds between two changes assumed of an item before its history says otherwise.
+        :param prior_weight: Strength of that assumption, in changes; the lower, the sooner history prevails.
+        :param commit_interval: Maximum number of seconds a record waits before being committed.
+        :param batch_size: Maximum number of records committed at once.
+        """
+        self._path: Path = Path(path)
+        self._prior_period: float = prior_period
+        self._prior_weight: float = prior_weight
+        self._commit_interval: float = commit_interval
+        self._batch_size: int = batch_size
+
+        # (item_id, fingerprint, time) records waiting for the writer thread, None stops it.
+        self._pending: queue.SimpleQueue[Optional[tuple[int, bytes, float]]] = queue.SimpleQueue()
+        self._writer: Optional[threading.Thread] = None
+
+        with self._connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS items ('
+                       'item_id INTEGER PRIMARY KEY, digest BLOB NOT NULL, first_seen REAL NOT NULL, '
+                       'last_checked REAL NOT NULL, last_changed REAL NOT NULL, '
+                       'checks INTEGER NOT NULL, changes INTEGER NOT NULL'
+                       ') WITHOUT ROWID')
+        db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self._path)
+        # WAL lets plan() read while the writer thread commits.
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        return db
+
+    def __enter__(self) -> 'ChangeStore':
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        """Starts the writer thread."""
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name='ChangeStoreWriter', daemon=True)
+            self._writer.start()
+
+    def close(self) -> None:
+        """Commits every pending record and stops the writer thread."""
+        if self._writer is not None:
+            self._pending.put(None)
+            self._writer.join()
+            self._writer = None
+
+    def record(self, item_id: int, digest: bytes, when: Optional[float] = None) -> None:
+        """
+        Records the fingerprint of an item's page, fetched at ``when`` (a Unix time, now by default).
+        Does not block; written by the background thread.
+        """
+        if self._writer is None:
+            raise RuntimeError('ChangeStore is not open.')
+        self._pending.put((item_id, digest, time.time() if when is None else when))
+
+    def max_id(self) -> int:
+        """Returns the highest item ID recorded, -1 if none. Blocking."""
+        db = self._connect()
+        try:
+            (top,) = db.execute('SELECT MAX(item_id) FROM items').fetchone()
+        finally:
+            db.close()
+        return -1 if top is None else top
+
+    def change_rate(self, checks: int, changes: int, first_seen: float, last_checked: float) -> float:
+        """
+        Estimates the changes per second of an item: the posterior mean of a Poisson rate, given the ``changes``
+        seen over the ``last_checked - first_seen`` seconds it has been observed.
+        """
+        observed: float = last_checked - first_seen if checks > 1 else 0.0
+        return (changes + self._prior_weight) / (observed + self._prior_weight * self._prior_period)
+
+    def plan(self, budget: int, max_id: int, exclude: Container[int] = (), now: Optional[float] = None) -> RecrawlPlan:
+        """
+        Picks the items of a run of ``budget`` requests. Blocking; run it in a thread from async code.
+        :param budget: Requests the run may send.
+        :param max_id: Highest item ID on the site; IDs past the highest recorded one come first.
+        :param exclude: IDs never planned, e.g. the ones known to be missing.
+        :param now: Unix time of the run, now by default.
+        """
+        now = time.time() if now is None else now
+        top: int = self.max_id()
+        # Known missing IDs would only be skipped when fetched, leaving part of the budget unspent.
+        new_ids: array = array('q', islice((i for i in range(top + 1, max_id + 1) if i not in exclude), budget))
+        left: int = budget - len(new_ids)
+        if left <= 0:
+            return RecrawlPlan(new_ids, array('q'), 0.0)
+
+        db = self._connect()
+        try:
+            rows = db.execute('SELECT item_id, first_seen, last_checked, checks, changes FROM items')
+            # The items' change rate times the time since they were last fetched, largest first. Staleness, the
+            # probability of a change since then, grows with it.
+            stalest: list[tuple[float, int]] = heapq.nlargest(left, (
+                (self.change_rate(checks, changes, first_seen, last_checked) * max(0.0, now - last_checked), item_id)
+                for item_id, first_seen, last_checked, checks, changes in rows if item_id not in exclude
+            ))
+        finally:
+            db.close()
+
+        expected: float = sum(-math.expm1(-exposure) for exposure, _ in stalest)
+        plan = RecrawlPlan(new_ids, array('q', (item_id for _, item_id in stalest)), expected)
+        log.info(f'Re-crawl plan: {len(new_ids)} new IDs, {len(plan.known_ids)} known items, '
+                 f'{expected:.1f} expected to have changed')
+        return plan
+
+    def _write_loop(self) -> None:
+        db = self._connect()
+        try:
+            stop: bool = False
+            while not stop:
+                # Block for the first record, then gather a group until the interval or the batch is full.
+                batch: list[tuple[int, bytes, float]] = []
+                if (rec := self._pending.get()) is None:
+                    break
+                batch.append(rec)
+                deadline: float = time.monotonic() + self._commit_interval
+                while len(batch) < self._batch_size:
+                    timeout: float = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        rec = self._pending.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if rec is None:
+                        stop = True
+                        break
+                    batch.append(rec)
+
+                try:
+                    with db:
+                        # The right-hand sides of SET read the row as it was before the update.
+                        db.executemany(
+                            'INSERT INTO items'
+                            ' (item_id, digest, first_seen, last_checked, last_changed, checks, changes)'
+                            ' VALUES (?1, ?2, ?3, ?3, ?3, 1, 0)'
+                            ' ON CONFLICT (item_id) DO UPDATE SET'
+                            ' changes = changes + (digest != excluded.digest),'
+                            ' last_changed = CASE WHEN digest != excluded.digest THEN excluded.last_checked'
+                            ' ELSE last_changed END,'
+                            ' checks = checks + 1, last_checked = excluded.last_checked, digest = excluded.digest',
+                            batch)
+                except sqlite3.Error as e:
+                    log.error(f'Failed to commit {len(batch)} change records: {e}')
+        finally:
+            db.close()
@@ -0,0 +1,110 @@
+# File: retry.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import math
+import random
+from dataclasses import dataclass
+from typing import Optional
+
+import httpx
+
+# Status codes meaning the server is overloaded; they also shrink the concurrency limit and pause the rate limiter.
+OVERLOAD_STATUSES: frozenset[int] = frozenset({429, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How many times a task is attempted, how long it waits in between, and which errors are worth another attempt.
+
+    Waits follow exponential backoff with decorrelated jitter: each one is drawn uniformly in
+    ``[base_delay, 3 * previous wait]`` and capped at ``max_delay``, so retrying workers spread out instead of
+    hitting the server again in lockstep.
+    """
+    # Attempts in total, the first one included.
+    max_attempts: int = 10
+
+    # Bounds of the wait in between two attempts, in seconds.
+    base_delay: float = 0.25
+    max_delay: float = 30.0
+
+    # HTTP status codes retried; other error statuses fail the task right away (404 marks the item missing).
+    retry_statuses: frozenset[int] = frozenset({429, 500, 502, 503, 504})
+
+    # Also retry errors that may happen after the server received the request (read errors, timeouts) for POST
+    # requests. GET requests are idempotent and always retried; errors before sending (connect) always are.
+    retry_unsafe: bool = False
+
+    def __post_init__(self):
+        if self.max_attempts < 1:
+            raise ValueError('max_attempts must be at least one.')
+        if not 0 <= self.base_delay <= self.max_delay:
+            raise ValueError('Expected 0 <= base_delay <= max_delay.')
+
+    def backoff(self, previous: float) -> float:
+        """Returns the wait before the next attempt in seconds, given the previous wait (zero for the first one)."""
+        return min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+
+    def is_retryable(self, error: BaseException, idempotent: bool) -> bool:
+        """Classifies a transport error, or an attempt timeout (``TimeoutError``), as worth another attempt."""
+        match error:
+            case httpx.ConnectError() | httpx.ConnectTimeout() | httpx.PoolTimeout():
+                # The request never reached the server.
+                return True
+            case httpx.TimeoutException() | httpx.NetworkError() | httpx.RemoteProtocolError() | TimeoutError():
+                return idempotent or self.retry_unsafe
+            case _:
+                # E.g. unsupported protocol, too many redirects, undecodable body: another attempt fails the same.
+                return False
+
+
+@dataclass(frozen=True)
+class TimeoutPolicy:
+    """
+    Time budgets of a task, on top of the HTTP client's own connect/read timeouts.
+    """
+    # Seconds from the first attempt after which the task gives up, waits and retries included; None for no limit.
+    deadline: Optional[float] = None
+
+    # Seconds a single attempt may take, response body included; None for no limit but the deadline.
+    attempt_timeout: Optional[float] = None
+
+    # GET only: if an attempt has not completed after this many seconds, a duplicate request races it and the first
+    # response wins. The fetcher's ``HedgeBudget`` caps how many are sent. None disables hedging.
+    hedge_after: Optional[float] = None
+
+    def attempt_budget(self, remaining: float) -> Optional[float]:
+        """Returns the timeout of the next attempt given the seconds left before the deadline, None for none."""
+        budget: float = min(remaining, math.inf if self.attempt_timeout is None else self.attempt_timeout)
+        return None if budget == math.inf else budget
+
+
+class HedgeBudget:
+    """
+    Caps hedged requests to a fraction of all attempts, so hedging trims the latency tail without adding more than
+    ``ratio`` extra load. Every attempt earns ``ratio`` of a hedge, up to ``burst`` saved hedges.
+    """
+
+    def __init__(self, ratio: float = 0.05, burst: int = 10):
+        """
+        :param ratio: Hedges allowed per attempt, e.g. 0.05 for at most 5 % more requests.
+        :param burst: Maximum number of hedges saved up, sent when a series of responses is slow.
+        """
+        if not 0.0 <= ratio <= 1.0:
+            raise ValueError('ratio must be in [0, 1].')
+        self._ratio: float = ratio
+        self._burst: int = burst
+        self._tokens: float = 0.0
+
+    def on_attempt(self) -> None:
+        """Records an attempt."""
+        self._tokens = min(float(self._burst), self._tokens + self._ratio)
+
+    def spend(self) -> bool:
+        """Takes a hedge if one is available. Returns whether a hedge may be sent."""
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
@@ -0,0 +1,398 @@
+# File: shard.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+import json
+import math
+import multiprocessing
+from collections import deque
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+
+from scraper.export import NdjsonExporter
+from scraper.fetcher import Fetcher
+from scraper.logger import log
+from scraper.metrics import Metrics
+from scraper.ratelimit import TokenBucket
+from scraper.transport import TransportProfile
+
+# Protocol between the coordinator and its workers: one JSON object per line, each request answered by one reply.
+#   {"op": "lease"}                     -> {"shard": [start, stop]}, {"wait": seconds} or {"done": true}
+#   {"op": "complete", "shard": [a, b]} -> {"ok": true}
+#   {"op": "tokens", "n": n}            -> {"granted": k}, 1 <= k <= n, once the shared budget allows it
+#   {"op": "pause", "delay": seconds}   -> {"ok": true}, pauses the shared budget for every worker
+#   {"op": "report", "metrics": {...}}  -> {"ok": true}, a ``Metrics.to_dict()`` snapshot, sent once on exit
+# Errors are answered with {"error": "message"}.
+
+# Seconds an idle worker waits before asking again, while other workers still hold leases that may come back.
+_IDLE_WAIT: float = 1.0
+
+
+def _parse_address(address: str) -> tuple[Optional[str], Optional[int], Optional[str]]:
+    """Splits ``host:port`` into its parts, anything containing a slash being a unix socket path instead."""
+    if '/' in address:
+        return None, None, address
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port), None
+
+
+@dataclass
+class _Lease:
+    """A shard handed out to a worker connection."""
+    start: int
+    stop: int
+
+
+class Coordinator:
+    """
+    Hands out shards of the ID space to worker processes, and shares one rate limit between them.
+
+    Shards are sized by guided self-scheduling: each lease takes a fraction of what is left (``remaining /
+    (2 * workers)``), so shards are large at first and shrink towards the end, where small shards keep every worker
+    busy until the last ID. A worker asks for a new shard whenever it finishes one, so fast workers take more.
+    When a worker disconnects without completing its shards (e.g. its process died), they are handed out again.
+
+    Workers talk to the coordinator through a TCP or unix socket, so they may also run on other machines.
+
+    Usage:
+        coordinator = Coordinator(range(100_000), workers=4, rate_limiter=TokenBucket(20.0, burst=20))
+        async with coordinator.serve('127.0.0.1:8765'):
+            await coordinator.wait()
+        print(coordinator.metrics.make_string())
+    """
+
+    def __init__(self, ids: range, workers: int, rate_limiter: Optional[TokenBucket] = None,
+                 min_shard: int = 16, max_shard: int = 10_000):
+        """
+        :param ids: IDs to fetch; the step must be 1.
+        :param workers: Expected number of workers, used to size the shards.
+        :param rate_limiter: Budget shared by all workers. Defaults to a bucket that only applies pauses.
+        :param min_shard: Smallest shard handed out, except for the very last one.
+        :param max_shard: Largest shard handed out.
+        """
+        if ids.step != 1:
+            raise ValueError('Sharding requires a range with a step of 1.')
+        if workers < 1:
+            raise ValueError('workers must be at least one.')
+
+        self._workers: int = workers
+        self._min_shard: int = min_shard
+        self._max_shard: int = max_shard
+        self.rate_limiter: TokenBucket = rate_limiter if rate_limiter is not None else TokenBucket()
+
+        # Next ID never handed out, and the end of the ID space.
+        self._next: int = ids.start
+        self._stop: int = ids.stop
+        # Shards returned by dead workers, handed out before cutting new ones.
+        self._returned: deque[_Lease] = deque()
+        # Leases held by each connection.
+        self._leases: dict[int, list[_Lease]] = {}
+        self._connections: int = 0
+
+        self._finished: asyncio.Event = asyncio.Event()
+        self._check_finished()
+
+        # Merged worker metrics.
+        self.metrics: Metrics = Metrics()
+        self.shards_completed: int = 0
+        self.shards_returned: int = 0
+
+    @property
+    def remaining(self) -> int:
+        """Number of IDs not handed out yet."""
+        return max(0, self._stop - self._next) + sum(s.stop - s.start for s in self._returned)
+
+    def serve(self, address: str) -> '_Serving':
+        """Listens for workers on ``host:port`` or a unix socket path, until the context exits."""
+        return _Serving(self, address)
+
+    async def wait(self) -> None:
+        """Waits until every shard completed and every worker disconnected."""
+        await self._finished.wait()
+
+    def _check_finished(self) -> None:
+        if not self.remaining and not any(self._leases.values()) and not self._connections:
+            self._finished.set()
+        else:
+            self._finished.clear()
+
+    def _lease(self) -> Optional[_Lease]:
+        if self._returned:
+            return self._returned.popleft()
+        left: int = self._stop - self._next
+        if left <= 0:
+            return None
+        size: int = min(left, max(self._min_shard, min(self._max_shard, math.ceil(left / (2 * self._workers)))))
+        lease = _Lease(self._next, self._next + size)
+        self._next += size
+        return lease
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        conn: int = id(writer)
+        peer = writer.get_extra_info('peername') or 'unix socket'
+        self._leases[conn] = []
+        self._connections += 1
+        self._check_finished()
+        log.info(f'Worker connected from {peer}')
+        try:
+            while line := await reader.readline():
+                try:
+                    reply: dict[str, Any] = await self._dispatch(conn, json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    reply = {'error': str(e)}
+                writer.write(json.dumps(reply).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError as e:
+            log.warning(f'Lost worker {peer}: {e}')
+        finally:
+            if lost := self._leases.pop(conn):
+                log.warning(f'Worker {peer} left with {len(lost)} shards; handing them out again.')
+                self._returned.extend(lost)
+                self.shards_returned += len(lost)
+            self._connections -= 1
+            self._check_finished()
+            writer.close()
+
+    async def _dispatch(self, conn: int, msg: dict[str, Any]) -> dict[str, Any]:
+        match msg['op']:
+            case 'lease':
+                if (lease := self._lease()) is not None:
+                    self._leases[conn].append(lease)
+                    return {'shard': [lease.start, lease.stop]}
+                if any(self._leases.values()):
+                    # Others may still die and give their shards back.
+                    return {'wait': _IDLE_WAIT}
+                return {'done': True}
+            case 'complete':
+                start, stop = msg['shard']
+                self._leases[conn] = [s for s in self._leases[conn] if (s.start, s.stop) != (start, stop)]
+                self.shards_completed += 1
+                log.debug(f'Shard [{start}, {stop}) complete; {self.remaining} IDs left')
+                self._check_finished()
+                return {'ok': True}
+            case 'tokens':
+                await self.rate_limiter.acquire()
+                return {'granted': 1 + self.rate_limiter.take(max(0, int(msg['n']) - 1))}
+            case 'pause':
+                self.rate_limiter.pause(float(msg['delay']))
+                return {'ok': True}
+            case 'report':
+                self.metrics.merge(Metrics.from_dict(msg['metrics']))
+                return {'ok': True}
+            case op:
+                raise ValueError(f'Unknown op: {op}')
+
+
+class _Serving:
+    """Async context manager running a ``Coordinator`` server."""
+
+    def __init__(self, coordinator: Coordinator, address: str):
+        self._coordinator: Coordinator = coordinator
+        self._address: str = address
+        self._server: Optional[asyncio.Server] = None
+
+    async def __aenter__(self) -> asyncio.Server:
+        host, port, path = _parse_address(self._address)
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._coordinator._handle, path)
+        else:
+            self._server = await asyncio.start_server(self._coordinator._handle, host, port)
+        log.info(f'Coordinator listening on {", ".join(str(sock.getsockname()) for sock in self._server.sockets)}')
+        return self._server
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+
+class CoordinatorClient:
+    """A worker's connection to the coordinator. Requests are sent one at a time."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader: asyncio.StreamReader = reader
+        self._writer: asyncio.StreamWriter = writer
+        self._lock: asyncio.Lock = asyncio.Lock()
+
+    @classmethod
+    async def connect(cls, address: str) -> 'CoordinatorClient':
+        host, port, path = _parse_address(address)
+        if path is not None:
+            return cls(*await asyncio.open_unix_connection(path))
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def close(self) -> None:
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+
+    async def request(self, op: str, **kwargs) -> dict[str, Any]:
+        async with self._lock:
+            self._writer.write(json.dumps({'op': op, **kwargs}).encode('utf-8') + b'\n')
+            await self._writer.drain()
+            if not (line := await self._reader.readline()):
+                raise ConnectionError('Coordinator closed the connection.')
+        reply: dict[str, Any] = json.loads(line)
+        if 'error' in reply:
+            raise RuntimeError(f'Coordinator error: {reply["error"]}')
+        return reply
+
+    async def lease(self) -> Optional[range]:
+        """Returns the next shard to fetch, waiting while others may still give one back; None once all is done."""
+        while True:
+            reply = await self.request('lease')
+            if 'shard' in reply:
+                return range(*reply['shard'])
+            if reply.get('done'):
+                return None
+            await asyncio.sleep(reply['wait'])
+
+    async def complete(self, shard: range) -> None:
+        await self.request('complete', shard=[shard.start, shard.stop])
+
+    async def report(self, metrics: Metrics) -> None:
+        await self.request('report', metrics=metrics.to_dict())
+
+
+class RemoteTokenBucket(TokenBucket):
+    """
+    Token bucket drawing from the coordinator's shared budget, for use as a worker fetcher's ``rate_limiter``.
+
+    Tokens are fetched ``batch`` at a time to save round trips, so a worker may run ahead of the shared rate by
+    at most ``batch`` requests. A pause is applied locally at once, and forwarded so every worker backs off.
+    """
+
+    def __init__(self, client: CoordinatorClient, batch: int = 4):
+        """
+        :param client: Connection to the coordinator.
+        :param batch: Number of tokens asked for at once.
+        """
+        super().__init__(None, burst=1)
+        self._client: CoordinatorClient = client
+        self._batch: int = max(1, batch)
+        self._stock: int = 0
+        self._pending: set[asyncio.Task] = set()
+
+    def pause(self, delay: float) -> bool:
+        if not super().pause(delay):
+            return False
+        # Tokens already granted were meant for before the server pushed back.
+        self._stock = 0
+        task = asyncio.create_task(self._forward_pause(delay))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return True
+
+    async def _forward_pause(self, delay: float) -> None:
+        try:
+            await self._client.request('pause', delay=delay)
+        except (ConnectionError, RuntimeError) as e:
+            log.warning(f'Failed to forward a pause to the coordinator: {e}')
+
+    async def acquire(self) -> None:
+        # Honours local pauses through the parent.
+        await super().acquire()
+        async with self._lock:
+            if not self._stock:
+                self._stock = (await self._client.request('tokens', n=self._batch))['granted']
+            self._stock -= 1
+
+
+@dataclass(frozen=True)
+class WorkerOptions:
+    """
+    Settings of a worker process; must be picklable.
+    """
+    # Site to fetch.
+    base_url: str = 'https://doujinstyle.com/'
+
+    # Directory of the NDJSON export, one set of files per worker; None to export nothing.
+    output: Optional[Path] = None
+
+    # Number of rate limit tokens asked for at once.
+    token_batch: int = 4
+
+    # Transport profile of each worker's HTTP client, or the name of one.
+    transport: str | TransportProfile = 'balanced'
+
+
+async def run_worker(address: str, name: str, options: WorkerOptions = WorkerOptions()) -> None:
+    """
+    Fetches shards leased from the coordinator at ``address`` until none are left, then reports its metrics.
+    May run in any process or on any machine that can reach the coordinator.
+    """
+    client = await CoordinatorClient.connect(address)
+    try:
+        async with AsyncExitStack() as stack:
+            callback = None
+            if options.output is not None:
+                exporter = await stack.enter_async_context(NdjsonExporter(options.output, prefix=f'items-{name}'))
+                callback = exporter.export_outcome
+            fetcher = await stack.enter_async_context(
+                Fetcher(base_url=options.base_url, rate_limiter=RemoteTokenBucket(client, options.token_batch),
+                        transport=options.transport))
+
+            while (shard := await client.lease()) is not None:
+                await fetcher.fetch_range(shard, callback)
+                await fetcher.join()
+                await client.complete(shard)
+        await client.report(fetcher.metrics)
+    finally:
+        await client.close()
+
+
+def _worker_process(address: str, name: str, options: WorkerOptions) -> None:
+    """Entry point of the worker processes."""
+    asyncio.run(run_worker(address, name, options))
+
+
+async def run_sharded(ids: range, processes: int, address: str = '127.0.0.1:0',
+                      rate_limiter: Optional[TokenBucket] = None,
+                      options: WorkerOptions = WorkerOptions(), max_restarts: int = 3) -> Metrics:
+    """
+    Fetches ``ids`` with ``processes`` local worker processes and returns their merged metrics.
+    A worker process that crashes is restarted; its shards are handed out again.
+    Like anything using ``multiprocessing``, the calling script must be guarded by ``if __name__ == '__main__':``.
+    :param address: Where the coordinator listens; port 0 picks a free port. Remote workers may connect too.
+    :param max_restarts: Number of crashed worker processes restarted before giving up.
+    """
+    coordinator = Coordinator(ids, processes, rate_limiter)
+    ctx = multiprocessing.get_context('spawn')
+    async with coordinator.serve(address) as server:
+        if '/' not in address:
+            host, port = server.sockets[0].getsockname()[:2]
+            address = f'{host}:{port}'
+
+        def spawn(n: int) -> multiprocessing.Process:
+            p = ctx.Process(target=_worker_process, args=(address, f'w{n}', options), name=f'ShardWorker-{n}')
+            p.start()
+            return p
+
+        procs: list[multiprocessing.Process] = [spawn(n) for n in range(processes)]
+        while True:
+            try:
+                await asyncio.wait_for(coordinator.wait(), 1.0)
+                break
+            except asyncio.TimeoutError:
+                pass
+            for n, p in enumerate(procs):
+                if p.exitcode not in (None, 0):
+                    if max_restarts <= 0:
+                        for other in procs:
+                            other.terminate()
+                        raise RuntimeError(f'{p.name} exited with code {p.exitcode}; too many crashes.')
+                    max_restarts -= 1
+                    log.warning(f'{p.name} exited with code {p.exitcode}; restarting it.')
+                    procs[n] = spawn(n)
+
+        for p in procs:
+            await asyncio.to_thread(p.join)
+
+    log.info(f'Sharded run done: {coordinator.shards_completed} shards, '
+             f'{coordinator.shards_returned} handed out again')
+    return coordinator.metrics
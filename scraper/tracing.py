@@ -0,0 +1,278 @@
+# File: tracing.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+"""
+Per-task tracing of the fetcher: where the time of each task goes, from its wait in the queue to its callback.
+
+Spans are recorded in memory and dumped when the fetcher closes, either as Chrome trace JSON (open it in
+``chrome://tracing`` or https://ui.perfetto.dev), or as a compact binary log converted later with:
+    python -m scraper.tracing run.trace run.json
+"""
+
+import json
+import random
+import struct
+import sys
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Optional
+
+import httpx
+
+# Trace of the task the current asyncio task runs, if it is sampled.
+_current: ContextVar[Optional['TaskTrace']] = ContextVar('scraper_task_trace', default=None)
+
+# Binary log layout: magic, length of the JSON header, JSON header (span names, span arguments, counts), then the
+# task records, then the span records.
+_MAGIC: bytes = b'SCTRACE1'
+_HEADER_LEN = struct.Struct('<I')
+# Task: trace id, item ID, index of its method in the names.
+_TASK = struct.Struct('<IqH')
+# Span: trace id, name index, arguments index, start and duration in microseconds.
+_SPAN = struct.Struct('<IHHqQ')
+
+# Prefixes of the httpcore trace events, stripped from the span names.
+_HTTPCORE_PREFIXES: tuple[str, ...] = ('connection.', 'http11.', 'http2.')
+
+
+class Span:
+    """
+    Times a block of code as a span of a task's trace. Use it as a context manager; an exception escaping the block
+    is recorded in the span's arguments, along with its HTTP status if it has one.
+    """
+    __slots__ = ('_tracer', '_tid', '_name', '_args', '_start')
+
+    def __init__(self, tracer: 'Tracer', tid: int, name: str, args: dict[str, Any]):
+        self._tracer: Tracer = tracer
+        self._tid: int = tid
+        self._name: str = name
+        self._args: dict[str, Any] = args
+        self._start: int = 0
+
+    def set(self, **args: Any) -> None:
+        """Adds arguments to the span."""
+        self._args.update(args)
+
+    def __enter__(self) -> 'Span':
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is not None:
+            self._args['error'] = exc_type.__name__
+            if (response := getattr(exc_val, 'response', None)) is not None:
+                self._args['status'] = response.status_code
+        self._tracer.record(self._tid, self._name, self._start, time.perf_counter_ns() - self._start, self._args)
+
+
+class _NullSpan:
+    """Span of a task that is not traced: does nothing."""
+    __slots__ = ()
+
+    def set(self, **args: Any) -> None:
+        pass
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        pass
+
+
+NULL_SPAN: _NullSpan = _NullSpan()
+
+
+class TaskTrace:
+    """Trace of one task: its spans all share a trace id, shown as one row of the Chrome trace."""
+    __slots__ = ('tracer', 'tid')
+
+    def __init__(self, tracer: 'Tracer', tid: int):
+        self.tracer: Tracer = tracer
+        self.tid: int = tid
+
+    def span(self, name: str, **args: Any) -> Span:
+        return Span(self.tracer, self.tid, name, args)
+
+
+def span(name: str, **args: Any) -> Span | _NullSpan:
+    """
+    Returns a span of the task traced in the current context, or a span doing nothing if the task is not traced.
+    The latter costs a context variable lookup, which keeps instrumented code cheap when tracing is off or sampled.
+    """
+    if (trace := _current.get()) is None:
+        return NULL_SPAN
+    return trace.span(name, **args)
+
+
+class Tracer:
+    """
+    Records spans of fetcher tasks. A sampled fraction of the tasks is traced; the others only cost a context
+    variable lookup per instrumented block.
+    """
+
+    def __init__(self, sample_rate: float = 1.0, max_spans: int = 1_000_000):
+        """
+        :param sample_rate: Fraction of the tasks traced, in [0, 1].
+        :param max_spans: Spans kept in memory at most; later spans are counted as dropped.
+        """
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError('sample_rate must be in [0, 1].')
+        self._sample_rate: float = sample_rate
+        self._max_spans: int = max_spans
+        # Trace id 0 is the producer: whatever enqueues tasks.
+        self._next_tid: int = 1
+        # (trace id, item ID, method) of each traced task.
+        self.tasks: list[tuple[int, int, str]] = []
+        # (trace id, name, start ns, duration ns, arguments)
+        self.spans: list[tuple[int, str, int, int, dict[str, Any]]] = []
+        self.dropped: int = 0
+
+    def record(self, tid: int, name: str, start_ns: int, dur_ns: int, args: dict[str, Any]) -> None:
+        """Records a finished span; ``start_ns`` is on the ``time.perf_counter_ns()`` clock."""
+        if len(self.spans) >= self._max_spans:
+            self.dropped += 1
+            return
+        self.spans.append((tid, name, start_ns, dur_ns, args))
+
+    def start_task(self, item_id: int, method: str, queue_wait: float = 0.0) -> Optional[TaskTrace]:
+        """
+        Decides whether a dequeued task is traced. If so, makes it the task traced in the current context, so call it
+        from the asyncio task running it, and records the time it waited in the queue.
+        :param item_id: ID of the task's item.
+        :param method: HTTP method of the task.
+        :param queue_wait: Seconds the task waited in the queue.
+        :returns: The task's trace, None if it is not sampled.
+        """
+        if self._sample_rate < 1.0 and random.random() >= self._sample_rate:
+            return None
+        trace: TaskTrace = TaskTrace(self, self._next_tid)
+        self._next_tid += 1
+        self.tasks.append((trace.tid, item_id, method))
+        wait_ns: int = int(queue_wait * 1e9)
+        self.record(trace.tid, 'queue', time.perf_counter_ns() - wait_ns, wait_ns, {})
+        _current.set(trace)
+        return trace
+
+    def producer_span(self, name: str, **args: Any) -> Span | _NullSpan:
+        """Returns a span on the producer's row, sampled like tasks."""
+        if self._sample_rate < 1.0 and random.random() >= self._sample_rate:
+            return NULL_SPAN
+        return Span(self, 0, name, args)
+
+    def hook_httpx_client(self, client: httpx.AsyncClient) -> None:
+        """
+        Registers a request hook recording the connection pool wait and the httpcore phases of the requests of
+        traced tasks as spans: connect (DNS included), TLS, request sending, time to first byte, body download.
+        """
+        hooks = client.event_hooks
+        hooks['request'] = [*hooks.get('request', ()), self._on_httpx_request]
+        client.event_hooks = hooks
+
+    async def _on_httpx_request(self, request: httpx.Request) -> None:
+        if (trace := _current.get()) is None:
+            return
+        request.extensions['trace'] = self._make_trace(trace.tid, request.method,
+                                                       request.extensions.get('trace'))
+
+    def _make_trace(self, tid: int, method: str, inner: Optional[Any]):
+        """
+        Returns an httpcore trace callback turning the ``*.started`` and ``*.complete`` (or ``*.failed``) events of
+        one request into spans. Events are passed on to ``inner``, a trace callback already set on the request.
+        """
+        requested: int = time.perf_counter_ns()
+        waiting: bool = True
+        # Phase name -> start
+        started: dict[str, int] = {}
+
+        async def trace(event: str, info: dict[str, Any]) -> None:
+            nonlocal waiting
+            now: int = time.perf_counter_ns()
+            if waiting:
+                # The first event comes once the pool handed the request a connection.
+                waiting = False
+                self.record(tid, 'pool_wait', requested, now - requested, {'method': method})
+            phase, _, state = event.rpartition('.')
+            if state == 'started':
+                started[phase] = now
+            elif (start := started.pop(phase, None)) is not None:
+                name: str = phase
+                for prefix in _HTTPCORE_PREFIXES:
+                    name = name.removeprefix(prefix)
+                self.record(tid, name, start, now - start, {'failed': True} if state == 'failed' else {})
+            if inner is not None:
+                await inner(event, info)
+
+        return trace
+
+    def to_chrome(self) -> dict[str, Any]:
+        """Returns the spans in the Chrome trace event format, one row per task."""
+        events: list[dict[str, Any]] = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 0, 'args': {'name': 'producer'}},
+            *({'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': f'{method} #{item_id}'}}
+              for tid, item_id, method in self.tasks),
+        ]
+        origin: int = min((s[2] for s in self.spans), default=0)
+        for tid, name, start, dur, args in self.spans:
+            events.append({'name': name, 'cat': 'fetcher', 'ph': 'X', 'pid': 1, 'tid': tid,
+                           'ts': (start - origin) / 1000, 'dur': dur / 1000, 'args': args})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'dropped_spans': self.dropped}}
+
+    def dump(self, path: Path) -> None:
+        """Writes the trace: Chrome trace JSON if the file ends with ``.json``, the binary log otherwise."""
+        path = Path(path)
+        tmp: Path = path.with_name(path.name + '.tmp')
+        if path.suffix == '.json':
+            tmp.write_text(json.dumps(self.to_chrome()), encoding='utf-8')
+        else:
+            tmp.write_bytes(self._to_binary())
+        tmp.replace(path)
+
+    def _to_binary(self) -> bytes:
+        """Packs the trace into the binary log; names and arguments repeat a lot, so each is stored once."""
+        names: dict[str, int] = {}
+        args_table: dict[str, int] = {}
+        origin: int = min((s[2] for s in self.spans), default=0)
+        tasks: bytearray = bytearray()
+        for tid, item_id, method in self.tasks:
+            tasks += _TASK.pack(tid, item_id, names.setdefault(method, len(names)))
+        spans: bytearray = bytearray()
+        for tid, name, start, dur, args in self.spans:
+            key: str = json.dumps(args, sort_keys=True)
+            spans += _SPAN.pack(tid, names.setdefault(name, len(names)), args_table.setdefault(key, len(args_table)),
+                                (start - origin) // 1000, dur // 1000)
+        header: bytes = json.dumps({'names': list(names), 'args': list(args_table), 'tasks': len(self.tasks),
+                                    'spans': len(self.spans), 'dropped': self.dropped}).encode()
+        return _MAGIC + _HEADER_LEN.pack(len(header)) + header + tasks + spans
+
+    @classmethod
+    def load(cls, path: Path) -> 'Tracer':
+        """Reads a binary log written by ``dump()``; timestamps come back relative to the first span."""
+        data: bytes = Path(path).read_bytes()
+        if not data.startswith(_MAGIC):
+            raise ValueError(f'{path} is not a trace log.')
+        offset: int = len(_MAGIC)
+        (length,) = _HEADER_LEN.unpack_from(data, offset)
+        offset += _HEADER_LEN.size
+        header: dict[str, Any] = json.loads(data[offset:offset + length])
+        offset += length
+        names: list[str] = header['names']
+        args_table: list[dict[str, Any]] = [json.loads(a) for a in header['args']]
+
+        tracer = cls()
+        for tid, item_id, method in _TASK.iter_unpack(data[offset:offset + header['tasks'] * _TASK.size]):
+            tracer.tasks.append((tid, item_id, names[method]))
+        offset += header['tasks'] * _TASK.size
+        for tid, name, args, start, dur in _SPAN.iter_unpack(data[offset:offset + header['spans'] * _SPAN.size]):
+            tracer.spans.append((tid, names[name], start * 1000, dur * 1000, dict(args_table[args])))
+        tracer.dropped = header['dropped']
+        tracer._next_tid = max((t[0] for t in tracer.tasks), default=0) + 1
+        return tracer
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('usage: python -m scraper.tracing <binary log> <output.json>')
+    Tracer.load(Path(sys.argv[1])).dump(Path(sys.argv[2]))
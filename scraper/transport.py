@@ -0,0 +1,263 @@
+# File: transport.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+import contextlib
+import functools
+import ipaddress
+import socket
+import ssl
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterable, Iterator, Optional
+
+import httpcore
+import httpx
+from httpx import AsyncClient, AsyncHTTPTransport, Limits, Timeout, create_ssl_context
+
+from scraper.logger import log
+from scraper.tracing import span
+
+try:
+    import h2
+except ImportError:
+    h2 = None
+
+
+@dataclass(frozen=True)
+class TransportProfile:
+    """
+    How the fetcher talks to the site: protocol, connection pool, timeouts, DNS caching and politeness jitter.
+    """
+    # Name, for logs.
+    name: str
+
+    # Multiplexes requests over HTTP/2 connections when the server supports it. Needs the ``h2`` package;
+    # without it the profile falls back to HTTP/1.1.
+    http2: bool = False
+
+    # Connection pool: open connections, idle connections kept alive, and seconds an idle connection is kept.
+    max_connections: int = 1
+    max_keepalive_connections: int = 2
+    keepalive_expiry: float = 5.0
+
+    # Timeouts in seconds: establishing a connection, reading and writing data, and waiting for a pool connection.
+    connect_timeout: float = 10.0
+    read_timeout: float = 10.0
+    write_timeout: float = 10.0
+    pool_timeout: float = 10.0
+
+    # Seconds a DNS answer is reused for new connections; zero resolves every time. Through a proxy, which resolves
+    # the site's name itself, only the default resolution applies.
+    dns_ttl: float = 0.0
+
+    # Random delay in seconds each worker waits before each request, in between first and second value included.
+    worker_jitter: tuple[float, float] = (0.05, 0.3)
+
+    def limits(self) -> Limits:
+        return Limits(max_connections=self.max_connections,
+                      max_keepalive_connections=self.max_keepalive_connections,
+                      keepalive_expiry=self.keepalive_expiry)
+
+    def timeout(self) -> Timeout:
+        return Timeout(connect=self.connect_timeout, read=self.read_timeout, write=self.write_timeout,
+                       pool=self.pool_timeout)
+
+
+PROFILES: dict[str, TransportProfile] = {
+    # One HTTP/1.1 connection and a long jitter, as gentle as a browser tab.
+    'polite': TransportProfile('polite'),
+    # A few multiplexed connections, a short jitter.
+    'balanced': TransportProfile('balanced', http2=True, max_connections=4, max_keepalive_connections=4,
+                                 keepalive_expiry=30.0, connect_timeout=5.0, pool_timeout=30.0, dns_ttl=300.0,
+                                 worker_jitter=(0.0, 0.05)),
+    # As many connections as the fetcher may have tasks in flight, no jitter: the rate limiter alone paces requests.
+    'aggressive': TransportProfile('aggressive', http2=True, max_connections=16, max_keepalive_connections=16,
+                                   keepalive_expiry=60.0, connect_timeout=5.0, read_timeout=20.0,
+                                   pool_timeout=60.0, dns_ttl=300.0, worker_jitter=(0.0, 0.0)),
+}
+
+
+def get_profile(profile: str | TransportProfile) -> TransportProfile:
+    """Returns the profile itself, or the one named so in ``PROFILES``."""
+    if isinstance(profile, TransportProfile):
+        return profile
+    try:
+        return PROFILES[profile]
+    except KeyError:
+        raise ValueError(f'Unknown transport profile {profile!r}; expected one of {", ".join(PROFILES)}.') from None
+
+
+class CachingResolver(httpcore.AsyncNetworkBackend):
+    """
+    Network backend resolving host names once per ``ttl`` seconds, then connecting through ``backend`` by address.
+    TLS still verifies the original host name: httpcore takes it from the request, not from the stream.
+    """
+
+    def __init__(self, backend: httpcore.AsyncNetworkBackend, ttl: float):
+        self._backend: httpcore.AsyncNetworkBackend = backend
+        self._ttl: float = ttl
+        # (host, port) -> (expiry, addresses)
+        self._cache: dict[tuple[str, int], tuple[float, list[str]]] = {}
+
+    async def _resolve(self, host: str, port: int) -> list[str]:
+        now: float = time.monotonic()
+        if (hit := self._cache.get((host, port))) is not None and hit[0] > now:
+            return hit[1]
+        with span('dns', host=host):
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        # Keep the resolver's order, which already prefers the best address family.
+        addresses: list[str] = list(dict.fromkeys(info[4][0] for info in infos))
+        self._cache[(host, port)] = (now + self._ttl, addresses)
+        return addresses
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None,
+                          local_address: Optional[str] = None,
+                          socket_options: Optional[Iterable[Any]] = None) -> httpcore.AsyncNetworkStream:
+        try:
+            ipaddress.ip_address(host)
+            addresses: list[str] = [host]
+        except ValueError:
+            try:
+                addresses = await self._resolve(host, port)
+            except OSError as e:
+                raise httpcore.ConnectError(str(e)) from e
+
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        # Every address failed; resolve again next time in case the records changed.
+        self._cache.pop((host, port), None)
+        raise error
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None,
+                                  socket_options: Optional[Iterable[Any]] = None) -> httpcore.AsyncNetworkStream:
+        return await self._backend.connect_unix_socket(path, timeout, socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+
+# httpcore errors and the httpx errors they surface as, subclasses before their bases.
+_HTTPCORE_ERRORS: tuple[tuple[type[Exception], type[httpx.HTTPError]], ...] = (
+    (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+    (httpcore.ReadTimeout, httpx.ReadTimeout),
+    (httpcore.WriteTimeout, httpx.WriteTimeout),
+    (httpcore.PoolTimeout, httpx.PoolTimeout),
+    (httpcore.TimeoutException, httpx.TimeoutException),
+    (httpcore.ConnectError, httpx.ConnectError),
+    (httpcore.ReadError, httpx.ReadError),
+    (httpcore.WriteError, httpx.WriteError),
+    (httpcore.NetworkError, httpx.NetworkError),
+    (httpcore.ProxyError, httpx.ProxyError),
+    (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+    (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+    (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+    (httpcore.ProtocolError, httpx.ProtocolError),
+)
+
+
+@contextlib.contextmanager
+def _httpx_errors() -> Iterator[None]:
+    """Raises the httpx counterpart of the httpcore errors raised inside, like httpx's own transport does."""
+    try:
+        yield
+    except Exception as e:
+        for core_error, error in _HTTPCORE_ERRORS:
+            if isinstance(e, core_error):
+                raise error(str(e)) from e
+        raise
+
+
+class _PoolStream(httpx.AsyncByteStream):
+    """Body of a response read from an httpcore pool."""
+
+    def __init__(self, stream: Any):
+        self._stream = stream
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        with _httpx_errors():
+            async for part in self._stream:
+                yield part
+
+    async def aclose(self) -> None:
+        if hasattr(self._stream, 'aclose'):
+            await self._stream.aclose()
+
+
+class _PoolTransport(httpx.AsyncBaseTransport):
+    """
+    Transport sending requests through an httpcore connection pool built by the caller. ``AsyncHTTPTransport`` has
+    no way to set the pool's network backend, which the DNS cache needs.
+    """
+
+    def __init__(self, pool: httpcore.AsyncConnectionPool):
+        self.pool: httpcore.AsyncConnectionPool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        req = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(scheme=request.url.raw_scheme, host=request.url.raw_host, port=request.url.port,
+                             target=request.url.raw_path),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with _httpx_errors():
+            resp: httpcore.Response = await self.pool.handle_async_request(req)
+        return httpx.Response(status_code=resp.status, headers=resp.headers, stream=_PoolStream(resp.stream),
+                              extensions=resp.extensions)
+
+    async def aclose(self) -> None:
+        await self.pool.aclose()
+
+
+@functools.cache
+def _default_ssl_context() -> ssl.SSLContext:
+    """
+    Returns the TLS context shared by every client built here. Loading the CA bundle takes tens of milliseconds,
+    which httpx would otherwise spend again for each client.
+    """
+    return create_ssl_context()
+
+
+def build_client(profile: str | TransportProfile = 'polite', **kwargs) -> AsyncClient:
+    """
+    Builds an ``AsyncClient`` configured by a transport profile.
+    :param profile: A ``TransportProfile`` or the name of one in ``PROFILES``.
+    :param kwargs: Passed on to ``AsyncHTTPTransport``, e.g. ``proxy`` or ``local_address``.
+    """
+    profile = get_profile(profile)
+    http2: bool = profile.http2
+    if http2 and h2 is None:
+        log.warning(f'Transport profile {profile.name!r} wants HTTP/2 but the h2 package is missing; using HTTP/1.1.')
+        http2 = False
+
+    kwargs.setdefault('verify', _default_ssl_context())
+    transport: httpx.AsyncBaseTransport
+    if profile.dns_ttl > 0 and kwargs.get('proxy') is None and kwargs.get('uds') is None:
+        # Built here to hand the pool the caching resolver, which it gives every connection it opens. Through a
+        # proxy, the proxy resolves the site's name.
+        ssl_context: ssl.SSLContext = create_ssl_context(verify=kwargs.pop('verify'), cert=kwargs.pop('cert', None),
+                                                         trust_env=kwargs.pop('trust_env', True))
+        limits: Limits = profile.limits()
+        kwargs.pop('proxy', None)
+        transport = _PoolTransport(httpcore.AsyncConnectionPool(
+            ssl_context=ssl_context,
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http2=http2,
+            network_backend=CachingResolver(httpcore.AnyIOBackend(), profile.dns_ttl),
+            **kwargs,
+        ))
+    else:
+        transport = AsyncHTTPTransport(http2=http2, limits=profile.limits(), **kwargs)
+
+    # follow_redirects=True is important for the POST.
+    return AsyncClient(transport=transport, timeout=profile.timeout(), follow_redirects=True)
@@ -0,0 +1,139 @@
+# File: test_breaker.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+
+from scraper.breaker import BreakerState, CircuitBreaker
+
+# Cool-off of the breakers under test, in seconds.
+_OPEN_FOR: float = 0.02
+
+
+def _breaker(**kwargs) -> CircuitBreaker:
+    return CircuitBreaker(**{'consecutive_failures': 3, 'open_for': _OPEN_FOR, 'max_open_for': 1.0, **kwargs})
+
+
+async def _half_open(b: CircuitBreaker) -> None:
+    """Opens the breaker and waits for the probe to be admitted."""
+    while not b.on_failure():
+        pass
+    assert await asyncio.wait_for(b.admit(), 1)
+    assert b.state is BreakerState.HALF_OPEN
+
+
+def test_opens_after_consecutive_failures():
+    async def scenario():
+        b = _breaker()
+        assert not b.on_failure()
+        assert not b.on_failure()
+        b.on_success()
+        assert not b.on_failure()
+        assert not b.on_failure()
+        assert b.on_failure()
+        assert b.state is BreakerState.OPEN and b.is_open
+
+    asyncio.run(scenario())
+
+
+def test_opens_on_error_rate():
+    async def scenario():
+        b = _breaker(consecutive_failures=100, error_rate=0.5, window=10, min_samples=10)
+        opened = False
+        # Every other attempt fails, the last one reaching min_samples.
+        for i in range(1, 11):
+            if i % 2:
+                b.on_success()
+            else:
+                opened = b.on_failure()
+        assert opened
+
+    asyncio.run(scenario())
+
+
+def test_closed_admits_right_away_without_probe():
+    async def scenario():
+        return await asyncio.wait_for(_breaker().admit(), 1)
+
+    assert asyncio.run(scenario()) is False
+
+
+def test_open_holds_admission_for_the_cool_off():
+    async def scenario():
+        b = _breaker()
+        for _ in range(3):
+            b.on_failure()
+        loop = asyncio.get_running_loop()
+        start: float = loop.time()
+        probe: bool = await asyncio.wait_for(b.admit(), 1)
+        return probe, loop.time() - start, b.state
+
+    probe, waited, state = asyncio.run(scenario())
+    assert probe
+    assert waited >= _OPEN_FOR * 0.9
+    assert state is BreakerState.HALF_OPEN
+
+
+def test_probe_success_closes():
+    async def scenario():
+        b = _breaker()
+        await _half_open(b)
+        b.on_success(probe=True)
+        return b.state, await asyncio.wait_for(b.admit(), 1)
+
+    assert asyncio.run(scenario()) == (BreakerState.CLOSED, False)
+
+
+def test_probe_failure_reopens_for_twice_as_long():
+    async def scenario():
+        b = _breaker()
+        await _half_open(b)
+        assert b.on_failure(probe=True)
+        loop = asyncio.get_running_loop()
+        start: float = loop.time()
+        await asyncio.wait_for(b.admit(), 1)
+        return loop.time() - start
+
+    assert asyncio.run(scenario()) >= 2 * _OPEN_FOR * 0.9
+
+
+def test_only_the_probe_decides_while_half_open():
+    async def scenario():
+        b = _breaker()
+        await _half_open(b)
+        # Attempts sent before the breaker opened, ending late.
+        assert not b.on_failure()
+        b.on_success()
+        assert b.state is BreakerState.HALF_OPEN and b.is_open
+        # The next task waits for the probe's verdict.
+        waiter = asyncio.ensure_future(b.admit())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        b.on_success(probe=True)
+        return await asyncio.wait_for(waiter, 1), b.state
+
+    assert asyncio.run(scenario()) == (False, BreakerState.CLOSED)
+
+
+def test_failures_while_open_are_ignored():
+    async def scenario():
+        b = _breaker()
+        for _ in range(3):
+            b.on_failure()
+        assert not b.on_failure()
+        b.on_success()
+        return b.state
+
+    assert asyncio.run(scenario()) is BreakerState.OPEN
+
+
+def test_gives_up_and_stays_closed():
+    async def scenario():
+        b = _breaker(give_up_after=0.0)
+        await _half_open(b)
+        assert not b.on_failure(probe=True)
+        assert b.state is BreakerState.CLOSED
+        return [b.on_failure() for _ in range(10)]
+
+    assert not any(asyncio.run(scenario()))
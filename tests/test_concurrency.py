@@ -0,0 +1,51 @@
+# File: test_concurrency.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+
+from scraper.concurrency import ByteBudget
+
+
+def test_acquire_waits_for_room():
+    async def scenario():
+        budget = ByteBudget(100)
+        await budget.acquire(80)
+        waiter = asyncio.ensure_future(budget.acquire(30))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        budget.release(80)
+        await asyncio.wait_for(waiter, 1)
+        return budget.used
+
+    assert asyncio.run(scenario()) == 30
+
+
+def test_body_larger_than_budget_is_admitted_alone():
+    async def scenario():
+        budget = ByteBudget(100)
+        await asyncio.wait_for(budget.acquire(500), 1)
+        budget.charge(100)
+        return budget.used
+
+    assert asyncio.run(scenario()) == 600
+
+
+def test_retained_bytes_saturate_without_blocking_acquire():
+    async def scenario():
+        budget = ByteBudget(100)
+        budget.retain(150)
+        assert budget.saturated
+        # Only retained bodies are held: a body still gets in, or the tasks freeing them could never run.
+        await asyncio.wait_for(budget.acquire(10), 1)
+        # A second one waits.
+        waiter = asyncio.ensure_future(budget.acquire(10))
+        released = asyncio.ensure_future(budget.wait_release())
+        await asyncio.sleep(0)
+        assert not waiter.done() and not released.done()
+        budget.unretain(150)
+        await asyncio.wait_for(asyncio.gather(waiter, released), 1)
+        return budget.used, budget.saturated
+
+    assert asyncio.run(scenario()) == (20, False)
@@ -0,0 +1,143 @@
+# File: test_fetcher.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+from collections import Counter
+from pathlib import Path
+from typing import Awaitable, Callable
+
+import httpx
+
+from scraper.cache import ResponseCache
+from scraper.checkpoint import CheckpointStore
+from scraper.fetcher import Fetcher, GetResp, ItemRecord, Outcome
+from scraper.retry import RetryPolicy
+
+_BASE_URL: str = 'https://site.test/'
+
+# Retries without waiting for long.
+_FAST_RETRY: RetryPolicy = RetryPolicy(max_attempts=5, base_delay=0.001, max_delay=0.005)
+
+type Handler = Callable[[httpx.Request], Awaitable[httpx.Response]]
+
+
+def _item_id(request: httpx.Request) -> int:
+    return int(request.url.params['id'])
+
+
+def _page(item_id: int, form: bool = False) -> bytes:
+    return (f'<html><title>Item {item_id}</title>'.encode() + (b'<input name="download_link">' if form else b'')
+            + bytes(1000) + b'</html>')
+
+
+async def _run(handler: Handler, fetch: Callable[[Fetcher], Awaitable[None]], **kwargs) -> Fetcher:
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True) as client:
+        async with Fetcher(client, base_url=_BASE_URL, transport='aggressive', retry_policy=_FAST_RETRY,
+                           **kwargs) as fetcher:
+            await fetch(fetcher)
+    return fetcher
+
+
+def test_duplicate_gets_share_one_request():
+    requests: Counter = Counter()
+    outcomes: list[Outcome] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests[_item_id(request)] += 1
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, content=_page(_item_id(request)))
+
+    asyncio.run(_run(handler, lambda f: f.fetch_range([5, 5, 5, 6], outcomes.append)))
+    assert requests == {5: 1, 6: 1}
+    assert sorted(o.item_id for o in outcomes) == [5, 5, 5, 6]
+    assert all(isinstance(o.res, GetResp) and o.res.content == _page(o.item_id) for o in outcomes)
+
+
+def test_conditional_get_serves_unchanged_pages_from_cache(tmp_path: Path):
+    statuses: list[int] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.headers.get('If-None-Match') == '"v1"':
+            statuses.append(304)
+            return httpx.Response(304, headers={'ETag': '"v1"'})
+        statuses.append(200)
+        return httpx.Response(200, content=_page(_item_id(request)), headers={'ETag': '"v1"'})
+
+    runs: list[list[Outcome]] = [[], []]
+    with ResponseCache(tmp_path / 'cache') as cache:
+        for outcomes in runs:
+            asyncio.run(_run(handler, lambda f: f.fetch_range([1, 2], outcomes.append), cache=cache))
+    assert statuses == [200, 200, 304, 304]
+    assert all(not o.res.from_cache for o in runs[0])
+    assert all(o.res.from_cache and o.res.content == _page(o.item_id) for o in runs[1])
+
+
+def test_items_record_page_and_download(tmp_path: Path):
+    records: list[ItemRecord] = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == 'cdn.test':
+            return httpx.Response(200)
+        item_id: int = _item_id(request)
+        if request.method == 'POST':
+            # Item 3's download form leads nowhere.
+            if item_id == 3:
+                return httpx.Response(404)
+            return httpx.Response(302, headers={'Location': f'https://cdn.test/{item_id}.zip'})
+        return httpx.Response(404) if item_id == 4 else httpx.Response(200, content=_page(item_id, item_id != 1))
+
+    async def fetch(fetcher: Fetcher) -> None:
+        await fetcher.fetch_items(range(1, 5), records.append)
+        await fetcher.join()
+
+    with CheckpointStore(tmp_path / 'crawl.sqlite') as checkpoint:
+        fetcher = asyncio.run(_run(handler, fetch, checkpoint=checkpoint, inflight_bytes=1500))
+    by_id: dict[int, ItemRecord] = {r.item_id: r for r in records}
+    assert sorted(by_id) == [1, 2, 3]
+    assert not by_id[1].download_requested and by_id[1].download is None
+    assert by_id[2].download_requested and str(by_id[2].download.url) == 'https://cdn.test/2.zip'
+    assert by_id[3].download_requested and by_id[3].download is None
+    # Pages kept for their POST were given back to the byte budget.
+    assert fetcher._byte_budget.used == 0
+
+    complete, failed = CheckpointStore(tmp_path / 'crawl.sqlite').load()
+    assert list(complete) == [1, 2] and list(failed) == [3]
+
+
+def test_fetch_range_resumes_from_checkpoint(tmp_path: Path):
+    requests: Counter = Counter()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        item_id: int = _item_id(request)
+        requests[item_id] += 1
+        if item_id == 2 and requests[item_id] == 1:
+            # Fails for good on the first run: not retried.
+            return httpx.Response(403)
+        return httpx.Response(200, content=_page(item_id))
+
+    path: Path = tmp_path / 'crawl.sqlite'
+    for _ in range(2):
+        with CheckpointStore(path) as checkpoint:
+            asyncio.run(_run(handler, lambda f: f.fetch_range(range(4), lambda o: None), checkpoint=checkpoint))
+    assert requests == {0: 1, 1: 1, 2: 2, 3: 1}
+
+
+def test_discover_max_id_survives_transient_errors():
+    requests: Counter = Counter()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        item_id: int = _item_id(request)
+        requests[item_id] += 1
+        if requests[item_id] == 1 and item_id % 2:
+            return httpx.Response(502 if item_id % 3 else 500)
+        return httpx.Response(200, content=_page(item_id)) if item_id <= 37 else httpx.Response(404)
+
+    found: list[int] = []
+
+    async def discover(fetcher: Fetcher) -> None:
+        found.append(await fetcher.discover_max_id())
+
+    asyncio.run(_run(handler, discover))
+    assert found == [37]
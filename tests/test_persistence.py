@@ -0,0 +1,86 @@
+# File: test_persistence.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+from pathlib import Path
+
+from scraper.checkpoint import CheckpointStore, Progress
+from scraper.headers import load_user_agents, _parsed, _sidecar_path
+from scraper.idset import IdBitmap
+
+
+def test_bitmap_set_operations():
+    bm = IdBitmap([3, 0, 17, 3])
+    assert len(bm) == 3
+    assert list(bm) == [0, 3, 17]
+    assert 17 in bm and 16 not in bm and -1 not in bm and 10_000 not in bm
+    bm.discard(3)
+    bm.discard(10_000)
+    assert list(bm) == [0, 17]
+    assert bm.max() == 17
+    assert IdBitmap().max() == -1
+
+
+def test_bitmap_truncate():
+    bm = IdBitmap(range(0, 40, 3))
+    bm.truncate(13)
+    assert list(bm) == [0, 3, 6, 9, 12]
+    bm.truncate(0)
+    assert len(bm) == 0
+
+
+def test_bitmap_round_trip(tmp_path: Path):
+    path: Path = tmp_path / 'missing.bin'
+    assert len(IdBitmap.load(path)) == 0
+    ids: list[int] = [1, 8, 9, 1000, 3_000_000]
+    IdBitmap(ids).save(path)
+    assert list(IdBitmap.load(path)) == ids
+    # Trailing zero bytes are not written.
+    bm = IdBitmap([5, 900])
+    bm.discard(900)
+    bm.save(path)
+    assert path.stat().st_size == 1
+    assert list(IdBitmap.load(path)) == [5]
+
+
+def test_checkpoint_round_trip(tmp_path: Path):
+    path: Path = tmp_path / 'crawl.sqlite'
+    with CheckpointStore(path, commit_interval=0.01) as checkpoint:
+        for item_id in range(10):
+            checkpoint.record(item_id, Progress.DONE)
+        checkpoint.record(4, Progress.FAILED)
+        checkpoint.record(11, Progress.FAILED)
+        checkpoint.record(6, Progress.MISSING)
+    complete, failed = CheckpointStore(path).load()
+    assert list(complete) == [0, 1, 2, 3, 5, 6, 7, 8, 9]
+    assert list(failed) == [4, 11]
+
+
+def test_checkpoint_missing_past_last_done_is_not_complete(tmp_path: Path):
+    path: Path = tmp_path / 'crawl.sqlite'
+    with CheckpointStore(path) as checkpoint:
+        for item_id in (1, 2, 5):
+            checkpoint.record(item_id, Progress.DONE)
+        for item_id in (3, 6, 7):
+            checkpoint.record(item_id, Progress.MISSING)
+    complete, _ = CheckpointStore(path).load()
+    assert list(complete) == [1, 2, 3, 5]
+
+
+def test_user_agents_sidecar(tmp_path: Path):
+    path: Path = tmp_path / 'agents.txt'
+    path.write_text('windows|UA one\nUA two\nwindows|UA one\n\n', encoding='utf-8')
+    expected = (('windows', 'UA one'), ('', 'UA two'))
+    assert load_user_agents(path) == expected
+    assert _sidecar_path(path).exists()
+
+    # A new process only has the sidecar.
+    _parsed.clear()
+    assert load_user_agents(path) == expected
+
+    # Editing the file invalidates both caches.
+    path.write_text('mac|UA three\n', encoding='utf-8')
+    assert load_user_agents(path) == (('mac', 'UA three'),)
+    _parsed.clear()
+    assert load_user_agents(path) == (('mac', 'UA three'),)
@@ -0,0 +1,146 @@
+# File: test_task_queue.py
+# Author: Urpagin
+# Date: 2026-10-17
+# License: MIT
+
+import asyncio
+from array import array
+
+import pytest
+from yarl import URL
+
+from scraper.fetcher import GetTask, PostTask, RangeTask, StopTask, TaskPriorityQueue
+
+_URL: URL = URL('https://example.com/')
+
+
+def _get(item_id: int) -> GetTask:
+    return GetTask(item_id, _URL)
+
+
+def _post(item_id: int) -> PostTask:
+    return PostTask(item_id, _URL)
+
+
+async def _drain(q: TaskPriorityQueue, n: int, posts_only: bool = False) -> list:
+    return [(await q.get_timed(posts_only))[0] for _ in range(n)]
+
+
+def test_posts_go_first_and_lanes_are_fifo():
+    async def scenario():
+        q = TaskPriorityQueue(0, get_max_wait=60)
+        for task in (_get(1), _post(2), _get(3), _post(4)):
+            await q.put(task)
+        return await _drain(q, 4)
+
+    assert [t.item_id for t in asyncio.run(scenario())] == [2, 4, 1, 3]
+
+
+def test_aged_get_served_once_per_posts_per_aged_get():
+    async def scenario():
+        # Every GET is aged right away: only the POST count paces them.
+        q = TaskPriorityQueue(0, get_max_wait=0, posts_per_aged_get=2)
+        for i in range(3):
+            await q.put(_get(100 + i))
+        for i in range(6):
+            await q.put(_post(i))
+        return await _drain(q, 9)
+
+    kinds = ''.join('G' if isinstance(t, GetTask) else 'P' for t in asyncio.run(scenario()))
+    assert kinds == 'PPGPPGPPG'
+
+
+def test_gets_wait_behind_posts_until_aged():
+    async def scenario():
+        q = TaskPriorityQueue(0, get_max_wait=60, posts_per_aged_get=1)
+        await q.put(_get(1))
+        for i in range(3):
+            await q.put(_post(i))
+        return await _drain(q, 4)
+
+    assert [type(t) for t in asyncio.run(scenario())] == [PostTask, PostTask, PostTask, GetTask]
+
+
+def test_posts_only_skips_aged_gets():
+    async def scenario():
+        q = TaskPriorityQueue(0, get_max_wait=0, posts_per_aged_get=1)
+        await q.put(_get(1))
+        for i in range(3):
+            await q.put(_post(i))
+        return await _drain(q, 3, posts_only=True), q.qsize()
+
+    served, left = asyncio.run(scenario())
+    assert all(isinstance(t, PostTask) for t in served)
+    assert left == 1
+
+
+def test_stop_task_seals_and_comes_last():
+    async def scenario():
+        q = TaskPriorityQueue(0, get_max_wait=60)
+        await q.put(_get(1))
+        assert await q.put(StopTask())
+        assert not await q.put(_get(2))
+        # Follow-up tasks of workers still get in, ahead of the sentinel.
+        q.put_nowait(_post(3))
+        return await _drain(q, 3)
+
+    served = asyncio.run(scenario())
+    assert [type(t) for t in served] == [PostTask, GetTask, StopTask]
+
+
+def test_range_task_hands_out_kept_ids_and_joins():
+    async def scenario():
+        q = TaskPriorityQueue(0)
+        await q.put(RangeTask(range(10), _get, keep=lambda item_id: item_id % 3 != 0))
+        await q.put(RangeTask(array('q', [20, 21]), _get))
+        served = []
+        while len(served) < 8:
+            task, _ = await q.get_timed()
+            served.append(task.item_id)
+            q.task_done(task)
+        await asyncio.wait_for(q.join(), 1)
+        return served, q.empty()
+
+    served, empty = asyncio.run(scenario())
+    assert served == [1, 2, 4, 5, 7, 8, 20, 21]
+    assert empty
+
+
+def test_range_task_ages_from_the_head_of_the_lane():
+    async def scenario():
+        q = TaskPriorityQueue(0, get_max_wait=0.05, posts_per_aged_get=1)
+        await q.put(RangeTask(range(3), _get))
+        await asyncio.sleep(0.1)
+        for i in range(3):
+            await q.put(_post(100 + i))
+        return await _drain(q, 5)
+
+    # The first ID has aged and goes out after one POST; the next one only reached the head of the lane then, so
+    # it waits behind the remaining POSTs.
+    served = [t.item_id for t in asyncio.run(scenario())]
+    assert served == [100, 0, 101, 102, 1]
+
+
+def test_full_lane_blocks_put_until_get():
+    async def scenario():
+        q = TaskPriorityQueue(1)
+        await q.put(_get(1))
+        blocked = asyncio.ensure_future(q.put(_get(2)))
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+        await q.get()
+        return await asyncio.wait_for(blocked, 1)
+
+    assert asyncio.run(scenario())
+
+
+def test_task_done_too_many_times():
+    async def scenario():
+        q = TaskPriorityQueue(0)
+        await q.put(_post(1))
+        task = await q.get()
+        q.task_done(task)
+        with pytest.raises(ValueError):
+            q.task_done(task)
+
+    asyncio.run(scenario())